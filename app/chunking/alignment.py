@@ -0,0 +1,54 @@
+import re
+from bisect import bisect_right
+
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+def count_alphanumeric(text: str) -> int:
+    """Number of letters and digits of the lower-cased text, the unit of positions in `AlignmentIndex`."""
+    return len(_NON_ALPHANUMERIC.sub("", text.lower()))
+
+
+class AlignmentIndex:
+    """
+    Timestamps of positions in a transcript's text, found by binary search over its snippets.
+
+    Positions count letters and digits only, so a position in the punctuated text,
+    or in chunks split from it, is the same position in the original snippets:
+    punctuation restoration only changes case, spacing and punctuation.
+    Snippets are added in order, so offsets stay sorted as they are appended.
+    """
+    def __init__(self):
+        # Position of the first character of every snippet, with the snippet's start and end time
+        self.offsets: list[int] = []
+        self.starts: list[float] = []
+        self.ends: list[float] = []
+        self.num_chars = 0
+
+    @classmethod
+    def from_snippets(cls, snippets) -> "AlignmentIndex":
+        index = cls()
+        for snippet in snippets:
+            index.add(snippet.text, snippet.start, snippet.duration)
+        return index
+
+    def add(self, text: str, start: float, duration: float):
+        self.offsets.append(self.num_chars)
+        self.starts.append(start)
+        self.ends.append(start + duration)
+        self.num_chars += count_alphanumeric(text)
+
+    def span(self, begin: int, end: int) -> tuple[float, float]:
+        """
+        Start time of the snippet holding position `begin`, and end time of the snippet
+        holding the last position before `end`. Positions past the text are clamped to it.
+        """
+        if not self.offsets:
+            return 0.0, 0.0
+        first = self._snippet_at(begin)
+        last = max(first, self._snippet_at(end - 1))
+        return self.starts[first], self.ends[last]
+
+    def _snippet_at(self, position: int) -> int:
+        # The last snippet starting at or before the position, skipping snippets without letters or digits
+        return max(bisect_right(self.offsets, min(position, self.num_chars - 1)) - 1, 0)
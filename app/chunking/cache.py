@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections import deque
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from youtube_transcript_api import FetchedTranscript
+
+from app.chunking.chunk import Chunk, ChunkMetadata
+
+logger = logging.getLogger(__name__)
+
+CHUNK_CACHE_DIR = Path(__file__).resolve().parents[2] / "data" / "chunk_cache"
+# Part of the key of final chunks, changed whenever the same input is chunked differently
+CHUNKS_VERSION = "2"
+
+
+class ChunkCache:
+    """
+    On-disk, content-addressed cache of transcript processing results.
+
+    Two kinds of entries are stored as JSON files:
+    - punctuated chunks, keyed by (transcript hash, punctuation model)
+    - final chunks, keyed by (transcript hash, punctuation model, embedding tokenizer, tokens per chunk)
+
+    So changing only the chunk size re-chunks the cached punctuated text instead of
+    running the punctuation model again. The `stream_*` methods write an entry while
+    its chunks are produced, and store it only once all of them were written.
+    """
+    def __init__(self, cache_dir: Path = CHUNK_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def get_punctuated(self, transcript: FetchedTranscript, punctuation_model: str) -> list[Chunk] | None:
+        return self._read("punctuated", self.punctuated_key(transcript, punctuation_model))
+
+    def put_punctuated(self, transcript: FetchedTranscript, punctuation_model: str, chunks: list[Chunk]):
+        self._write("punctuated", self.punctuated_key(transcript, punctuation_model), chunks)
+
+    def stream_punctuated(
+        self, transcript: FetchedTranscript, punctuation_model: str, chunks: Iterable[Chunk],
+    ) -> Iterator[Chunk]:
+        yield from self._stream("punctuated", self.punctuated_key(transcript, punctuation_model), chunks)
+
+    def get_chunks(
+        self, transcript: FetchedTranscript, punctuation_model: str, tokenizer_name: str, tokens_per_chunk: int,
+    ) -> list[Chunk] | None:
+        key = self.chunks_key(transcript, punctuation_model, tokenizer_name, tokens_per_chunk)
+        return self._read("chunks", key)
+
+    def put_chunks(
+        self,
+        transcript: FetchedTranscript,
+        punctuation_model: str,
+        tokenizer_name: str,
+        tokens_per_chunk: int,
+        chunks: list[Chunk],
+    ):
+        key = self.chunks_key(transcript, punctuation_model, tokenizer_name, tokens_per_chunk)
+        self._write("chunks", key, chunks)
+
+    def stream_chunks(
+        self,
+        transcript: FetchedTranscript,
+        punctuation_model: str,
+        tokenizer_name: str,
+        tokens_per_chunk: int,
+        chunks: Iterable[Chunk],
+    ) -> Iterator[Chunk]:
+        key = self.chunks_key(transcript, punctuation_model, tokenizer_name, tokens_per_chunk)
+        yield from self._stream("chunks", key, chunks)
+
+    def punctuated_key(self, transcript: FetchedTranscript, punctuation_model: str) -> str:
+        return _hash(transcript_hash(transcript), punctuation_model)
+
+    def chunks_key(
+        self, transcript: FetchedTranscript, punctuation_model: str, tokenizer_name: str, tokens_per_chunk: int,
+    ) -> str:
+        return _hash(
+            transcript_hash(transcript), punctuation_model, tokenizer_name, str(tokens_per_chunk), CHUNKS_VERSION,
+        )
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.cache_dir / kind / key[:2] / f"{key}.json"
+
+    def _read(self, kind: str, key: str) -> list[Chunk] | None:
+        path = self._path(kind, key)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable chunk cache entry {path}")
+            return None
+
+        logger.debug(f"Chunk cache hit for {kind} entry {key}")
+        return [_dict_to_chunk(item) for item in data["chunks"]]
+
+    def _write(self, kind: str, key: str, chunks: list[Chunk]):
+        deque(self._stream(kind, key, chunks), maxlen=0)
+
+    def _stream(self, kind: str, key: str, chunks: Iterable[Chunk]) -> Iterator[Chunk]:
+        """Yield the chunks while writing them to the entry, which is stored once they are exhausted."""
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that concurrent readers never see a partial entry,
+        # and an entry whose chunks were not all produced is never stored
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write('{"chunks": [')
+                for i, chunk in enumerate(chunks):
+                    item = {
+                        "text": chunk.text,
+                        "start_time": chunk.metadata.start_time,
+                        "end_time": chunk.metadata.end_time,
+                    }
+                    f.write((", " if i else "") + json.dumps(item))
+                    yield chunk
+                f.write("]}")
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _dict_to_chunk(item: dict) -> Chunk:
+    metadata = ChunkMetadata(item["start_time"], 0)
+    # Restore the end time as stored, recomputing it from the duration could change the float
+    metadata.end_time = item["end_time"]
+    return Chunk(item["text"], metadata)
+
+
+def transcript_hash(transcript: FetchedTranscript) -> str:
+    """Hash of the transcript content, independent of where and when it was fetched."""
+    digest = hashlib.sha256()
+    for snippet in transcript.snippets:
+        digest.update(json.dumps([snippet.text, snippet.start, snippet.duration]).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def _hash(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
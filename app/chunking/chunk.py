@@ -1,8 +1,13 @@
-from typing import List
+from collections.abc import Callable, Iterable, Iterator
 from transformers import PreTrainedTokenizer
 from nltk import sent_tokenize
 
+# Texts counted per batched tokenizer call
+TOKENIZE_BATCH_SIZE = 128
+
 class ChunkMetadata:
+    __slots__ = ("end_time", "start_time")
+
     def __init__(self, start_time: float, duration: float):
         self.start_time = start_time
         self.end_time = self.start_time + duration
@@ -15,9 +20,13 @@ class ChunkMetadata:
         return f"ChunkMetadata(start_time={self.start_time}, end_time={self.end_time}, duration={self.duration})"
 
 class Chunk:
-    def __init__(self, text: str, metadata: ChunkMetadata):
+    __slots__ = ("metadata", "text", "token_count")
+
+    def __init__(self, text: str, metadata: ChunkMetadata, token_count: int | None = None):
         self.text = text
         self.metadata = metadata
+        # Tokens of the text as counted when the chunk was merged, if it was
+        self.token_count = token_count
 
     def merge(self, other: 'Chunk') -> 'Chunk':
         start_time = self.metadata.start_time if self.metadata.start_time else other.metadata.start_time 
@@ -30,56 +39,158 @@ class Chunk:
     def __str__(self):
         return f"Chunk(text={self.text}, metadata={self.metadata})"
 
-def chunk_by_sentence(text: str) -> List[str]:
+def chunk_by_sentence(text: str) -> list[str]:
     return sent_tokenize(text)
 
+def count_tokens(texts: list[str], tokenizer: PreTrainedTokenizer) -> list[int]:
+    """Number of tokens of every text, without special tokens, counted with one batched tokenizer call."""
+    if not texts:
+        return []
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+def iter_token_counts[T](
+    items: Iterable[T],
+    tokenizer: PreTrainedTokenizer,
+    text: Callable[[T], str] = lambda item: item,
+    batch_size: int = TOKENIZE_BATCH_SIZE,
+) -> Iterator[tuple[T, int]]:
+    """Items with the token count of their text, counted `batch_size` items at a time."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield from zip(batch, count_tokens([text(item) for item in batch], tokenizer), strict=True)
+            batch = []
+    yield from zip(batch, count_tokens([text(item) for item in batch], tokenizer), strict=True)
+
 
 def merge_chunks_by_tokenizer(
-    chunks: List[Chunk],
+    chunks: list[Chunk],
     tokenizer: PreTrainedTokenizer,
-    max_tokens: int = None,
+    max_tokens: int | None = None,
     separator: str = " "
 ) -> list[Chunk]:
+    return list(iter_merged_chunks(chunks, tokenizer, max_tokens, separator))
+
+def iter_merged_chunks(
+    chunks: Iterable[Chunk],
+    tokenizer: PreTrainedTokenizer,
+    max_tokens: int | None = None,
+    separator: str = " "
+) -> Iterator[Chunk]:
+    """
+    Merge consecutive chunks up to `max_tokens` tokens, yielding every merged chunk as soon as it is complete.
+
+    The result is the same as merging with `Chunk.merge` one chunk at a time, but
+    the text of a merged chunk is joined once, instead of being copied on every merge.
+    Chunks are tokenized in batches, and merged chunks carry their token count.
+    """
     if max_tokens is None:
         max_tokens = tokenizer.model_max_length
     sep_token_count = len(tokenizer.tokenize(separator))
     max_tokens = min(max_tokens, tokenizer.model_max_length)
-    merged_chunks = []
-    current_chunk = Chunk("", ChunkMetadata(0, 0))
+    current = _MergedChunk(Chunk("", ChunkMetadata(0, 0)))
     current_token_count = 0
-    for chunk in chunks:
-        chunk_token_count = len(tokenizer.tokenize(chunk.text))
+    for chunk, chunk_token_count in iter_token_counts(chunks, tokenizer, text=lambda chunk: chunk.text):
         if current_token_count + sep_token_count + chunk_token_count <= max_tokens:
-            current_chunk = current_chunk.merge(chunk)
+            current.add(chunk)
             current_token_count += sep_token_count + chunk_token_count
         else:
-            merged_chunks.append(current_chunk)
-            current_chunk = chunk
+            yield current.build(current_token_count)
+            current = _MergedChunk(chunk)
             current_token_count = chunk_token_count
-    merged_chunks.append(current_chunk)
-    return merged_chunks 
+    yield current.build(current_token_count)
 
 def merge_text_chunks_by_tokenizer(
     chunks: list[str],
     tokenizer: PreTrainedTokenizer,
-    max_tokens: int = None,
+    max_tokens: int | None = None,
     separator: str = " "
 ) -> list[str]:
+    return list(iter_merged_text_chunks(chunks, tokenizer, max_tokens, separator))
+
+def iter_merged_text_chunks(
+    chunks: Iterable[str],
+    tokenizer: PreTrainedTokenizer,
+    max_tokens: int | None = None,
+    separator: str = " "
+) -> Iterator[str]:
+    """Merge consecutive texts up to `max_tokens` tokens, yielding every merged text as soon as it is complete."""
+    for text, _ in iter_merged_text_chunks_with_token_counts(chunks, tokenizer, max_tokens, separator):
+        yield text
+
+def iter_merged_text_chunks_with_token_counts(
+    chunks: Iterable[str],
+    tokenizer: PreTrainedTokenizer,
+    max_tokens: int | None = None,
+    separator: str = " "
+) -> Iterator[tuple[str, int]]:
+    """Same as `iter_merged_text_chunks`, with the token count of every merged text, texts are tokenized in batches."""
     if max_tokens is None:
         max_tokens = tokenizer.model_max_length
     sep_token_count = len(tokenizer.tokenize(separator))
     max_tokens = min(max_tokens, tokenizer.model_max_length)
-    merged_chunks = []
-    current_chunk = ""
+    # Parts are joined once per merged text; a text starting a new merged text is kept without the separator
+    current_parts: list[str] = []
     current_token_count = 0
-    for chunk in chunks:
-        chunk_token_count = len(tokenizer.tokenize(chunk))
+    for chunk, chunk_token_count in iter_token_counts(chunks, tokenizer):
         if current_token_count + sep_token_count + chunk_token_count <= max_tokens:
-            current_chunk += chunk + separator
+            current_parts.append(chunk + separator)
             current_token_count += sep_token_count + chunk_token_count
         else:
-            merged_chunks.append(current_chunk.strip())
-            current_chunk = chunk
+            yield "".join(current_parts).strip(), current_token_count
+            current_parts = [chunk]
             current_token_count = chunk_token_count
-    merged_chunks.append(current_chunk.strip())
-    return merged_chunks
\ No newline at end of file
+    yield "".join(current_parts).strip(), current_token_count
+
+def iter_sentences(
+    texts: Iterable[str],
+    split: Callable[[str], list[str]] = chunk_by_sentence,
+    window_chars: int = 20_000,
+) -> Iterator[str]:
+    """
+    Sentences of the texts joined with spaces, as `split` returns them, without building the joined text.
+
+    Texts are split in windows of about `window_chars` characters. The last sentence
+    of a window may continue in the next text, so it is carried over and split again
+    with the next window. Sentence boundaries only depend on the text around them,
+    so the result is the same as splitting the whole text at once.
+    """
+    buffer = None
+    for text in texts:
+        buffer = text if buffer is None else buffer + " " + text
+        if len(buffer) < window_chars:
+            continue
+        sentences = split(buffer)
+        if len(sentences) > 1:
+            yield from sentences[:-1]
+            # Sentences are slices of the buffer, the last one is its rightmost occurrence
+            buffer = buffer[buffer.rindex(sentences[-1]):]
+    if buffer is not None:
+        yield from split(buffer)
+
+
+class _MergedChunk:
+    """A chunk being merged with the chunks that follow it, see `Chunk.merge`."""
+    def __init__(self, first: Chunk):
+        self.first = first
+        self.start_time = first.metadata.start_time
+        # Stripped, non-empty texts merged before the last one, and the last one
+        self.parts = [first.text.strip()] if first.text.strip() else []
+        self.last: Chunk | None = None
+
+    def add(self, chunk: Chunk):
+        if self.last is not None and self.last.text.strip():
+            self.parts.append(self.last.text.strip())
+        # `Chunk.merge` keeps the start time, unless it is 0
+        self.start_time = self.start_time if self.start_time else chunk.metadata.start_time
+        self.last = chunk
+
+    def build(self, token_count: int) -> Chunk:
+        if self.last is None:
+            return Chunk(self.first.text, self.first.metadata, token_count)
+        return Chunk(
+            " ".join(self.parts) + " " + self.last.text.strip(),
+            ChunkMetadata(self.start_time, self.last.metadata.end_time - self.start_time),
+            token_count,
+        )
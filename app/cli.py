@@ -2,12 +2,22 @@ import json
 import typer
 import logging
 from pathlib import Path
+from typing import Annotated
+from app import config
 from app.services.video_processing import get_default_video_processing_service
 from app.services.search import get_default_video_search_service
 from app.services.crud import get_default_video_crud
-from app.storage.models import SearchResultChunk
+from app.services.registry import get_registry
+from app.storage.db import create_db_and_tables
+from app.embedding.embed import get_sentence_transformer_embedder
+from app.services.embedding_migration import EmbeddingMigration
+from app.storage.ann_index import IVFVectorIndex
+from app.storage.embedding_spaces import EmbeddingSpaceStore
+from app.storage.ingestion_state import STAGES, IngestionStateStore
+from app.storage.models import SearchFilters, SearchResultChunk
+from app.storage.repository import NativeMariadDBRepository
 from app.logs import setup_rich_logging
-from app.youtube.data_loader import Video
+from app.youtube.data_loader import Video, load_videos
 
 from rich.table import Table
 from rich.console import Console
@@ -25,24 +35,116 @@ def global_callback(
 
 video_typer = typer.Typer(help="Video commands", callback=global_callback)
 
+index_typer = typer.Typer(help="Search index commands", callback=global_callback)
+
+embeddings_typer = typer.Typer(help="Embedding model migration commands", callback=global_callback)
+
 cli = typer.Typer(callback=global_callback)
 cli.add_typer(video_typer, name="video")
+cli.add_typer(index_typer, name="index")
+cli.add_typer(embeddings_typer, name="embeddings")
 
 @video_typer.command(
     "populate", 
     help="Populate the videos database from youtube/youtube-videos.json list",
 )
-def populate_videos_database(drop_db_first: bool = False):
+def populate_videos_database(
+    drop_db_first: bool = False,
+    workers: int = typer.Option(
+        1,
+        help="Number of concurrent transcript fetchers, values above 1 enable the pipelined mode",
+    ),
+    process_workers: int = typer.Option(
+        1,
+        help="Number of concurrent chunking and embedding workers in the pipelined mode",
+    ),
+    queue_size: int = typer.Option(
+        config.INGEST_QUEUE_SIZE,
+        help="Capacity of the queues between pipeline stages",
+    ),
+    bulk: bool = typer.Option(
+        False,
+        help="Write chunks in large transactions and build the vector index once at the end, for fresh databases",
+    ),
+):
+    if drop_db_first:
+        # Services are built for the active embedding space, so they must see the space of the new database
+        create_db_and_tables(drop_db_first=True, vector_index=not bulk)
     svc = get_default_video_processing_service()
-    svc.populate_default_videos(drop_db_first=drop_db_first)
+    svc.populate_default_videos(
+        workers=workers,
+        process_workers=process_workers,
+        queue_size=queue_size,
+        bulk=bulk,
+    )
+
+@video_typer.command(
+    "prefetch",
+    help="Fetch and store the transcripts of the youtube/youtube-videos.json list without populating the database",
+)
+def prefetch_transcripts(
+    workers: int = typer.Option(config.FETCH_WORKERS, help="Number of concurrent transcript requests"),
+):
+    stats = get_registry().transcript_fetcher.prefetch([video.id for video in load_videos()], workers=workers)
+    console.print(
+        f"{stats.fetched} fetched, {stats.cached} already stored and {len(stats.failed)} failed "
+        f"of {stats.total} transcripts in {stats.elapsed_seconds:.1f}s"
+    )
+    for video_id in stats.failed:
+        console.print(f"[red]{video_id}[/red]")
 
 @video_typer.command(
     "search", 
     help="Find videos in the database using semantic search",
 )
-def search_videos(query: str):
-    results = get_default_video_search_service().search(query)
-    output_search_results(results)
+def search_videos(
+    query: str = typer.Argument(None, help="Search query"),
+    from_file: Annotated[Path | None, typer.Option(
+        "--from-file", help="Run every non-empty line of this file as a separate query, in one batch",
+    )] = None,
+    filter_expressions: Annotated[list[str] | None, typer.Option(
+        "--filter",
+        help="Only search videos with this metadata value, as key=value (e.g. year=2023), "
+             "or document_id=ID. Can be repeated",
+    )] = None,
+    mode: str = typer.Option(
+        None, help="Ranking: vector, lexical (BM25) or hybrid, SEARCH_MODE by default",
+    ),
+    rerank: bool = typer.Option(
+        None, "--rerank/--no-rerank", help="Re-rank the results with the cross-encoder, on with RERANK_ENABLED",
+    ),
+    diversify: str = typer.Option(
+        None, help="Diversify results: none, collapse (best result per video) or mmr, DIVERSIFY by default",
+    ),
+):
+    try:
+        filters = SearchFilters.parse(filter_expressions or [])
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from e
+
+    svc = get_default_video_search_service()
+    if from_file is None:
+        if query is None:
+            raise typer.BadParameter("Provide a query or --from-file")
+        try:
+            results = svc.search(query, filters=filters, mode=mode, rerank=rerank, diversify=diversify)
+        except ValueError as e:
+            raise typer.BadParameter(str(e)) from e
+        output_search_results(results)
+        return
+
+    queries = [line.strip() for line in from_file.read_text().splitlines() if line.strip()]
+    reranked = svc.reranker is not None if rerank is None else rerank
+    diversified = (diversify or svc.diversify) != "none"
+    if filters.is_empty() and mode in (None, "vector") and svc.mode == "vector" and not reranked and not diversified:
+        all_results = svc.search_many(queries)
+    else:
+        all_results = [
+            svc.search(line, filters=filters, mode=mode, rerank=rerank, diversify=diversify) for line in queries
+        ]
+    for line, results in zip(queries, all_results, strict=True):
+        console.print(f"[bold]{line}[/bold]")
+        output_search_results(results)
 
 @video_typer.command(
     "create", 
@@ -81,6 +183,46 @@ def get_video(video_id: int):
     video = get_default_video_crud().get_video(video_id)
     output_video(video)
 
+@video_typer.command(
+    "status",
+    help="Show ingestion progress: videos per stage, stage timings and throughput, and failed videos",
+)
+def ingestion_status():
+    states = IngestionStateStore().list_states()
+    if not states:
+        console.print("No videos ingested yet")
+        return
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Stage")
+    table.add_column("Videos")
+    table.add_column("Mean, s")
+    table.add_column("Videos/s")
+    for stage in STAGES:
+        seconds = [getattr(state, f"{stage}_seconds") for state in states]
+        seconds = [value for value in seconds if value is not None]
+        total = sum(seconds)
+        table.add_row(
+            stage,
+            str(len(seconds)),
+            f"{total / len(seconds):.2f}" if seconds else "-",
+            f"{len(seconds) / total:.2f}" if total > 0 else "-",
+        )
+    console.print(table)
+
+    stored = [state for state in states if state.stage == "stored"]
+    console.print(f"{len(stored)} of {len(states)} videos stored")
+    if stored:
+        started_at = min(state.started_at for state in states)
+        finished_at = max(state.updated_at for state in stored)
+        elapsed = (finished_at - started_at).total_seconds()
+        if elapsed > 0:
+            console.print(f"Throughput: {len(stored) / elapsed * 60:.1f} videos/min since {started_at}")
+
+    failed = [state for state in states if state.error is not None]
+    for state in failed:
+        console.print(f"[red]{state.video_id}[/red] ({state.stage}, {state.attempts} attempts): {state.error}")
+
 @video_typer.command(
     "export-all", 
     help="Export all videos to a json file",
@@ -91,6 +233,74 @@ def export_videos(file_path: Path = typer.Option(..., help="Relative path to the
     svc.export_videos_as_json_file(file_path)
     logging.getLogger(__name__).info(f"Exported video data from DB to {file_path}")
 
+@index_typer.command(
+    "build",
+    help="Build the approximate nearest neighbor index used by SEARCH_BACKEND=ann from the chunks table",
+)
+def build_ann_index(
+    path: Annotated[Path, typer.Option(help="Directory to write the index to")] = config.ANN_INDEX_DIR,
+    nlist: int = typer.Option(None, help="Number of IVF lists, 4 * sqrt(number of chunks) by default"),
+    iterations: int = typer.Option(20, help="Number of k-means iterations"),
+):
+    # Built from the column of the active embedding space, the legacy one is empty for chunks ingested after a cutover
+    space = get_registry().embedding_space
+    index = IVFVectorIndex.build(
+        NativeMariadDBRepository(embedding_column=space.column_name), nlist=nlist, iterations=iterations,
+    )
+    index.save(path, embedding_model=space.model)
+
+@embeddings_typer.command(
+    "spaces",
+    help="List embedding spaces with the number of chunks embedded in each",
+)
+def list_embedding_spaces():
+    store = EmbeddingSpaceStore()
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("ID")
+    table.add_column("Model")
+    table.add_column("Dim")
+    table.add_column("Column")
+    table.add_column("Status")
+    table.add_column("Embedded chunks")
+    for space in store.list_spaces():
+        embedded = "-"
+        if space.status != "retired":
+            embedded, total = store.count_chunks(space)
+            embedded = f"{embedded}/{total}"
+        table.add_row(str(space.id), space.model, str(space.dim), space.column_name, space.status, embedded)
+    console.print(table)
+
+@embeddings_typer.command(
+    "migrate",
+    help="Re-embed all chunks with another model into a new embedding space, resuming an interrupted migration. "
+         "Search keeps using the active space until `embeddings cutover`",
+)
+def migrate_embeddings(
+    model: str = typer.Option(..., help="Sentence transformer model to re-embed the chunks with"),
+    batch_size: int = typer.Option(config.EMBEDDING_MIGRATION_BATCH_SIZE, help="Chunks embedded per transaction"),
+):
+    embedder = get_sentence_transformer_embedder(model)
+    migration = EmbeddingMigration(
+        EmbeddingSpaceStore(), embedder, batch_size=batch_size, on_progress=lambda progress: console.print(str(progress)),
+    )
+    space = migration.start(model, embedder.get_model().get_sentence_embedding_dimension())
+    migration.run(space)
+
+@embeddings_typer.command(
+    "cutover",
+    help="Switch search and ingestion to the migrated embedding space. Running apps and ingestion stop "
+         "with an error until restarted. Run it again to finish an interrupted cutover",
+)
+def cut_over_embeddings():
+    store = EmbeddingSpaceStore()
+    space = store.migrating_space()
+    if space is None:
+        # An interrupted cutover left the space active, with its column not indexed yet
+        space = store.active_space()
+        if space is None or not store.pending_schema_changes(space):
+            raise typer.BadParameter("No migration in progress, start one with `embeddings migrate`")
+    EmbeddingMigration(store, get_sentence_transformer_embedder(space.model)).cut_over(space)
+
 def get_video_table():
     table = Table(show_header=True, header_style="bold magenta")
 
@@ -113,6 +323,7 @@ def output_search_results(results: list[SearchResultChunk]):
     table.add_column("Document URL")
     table.add_column("Snippet")
     table.add_column("Distance")
+    table.add_column("Score")
     table.add_column("Start Time")
     table.add_column("End Time")
 
@@ -121,7 +332,8 @@ def output_search_results(results: list[SearchResultChunk]):
             result.document_title,
             result.document_url,
             result.text[:100]+ " ... (truncated)",
-            f"{result.distance:.2f}",
+            f"{result.distance:.2f}" if result.distance is not None else "-",
+            f"{result.score:.3f}" if result.score is not None else "-",
             str(result.start_ts),
             str(result.end_ts),
         )
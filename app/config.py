@@ -1,12 +1,87 @@
 import os
 
 PUNC_MODEL = "oliverguhr/fullstop-punctuation-multilang-large"
+# Number of merged transcript chunks punctuated per forward pass of the punctuation model
+PUNCTUATION_BATCH_SIZE = int(os.getenv("PUNCTUATION_BATCH_SIZE", "8"))
+# Model of the embedding space of a new database, search and ingestion then use the model of the active space
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# Dimension of EMBEDDING_MODEL vectors, used for the embedding column of a new database
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))
+# Chunks re-embedded and written per transaction by `embeddings migrate`
+EMBEDDING_MIGRATION_BATCH_SIZE = int(os.getenv("EMBEDDING_MIGRATION_BATCH_SIZE", "256"))
+# How often searches check that no other embedding space became active, writes check on every transaction
+EMBEDDING_SPACE_CHECK_SECONDS = float(os.getenv("EMBEDDING_SPACE_CHECK_SECONDS", "30"))
 TOKENS_PER_CHUNK = os.getenv("TOKENS_PER_CHUNK", 150)
 NUM_SEARCH_NEIGHBORS = os.getenv("NUM_SEARCH_NEIGHBORS", 5)
+# Where similarity search runs: "mariadb" (VEC_DISTANCE in the database), "numpy" (in-process exact search)
+# or "ann" (in-process IVF index built with `index build`)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "mariadb")
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", "data/ann_index")
+# Number of IVF lists scanned per query, higher is slower but closer to exact search
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+# Default ranking: "vector", "lexical" (BM25) or "hybrid" (both, fused); the last two build an in-process BM25 index
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
+# Hybrid search: candidates taken from each ranking per requested result, and the reciprocal rank fusion constant
+HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "4"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Optional second stage: the cross-encoder re-ranks k * multiplier first-stage candidates, and the
+# first-stage order is kept when the search would take longer than the time budget
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATE_MULTIPLIER = int(os.getenv("RERANK_CANDIDATE_MULTIPLIER", "4"))
+RERANK_TIME_BUDGET_SECONDS = float(os.getenv("RERANK_TIME_BUDGET_SECONDS", "0.5"))
+# Result diversification: none, collapse (best results of every video) or mmr (maximal marginal relevance),
+# picked from k * multiplier candidates after merging adjacent chunks of a video
+DIVERSIFY = os.getenv("DIVERSIFY", "none")
+DIVERSIFY_CANDIDATE_MULTIPLIER = int(os.getenv("DIVERSIFY_CANDIDATE_MULTIPLIER", "4"))
+COLLAPSE_MAX_PER_VIDEO = int(os.getenv("COLLAPSE_MAX_PER_VIDEO", "1"))
+# Weight of novelty against relevance in MMR, from 0 (relevance only) to 1
+MMR_DIVERSITY = float(os.getenv("MMR_DIVERSITY", "0.3"))
+# Filtered search scans only the matching chunks when they are at most this fraction of all chunks,
+# and otherwise filters the nearest neighbors found by the regular (index) search
+SEARCH_PREFILTER_SELECTIVITY = float(os.getenv("SEARCH_PREFILTER_SELECTIVITY", "0.05"))
+# Batch search: queries combined into one SQL statement, and query rows per in-process distance matrix
+SEARCH_MANY_QUERIES_PER_STATEMENT = int(os.getenv("SEARCH_MANY_QUERIES_PER_STATEMENT", "100"))
+SEARCH_MANY_QUERY_BLOCK_SIZE = int(os.getenv("SEARCH_MANY_QUERY_BLOCK_SIZE", "64"))
+# Search caches: query embeddings and full result lists, a size of 0 disables the cache
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+# Chunks of many videos are accumulated up to this size and embedded in batches of EMBEDDING_BATCH_SIZE
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+EMBEDDING_MAX_PENDING_TEXTS = int(os.getenv("EMBEDDING_MAX_PENDING_TEXTS", "2048"))
+# Persistent cache of chunk embeddings, reused when the same texts are embedded again
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "500000"))
 
 DB_USERNAME = os.getenv("DB_USER", "app_user")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "Password123!")
 DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
 DB_PORT = int(os.getenv("DB_PORT", "3306"))
 DB_NAME = os.getenv("DB_NAME", "semantic_search")
+# Bulk populate: documents written per transaction, and chunk rows per multi-row INSERT statement
+BULK_LOAD_DOCUMENTS_PER_TRANSACTION = int(os.getenv("BULK_LOAD_DOCUMENTS_PER_TRANSACTION", "50"))
+BULK_LOAD_ROWS_PER_INSERT = int(os.getenv("BULK_LOAD_ROWS_PER_INSERT", "1000"))
+# Connections shared by all repositories; idle ones are pinged before reuse after the health check interval
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("DB_POOL_HEALTH_CHECK_SECONDS", "60"))
+
+# Capacity of each queue between the stages of the pipelined `video populate` mode
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+# Documents (with their chunks) written per transaction when populating
+INGEST_COMMIT_INTERVAL = int(os.getenv("INGEST_COMMIT_INTERVAL", "20"))
+# Attempts per ingestion stage of a video, waiting backoff * 2^(attempt - 1) seconds before every retry
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_BACKOFF_SECONDS = float(os.getenv("INGEST_RETRY_BACKOFF_SECONDS", "1.0"))
+# Transcript mirror serving JSON transcripts at <url>/<video id>, transcripts are fetched from YouTube when empty
+TRANSCRIPT_SOURCE_URL = os.getenv("TRANSCRIPT_SOURCE_URL", "")
+# Transcript requests per second across all fetcher threads, in bursts of up to FETCH_BURST, 0 disables the limit
+FETCH_RATE_PER_SECOND = float(os.getenv("FETCH_RATE_PER_SECOND", "2.0"))
+FETCH_BURST = int(os.getenv("FETCH_BURST", "4"))
+# Attempts per transcript request, waiting backoff * 2^(attempt - 1) seconds before every retry
+FETCH_MAX_ATTEMPTS = int(os.getenv("FETCH_MAX_ATTEMPTS", "4"))
+FETCH_RETRY_BACKOFF_SECONDS = float(os.getenv("FETCH_RETRY_BACKOFF_SECONDS", "2.0"))
+# Concurrent transcript requests of `video prefetch`
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
@@ -0,0 +1,90 @@
+import logging
+from collections.abc import Callable, Hashable
+
+import numpy as np
+
+from app import config
+from app.services.protocols import Embedder
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Accumulates chunk texts of many documents and embeds them together.
+
+    Texts are sorted by token length before encoding, so every batch holds texts
+    of similar length and little compute is wasted on padding. The resulting
+    vectors are scattered back to the documents they belong to. Token lengths
+    known from chunking can be passed along with the texts, so they are not tokenized again.
+    """
+    def __init__(
+        self,
+        embedder: Embedder,
+        batch_size: int = config.EMBEDDING_BATCH_SIZE,
+        max_pending_texts: int = config.EMBEDDING_MAX_PENDING_TEXTS,
+        length_function: Callable[[list[str]], list[int]] | None = None,
+    ):
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.max_pending_texts = max_pending_texts
+        self.length_function = length_function or self._token_lengths
+        self._pending: list[tuple[Hashable, list[str], list[int] | None]] = []
+        self._num_pending_texts = 0
+
+    @property
+    def num_pending_texts(self) -> int:
+        return self._num_pending_texts
+
+    def is_full(self) -> bool:
+        return self._num_pending_texts >= self.max_pending_texts
+
+    def add(self, key: Hashable, texts: list[str], lengths: list[int] | None = None):
+        self._pending.append((key, texts, lengths))
+        self._num_pending_texts += len(texts)
+
+    def flush(self) -> dict[Hashable, np.ndarray]:
+        """Embed all pending texts and return vectors per key, in the order keys were added."""
+        pending, self._pending = self._pending, []
+        self._num_pending_texts = 0
+
+        texts = [text for _, key_texts, _ in pending for text in key_texts]
+        lengths = None
+        if all(key_lengths is not None for _, _, key_lengths in pending):
+            lengths = [length for _, _, key_lengths in pending for length in key_lengths]
+        vectors = self._embed_sorted(texts, lengths)
+
+        result = {}
+        offset = 0
+        for key, key_texts, _ in pending:
+            result[key] = vectors[offset:offset + len(key_texts)]
+            offset += len(key_texts)
+        return result
+
+    def _embed_sorted(self, texts: list[str], lengths: list[int] | None = None) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        # Longest first, so the first batch also reveals the peak memory usage early
+        if lengths is None:
+            lengths = self.length_function(texts)
+        order = np.argsort(lengths, kind="stable")[::-1]
+        logger.info(f"Embedding {len(texts)} chunks in batches of {self.batch_size}")
+
+        vectors = None
+        for start in range(0, len(texts), self.batch_size):
+            batch_indices = order[start:start + self.batch_size]
+            batch_vectors = self.embedder.embed_texts(
+                [texts[i] for i in batch_indices], batch_size=len(batch_indices),
+            )
+            if vectors is None:
+                vectors = np.empty((len(texts), batch_vectors.shape[1]), dtype=batch_vectors.dtype)
+            vectors[batch_indices] = batch_vectors
+        return vectors
+
+    def _token_lengths(self, texts: list[str]) -> list[int]:
+        tokenizer = getattr(self.embedder.get_model(), "tokenizer", None)
+        if tokenizer is None:
+            return [len(text) for text in texts]
+        encoded = tokenizer(texts, add_special_tokens=False)
+        return [len(ids) for ids in encoded["input_ids"]]
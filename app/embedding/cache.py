@@ -0,0 +1,242 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIR = Path(__file__).resolve().parents[2] / "data" / "embedding_cache"
+
+VECTORS_FILE = "vectors.npy"
+INDEX_FILE = "index.log"
+META_FILE = "meta.json"
+LOCK_FILE = "lock"
+
+# Share of the cache freed at once when it is full, so eviction does not run on every insert
+EVICTION_FRACTION = 0.1
+
+
+class EmbeddingCache:
+    """
+    Persistent store of embeddings keyed by (model name, normalized text hash).
+
+    Vectors live in a memory-mapped float32 matrix with `max_rows` rows, and a
+    hash -> row index is kept alongside it as an append-only log. When the matrix
+    is full, the least recently used rows are evicted and reused.
+    Recency of use is tracked in memory, after a restart it is approximated by insertion order.
+    A stored cache of another dimension than `dim`, or than the vectors put into it, is started over.
+
+    The files are loaded on first use, and then locked until `close()`, as processes
+    do not see each other's evictions. While another process holds them, every text
+    is a miss and nothing is stored.
+    """
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Path = EMBEDDING_CACHE_DIR,
+        max_rows: int = config.EMBEDDING_CACHE_MAX_ROWS,
+        dim: int | None = None,
+    ):
+        self.model_name = model_name
+        self.max_rows = max_rows
+        self.dim = dim
+        self.directory = cache_dir / re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._rows: dict[str, int] = {}
+        self._last_used: np.ndarray = np.zeros(max_rows, dtype=np.int64)
+        self._clock = 0
+        self._free_rows: list[int] = []
+        self._vectors: np.ndarray | None = None
+        self._lock_fd: int | None = None
+        self._locked_by_other_process = False
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, texts: list[str]) -> tuple[list[np.ndarray | None], list[int]]:
+        """Return cached vectors (None for misses) and the positions of the missing texts."""
+        vectors: list[np.ndarray | None] = []
+        missing = []
+        with self._lock:
+            if not self._open():
+                return [None] * len(texts), list(range(len(texts)))
+            for i, text in enumerate(texts):
+                row = self._rows.get(self._key(text))
+                if row is None:
+                    vectors.append(None)
+                    missing.append(i)
+                else:
+                    self._touch(row)
+                    vectors.append(np.array(self._vectors[row]))
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return vectors, missing
+
+    def put_many(self, texts: list[str], vectors: np.ndarray):
+        if len(texts) == 0:
+            return
+        with self._lock:
+            if not self._open():
+                return
+            if self._vectors is None or self._vectors.shape[1] != vectors.shape[1]:
+                if self._vectors is not None:
+                    logger.warning(
+                        f"Embedding cache at {self.directory} holds {self._vectors.shape[1]}-dimensional vectors, "
+                        f"starting over for {vectors.shape[1]}-dimensional ones"
+                    )
+                self._create(vectors.shape[1])
+            entries = []
+            for text, vector in zip(texts, vectors, strict=True):
+                key = self._key(text)
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._allocate_row()
+                    self._rows[key] = row
+                self._vectors[row] = vector
+                self._touch(row)
+                entries.append((key, row))
+            # Rows handed out earlier in the batch may have been evicted and reused by later texts since
+            self._append_index([(key, row) for key, row in entries if self._rows.get(key) == row])
+
+    def close(self):
+        """Release the cache files to other processes, they are loaded again on next use."""
+        with self._lock:
+            if self._lock_fd is None:
+                return
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._vectors = None
+            self._rows = {}
+            self._free_rows = []
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._rows),
+            "max_rows": self.max_rows,
+        }
+
+    def _key(self, text: str) -> str:
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha256(f"{self.model_name}\0{normalized}".encode()).hexdigest()
+
+    def _open(self) -> bool:
+        """Lock and load the cache files unless done already, returning whether this process can use them."""
+        if self._lock_fd is not None:
+            return True
+        if self._locked_by_other_process:
+            return False
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lock_fd = os.open(self.directory / LOCK_FILE, os.O_WRONLY | os.O_CREAT)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            logger.warning(f"Embedding cache at {self.directory} is used by another process, embedding without it")
+            self._locked_by_other_process = True
+            return False
+        self._lock_fd = lock_fd
+        self._load()
+        return True
+
+    def _touch(self, row: int):
+        self._clock += 1
+        self._last_used[row] = self._clock
+
+    def _allocate_row(self) -> int:
+        if not self._free_rows:
+            self._evict()
+        return self._free_rows.pop()
+
+    def _evict(self):
+        used_rows = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+        num_evicted = max(1, int(self.max_rows * EVICTION_FRACTION))
+        evicted = set(used_rows[np.argsort(self._last_used[used_rows])[:num_evicted]].tolist())
+        logger.debug(f"Evicting {len(evicted)} rows from the embedding cache")
+        self._rows = {key: row for key, row in self._rows.items() if row not in evicted}
+        self._free_rows.extend(sorted(evicted, reverse=True))
+        self._rewrite_index()
+
+    def _create(self, dim: int):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors = np.lib.format.open_memmap(
+            self.directory / VECTORS_FILE, mode="w+", dtype=np.float32, shape=(self.max_rows, dim),
+        )
+        self._rows = {}
+        self._free_rows = list(range(self.max_rows - 1, -1, -1))
+        with open(self.directory / META_FILE, "w") as f:
+            json.dump({"model_name": self.model_name, "dim": dim, "max_rows": self.max_rows}, f)
+        self._rewrite_index()
+
+    def _load(self):
+        vectors_path = self.directory / VECTORS_FILE
+        index_path = self.directory / INDEX_FILE
+        meta_path = self.directory / META_FILE
+        if not (vectors_path.exists() and index_path.exists() and meta_path.exists()):
+            return
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if (
+            meta["model_name"] != self.model_name
+            or meta["max_rows"] != self.max_rows
+            or (self.dim is not None and meta["dim"] != self.dim)
+        ):
+            logger.warning(f"Embedding cache at {self.directory} does not match the settings, starting over")
+            return
+
+        # Later lines of the log win, and their order approximates the recency of use
+        rows: dict[str, int] = {}
+        num_lines = 0
+        with open(index_path) as f:
+            for line in f:
+                key, row = line.split()
+                rows.pop(key, None)
+                rows[key] = int(row)
+                num_lines += 1
+
+        self._vectors = np.load(vectors_path, mmap_mode="r+")
+        self._rows = rows
+        for row in rows.values():
+            self._touch(row)
+        used = set(rows.values())
+        self._free_rows = [row for row in range(self.max_rows - 1, -1, -1) if row not in used]
+        if num_lines > 2 * len(rows):
+            self._rewrite_index()
+        logger.info(f"Loaded {len(rows)} cached embeddings from {self.directory}")
+
+    def _append_index(self, entries: list[tuple[str, int]]):
+        # Vectors are flushed first, so that the index never points to rows that are not on disk
+        self._vectors.flush()
+        with open(self.directory / INDEX_FILE, "a") as f:
+            f.writelines(f"{key} {row}\n" for key, row in entries)
+
+    def _rewrite_index(self):
+        self._vectors.flush()
+        rows = sorted(self._rows.items(), key=lambda item: self._last_used[item[1]])
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.writelines(f"{key} {row}\n" for key, row in rows)
+            os.replace(tmp_path, self.directory / INDEX_FILE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -1,22 +1,47 @@
+import threading
 import numpy as np
 
 from sentence_transformers import SentenceTransformer
-from functools import lru_cache
+
+from app.embedding.cache import EmbeddingCache
 
 
 class SentenceTransformerEmbedder:
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, cache: EmbeddingCache | None = None):
         self.model_name = model_name
+        self.cache = cache
+        self._model: SentenceTransformer | None = None
+        self._model_lock = threading.Lock()
 
-    @lru_cache
     def get_model(self) -> SentenceTransformer:
-        return SentenceTransformer(self.model_name)
+        # Loaded once per embedder instance, even when several threads ask for it at the same time
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
 
     def embed_text(self,text: str) -> np.ndarray:
         vec = self.get_model().encode(text, convert_to_numpy=True, show_progress_bar=False)
         return vec
 
-    def embed_texts(self,texts: list[str], batch_size: int = 32) -> np.ndarray:
+    def embed_texts(self,texts: list[str], batch_size: int = 32, use_cache: bool = True) -> np.ndarray:
+        # One-off texts like search queries skip the cache, so they do not evict chunk embeddings
+        if self.cache is None or not use_cache:
+            return self._encode(texts, batch_size)
+
+        cached, missing = self.cache.get_many(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            vecs = self._encode(missing_texts, batch_size)
+            self.cache.put_many(missing_texts, vecs)
+            for i, vec in zip(missing, vecs, strict=True):
+                cached[i] = vec
+        if not cached:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(cached).astype(np.float32, copy=False)
+
+    def _encode(self, texts: list[str], batch_size: int) -> np.ndarray:
         vecs = self.get_model().encode(
             texts,
             batch_size=batch_size,
@@ -25,5 +50,5 @@ class SentenceTransformerEmbedder:
         )
         return vecs
 
-def get_sentence_transformer_embedder(model_name: str) -> SentenceTransformerEmbedder:
-    return SentenceTransformerEmbedder(model_name)
+def get_sentence_transformer_embedder(model_name: str, cache: EmbeddingCache | None = None) -> SentenceTransformerEmbedder:
+    return SentenceTransformerEmbedder(model_name, cache=cache)
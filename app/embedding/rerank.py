@@ -0,0 +1,30 @@
+import threading
+
+import numpy as np
+from sentence_transformers import CrossEncoder
+
+
+class CrossEncoderReranker:
+    """Scores (query, text) pairs with a cross-encoder, which reads both together and ranks better than embeddings."""
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model: CrossEncoder | None = None
+        self._model_lock = threading.Lock()
+
+    def get_model(self) -> CrossEncoder:
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def score(self, query: str, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty(0, dtype=np.float32)
+        # All candidates go through the model in a single batch
+        return self.get_model().predict(
+            [(query, text) for text in texts],
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
@@ -4,11 +4,15 @@ import re
 import math
 from typing import List, Tuple
 
-from app.services.search import get_default_video_search_service
+from app import config
+from app.services.diversify import DIVERSIFY_MODES
+from app.services.search import SEARCH_MODES, get_default_video_search_service
 from app.services.crud import get_default_video_crud
-from app.storage.models import SearchResultChunk
+from app.services.registry import get_registry
+from app.storage.models import SearchFilters, SearchResultChunk
 from app.youtube.data_loader import Video
 from app.logs import setup_console_logging
+from app.metrics import metrics
 
 # YouTube thumbnail URL format
 YOUTUBE_THUMBNAIL_URL = "https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
@@ -140,7 +144,10 @@ def search_results_to_html(results: List[SearchResultChunk]) -> str:
         
         formatted_start = format_time(result.start_ts)
         formatted_end = format_time(result.end_ts)
-        rating_stars = get_rating_stars(result.distance)
+        if result.distance is not None:
+            relevance = f"{result.distance:.2f} - {get_rating_stars(result.distance)}"
+        else:
+            relevance = f"Keyword match, score {result.score:.3f}"
         
         html_content += f"""
         <div style="display: flex; margin-bottom: 20px; border: 1px solid #ddd; padding: 10px; border-radius: 5px;">
@@ -156,7 +163,7 @@ def search_results_to_html(results: List[SearchResultChunk]) -> str:
                     </a>
                 </h3>
                 <p><strong>Time:</strong> {formatted_start} - {formatted_end}</p>
-                <p><strong>Relevance:</strong> {result.distance:.2f} - {rating_stars}</p>
+                <p><strong>Relevance:</strong> {relevance}</p>
                 <div style="background-color: #f8f9fa; padding: 10px; border-radius: 5px; margin-top: 5px; border: 1px solid #e1e4e8; color: #24292e;">
                     {result.text}
                 </div>
@@ -166,12 +173,24 @@ def search_results_to_html(results: List[SearchResultChunk]) -> str:
     
     return html_content
 
-def search_videos(query: str, num_neighbors: int) -> str:
-    """Search videos with the given query."""
+def search_videos(
+    query: str, num_neighbors: int, filters_text: str = "", mode: str | None = None, diversify: str | None = None,
+) -> str:
+    """Search videos with the given query, optionally filtered by comma separated key=value pairs."""
     if not query.strip():
         return "<p>Please enter a search query.</p>"
+
+    try:
+        filters = SearchFilters.parse([f for f in filters_text.split(",") if f.strip()])
+    except ValueError as e:
+        return f"<p>{e}</p>"
     
-    results = get_default_video_search_service().search(query, num_neighbors=num_neighbors)
+    try:
+        results = get_default_video_search_service().search(
+            query, num_neighbors=num_neighbors, filters=filters, mode=mode, diversify=diversify,
+        )
+    except ValueError as e:
+        return f"<p>{e}</p>"
     return search_results_to_html(results)
 
 def create_ui() -> gr.Blocks:
@@ -270,9 +289,36 @@ def create_ui() -> gr.Blocks:
                     info="How many search results to return"
                 )
                 search_btn = gr.Button("Search")
+            filters_input = gr.Textbox(
+                label="Filters",
+                placeholder="conference=PyCon US, year=2023",
+                info="Only search videos with these metadata values, comma separated key=value pairs",
+            )
+            
+            mode_radio = gr.Radio(
+                choices=list(SEARCH_MODES),
+                value=config.SEARCH_MODE,
+                label="Ranking",
+                info="Semantic similarity, keyword matches (needs SEARCH_MODE=lexical or hybrid), or both",
+            )
+            diversify_radio = gr.Radio(
+                choices=list(DIVERSIFY_MODES),
+                value=config.DIVERSIFY,
+                label="Diversify",
+                info="Merge adjacent chunks and keep the best result per video, or balance relevance and novelty (MMR)",
+            )
             
             results_html = gr.HTML()
-            search_btn.click(fn=search_videos, inputs=[search_input, neighbors_slider], outputs=results_html)
+            search_btn.click(
+                fn=search_videos,
+                inputs=[search_input, neighbors_slider, filters_input, mode_radio, diversify_radio],
+                outputs=results_html,
+            )
+
+        with gr.Tab("Metrics"):
+            metrics_json = gr.JSON()
+            metrics_refresh_btn = gr.Button("Refresh")
+            metrics_refresh_btn.click(fn=metrics.snapshot, outputs=metrics_json)
         
         # Initialize with the video list
         demo.load(
@@ -285,6 +331,8 @@ def create_ui() -> gr.Blocks:
 def main():
     """Run the Gradio app."""
     setup_console_logging()
+    # Load the embedding model once at startup instead of on the first search
+    get_registry().warm_up()
     app = create_ui()
     app.launch(server_name="0.0.0.0", server_port=7860)
 
@@ -2,7 +2,6 @@ from typing import Tuple, List
 
 from app.youtube.data_loader import Video
 from app.services.protocols import ReadOnlyRepository
-from app.storage.repository import NativeMariadDBRepository
 
 class VideoCRUD:
     def __init__(self, repository: ReadOnlyRepository):
@@ -57,5 +56,5 @@ class VideoCRUD:
         return videos, total_count
 
 def get_default_video_crud() -> VideoCRUD:
-    repository = NativeMariadDBRepository()
-    return VideoCRUD(repository)
+    from app.services.registry import get_registry
+    return get_registry().video_crud
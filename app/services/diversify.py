@@ -0,0 +1,97 @@
+import numpy as np
+
+from app.storage.models import SearchResultChunk
+
+# "none" keeps the ranking as is, "collapse" keeps the best results of every video,
+# "mmr" trades relevance for novelty with maximal marginal relevance
+DIVERSIFY_MODES = ("none", "collapse", "mmr")
+
+
+def merge_adjacent_chunks(results: list[SearchResultChunk]) -> list[SearchResultChunk]:
+    """
+    Merge results that are consecutive chunks of the same video into one result spanning their time ranges.
+
+    A merged result takes the place of its best ranked chunk, with the smallest distance
+    and highest score of its chunks, their texts in chunk order, and their mean embedding.
+    """
+    positions_by_document: dict[str, list[int]] = {}
+    for position, result in enumerate(results):
+        positions_by_document.setdefault(result.document_url, []).append(position)
+
+    merged: list[tuple[int, SearchResultChunk]] = []
+    for positions in positions_by_document.values():
+        positions.sort(key=lambda position: results[position].chunk_index)
+        run = [positions[0]]
+        for position in positions[1:]:
+            if results[position].chunk_index - results[run[-1]].chunk_index <= 1:
+                run.append(position)
+            else:
+                merged.append((min(run), _merge_run([results[i] for i in run], results[min(run)])))
+                run = [position]
+        merged.append((min(run), _merge_run([results[i] for i in run], results[min(run)])))
+
+    merged.sort(key=lambda item: item[0])
+    return [result for _, result in merged]
+
+
+def collapse_by_document(
+    results: list[SearchResultChunk], num_results: int, max_per_document: int = 1,
+) -> list[SearchResultChunk]:
+    """Keep the first `max_per_document` results of every video, in ranking order."""
+    kept: list[SearchResultChunk] = []
+    counts: dict[str, int] = {}
+    for result in results:
+        if counts.get(result.document_url, 0) < max_per_document:
+            counts[result.document_url] = counts.get(result.document_url, 0) + 1
+            kept.append(result)
+            if len(kept) == num_results:
+                break
+    return kept
+
+
+def maximal_marginal_relevance(
+    query_vector: np.ndarray, embeddings: np.ndarray, num_results: int, diversity: float = 0.3,
+) -> list[int]:
+    """
+    Greedily pick rows of `embeddings` that are similar to the query but not to the rows picked before.
+
+    Every step picks the row maximizing `(1 - diversity) * sim(query, row) - diversity * max sim(row, picked)`,
+    with cosine similarities computed once for all candidates.
+    """
+    num_results = min(num_results, len(embeddings))
+    if num_results <= 0:
+        return []
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+    relevance = embeddings @ query_vector
+    similarity = embeddings @ embeddings.T
+
+    picked: list[int] = []
+    redundancy = np.zeros(len(embeddings), dtype=relevance.dtype)
+    available = np.ones(len(embeddings), dtype=bool)
+    for _ in range(num_results):
+        scores = np.where(available, (1 - diversity) * relevance - diversity * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
+
+
+def _merge_run(run: list[SearchResultChunk], best: SearchResultChunk) -> SearchResultChunk:
+    if len(run) == 1:
+        return best
+    distances = [result.distance for result in run if result.distance is not None]
+    scores = [result.score for result in run if result.score is not None]
+    embedding = None
+    if all(result.embedding is not None for result in run):
+        embedding = np.mean([result.embedding for result in run], axis=0)
+    return best.model_copy(update={
+        "chunk_index": run[0].chunk_index,
+        "start_ts": min(result.start_ts for result in run),
+        "end_ts": max(result.end_ts for result in run),
+        "text": " ".join(result.text for result in run),
+        "distance": min(distances) if distances else None,
+        "score": max(scores) if scores else None,
+        "embedding": embedding,
+    })
@@ -0,0 +1,127 @@
+import logging
+import time
+from collections.abc import Callable
+
+from app import config
+from app.metrics import metrics
+from app.services.protocols import Embedder
+from app.storage.embedding_spaces import EmbeddingSpaceStore
+from app.storage.models import EmbeddingSpace
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationProgress:
+    """Chunks embedded in the new space so far, with the throughput of this run and the time left at that rate."""
+    def __init__(self, embedded: int, total: int, embedded_this_run: int, elapsed_seconds: float):
+        self.embedded = embedded
+        self.total = total
+        self.embedded_this_run = embedded_this_run
+        self.elapsed_seconds = elapsed_seconds
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.embedded_this_run / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    @property
+    def eta_seconds(self) -> float | None:
+        remaining = self.total - self.embedded
+        if remaining <= 0:
+            return 0.0
+        return remaining / self.chunks_per_second if self.chunks_per_second > 0 else None
+
+    def __str__(self) -> str:
+        percent = 100 * self.embedded / self.total if self.total else 100.0
+        eta = f"{self.eta_seconds:.0f}s" if self.eta_seconds is not None else "-"
+        return (
+            f"{self.embedded}/{self.total} chunks ({percent:.1f}%), "
+            f"{self.chunks_per_second:.0f} chunks/s, ETA {eta}"
+        )
+
+
+class EmbeddingMigration:
+    """
+    Re-embeds all chunks with another model into a new embedding space, then cuts search over to it.
+
+    The migration runs in batches of `batch_size` chunks, each embedded in one call
+    and written in one transaction together with the resume point, so an interrupted
+    run continues where it stopped. Chunks ingested meanwhile are picked up by the
+    next batches. Search and ingestion use the active space until `cut_over()`.
+    """
+    def __init__(
+        self,
+        store: EmbeddingSpaceStore,
+        embedder: Embedder,
+        batch_size: int = config.EMBEDDING_MIGRATION_BATCH_SIZE,
+        on_progress: Callable[[MigrationProgress], None] | None = None,
+    ):
+        self.store = store
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.on_progress = on_progress or (lambda progress: logger.info(f"Embedding migration: {progress}"))
+
+    def start(self, model: str, dim: int) -> EmbeddingSpace:
+        """The migrating space of the model, created unless an interrupted migration to it is resumed."""
+        space = self.store.migrating_space()
+        if space is None:
+            return self.store.create_space(model, dim)
+        if space.model != model or space.dim != dim:
+            raise ValueError(
+                f"A migration to {space.model} ({space.dim} dimensions) is in progress, finish it first"
+            )
+        logger.info(f"Resuming the migration to {model} after chunk {space.migrated_chunk_id}")
+        return space
+
+    def run(self, space: EmbeddingSpace) -> MigrationProgress:
+        """Embed all chunks missing from the space, reporting progress after every batch."""
+        embedded, total = self.store.count_chunks(space)
+        started_at = time.perf_counter()
+        embedded_this_run = 0
+        progress = MigrationProgress(embedded, total, 0, 0.0)
+        # None continues from the resume point of the space
+        after_id = None
+        while True:
+            batch = self.store.chunks_to_embed(space, self.batch_size, after_id=after_id)
+            if not batch:
+                if after_id is not None:
+                    break
+                # A chunk can commit with an id below the resume point, e.g. when it was inserted
+                # concurrently, so remaining chunks are looked up once more from the first id
+                embedded_now, total_now = self.store.count_chunks(space)
+                if embedded_now >= total_now:
+                    break
+                logger.info(f"Embedding {total_now - embedded_now} chunks committed behind the resume point")
+                after_id = 0
+                continue
+            chunk_ids = [chunk_id for chunk_id, _ in batch]
+            if after_id is not None:
+                after_id = chunk_ids[-1]
+            embeddings = self.embedder.embed_texts([text for _, text in batch])
+            if embeddings.shape[1] != space.dim:
+                raise ValueError(f"{space.model} returned {embeddings.shape[1]} dimensions, expected {space.dim}")
+            self.store.write_embeddings(space, chunk_ids, embeddings)
+            metrics.increment("embedding_migration.chunks", len(batch))
+
+            embedded_this_run += len(batch)
+            # Chunks ingested during the run grow the total as well
+            progress = MigrationProgress(
+                embedded + embedded_this_run,
+                max(total, embedded + embedded_this_run),
+                embedded_this_run,
+                time.perf_counter() - started_at,
+            )
+            self.on_progress(progress)
+        return progress
+
+    def cut_over(self, space: EmbeddingSpace):
+        """
+        Embed the chunks ingested since the last run, then make the space the active one.
+
+        Calling it again for the active space finishes an interrupted cutover.
+        """
+        self.run(space)
+        embedded, total = self.store.count_chunks(space)
+        if embedded < total:
+            raise RuntimeError(f"{total - embedded} chunks are not embedded in space {space.id}, run the migration again")
+        self.store.cut_over(space)
+        logger.info(f"Search now uses {space.model}, restart running apps and ingestion to switch to it")
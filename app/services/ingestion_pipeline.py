@@ -0,0 +1,245 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from pydantic import BaseModel, Field
+from youtube_transcript_api import FetchedTranscript
+
+from app import config
+from app.embedding.batcher import EmbeddingBatcher
+from app.storage.chunk_batch import ChunkBatch
+from app.storage.embedding_spaces import EmbeddingSpaceChangedError
+from app.youtube.data_loader import Video, video_id_from_url
+
+if TYPE_CHECKING:
+    from app.services.video_processing import VideoProcessingService
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream for a single stage worker
+_DONE = object()
+
+
+def add_to_batcher(batcher: EmbeddingBatcher, key: int, chunks: ChunkBatch):
+    # Chunks read from the chunk cache have no token counts
+    token_counts = chunks.token_counts
+    batcher.add(key, chunks.texts, token_counts.tolist() if token_counts is not None else None)
+
+
+class VideoWorkItem:
+    """A video travelling through the pipeline together with its intermediate results."""
+    def __init__(self, video: Video):
+        self.video = video
+        self.transcript: FetchedTranscript | None = None
+        self.chunks: ChunkBatch | None = None
+        self.vectors: np.ndarray | None = None
+
+
+class IngestionStats(BaseModel):
+    total: int = 0
+    skipped: int = 0
+    stored: int = 0
+    failed: list[str] = Field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+
+class VideoIngestionPipeline:
+    """
+    Staged ingestion of many videos:
+
+        fetch (thread pool, I/O bound) -> chunk (CPU bound) -> embed (batched across videos)
+            -> store (single DB writer)
+
+    Stages are connected with bounded queues, so a slow stage applies back-pressure
+    to the previous one instead of buffering whole transcripts in memory.
+    The embedding stage takes every chunked video that is already waiting and embeds
+    their chunks together, and a single writer keeps all database access on one thread.
+    """
+    def __init__(
+        self,
+        service: "VideoProcessingService",
+        fetch_workers: int = 4,
+        process_workers: int = 1,
+        queue_size: int = config.INGEST_QUEUE_SIZE,
+        batcher: EmbeddingBatcher | None = None,
+    ):
+        self.service = service
+        self.fetch_workers = max(1, fetch_workers)
+        self.process_workers = max(1, process_workers)
+        self.queue_size = max(1, queue_size)
+        self.batcher = batcher or EmbeddingBatcher(service.embedder)
+        self._stats_lock = threading.Lock()
+        # Set when the active embedding space changed, the run drains its queues and fails with it
+        self._space_changed: EmbeddingSpaceChangedError | None = None
+
+    def run(self, videos: list[Video]) -> IngestionStats:
+        stats = IngestionStats(total=len(videos))
+        started_at = time.perf_counter()
+        # With a unit of work, videos are stored once their batch is committed, not when they are added to it
+        unit_of_work = self.service.unit_of_work
+        if unit_of_work is not None:
+            committed_before = unit_of_work.num_documents
+            failed_before = len(unit_of_work.failed_documents)
+
+        # Existence checks run upfront, so that only the writer stage touches the database later on
+        pending = []
+        for video in videos:
+            if self.service.is_video_stored(video):
+                logger.info(f"Document {video.id} already exists, skipping")
+                stats.skipped += 1
+            else:
+                pending.append(video)
+
+        logger.info(
+            f"Processing {len(pending)} videos with {self.fetch_workers} fetch workers "
+            f"and {self.process_workers} processing workers"
+        )
+
+        to_fetch: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        fetched: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        chunked: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        embedded: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            self._start_stage("fetch", self.fetch_workers, self._fetch, to_fetch, fetched, stats),
+            self._start_stage("chunk", self.process_workers, self._chunk, fetched, chunked, stats),
+            self._start_threads("embed", 1, self._run_embed_worker, (chunked, embedded, stats)),
+            self._start_stage("store", 1, self._store, embedded, None, stats),
+        ]
+        inboxes = [to_fetch, fetched, chunked, embedded]
+
+        for video in pending:
+            to_fetch.put(VideoWorkItem(video))
+
+        # Shut the stages down in order: each one drains its inbox before the next one is told to stop
+        for inbox, workers in zip(inboxes, stages, strict=True):
+            for _ in workers:
+                inbox.put(_DONE)
+            for worker in workers:
+                worker.join()
+
+        if unit_of_work is not None:
+            try:
+                unit_of_work.commit()
+            except Exception:
+                logger.exception("Failed to commit the last ingested videos")
+            stats.stored = unit_of_work.num_documents - committed_before
+            for document in unit_of_work.failed_documents[failed_before:]:
+                video_id = video_id_from_url(document.url)
+                if video_id not in stats.failed:
+                    stats.failed.append(video_id)
+
+        stats.elapsed_seconds = time.perf_counter() - started_at
+        logger.info(
+            f"Stored {stats.stored} videos in {stats.elapsed_seconds:.1f}s "
+            f"({stats.skipped} skipped, {len(stats.failed)} failed)"
+        )
+        if stats.failed:
+            logger.warning(f"Failed videos: {', '.join(stats.failed)}")
+        if self._space_changed is not None:
+            raise self._space_changed
+        return stats
+
+    def _fetch(self, item: VideoWorkItem) -> VideoWorkItem:
+        logger.info(f"Fetching transcript for video {item.video.id}")
+        item.transcript = self.service.fetch_transcript(item.video)
+        return item
+
+    def _chunk(self, item: VideoWorkItem) -> VideoWorkItem:
+        logger.info(f"Splitting transcript of video {item.video.id} into chunks")
+        item.chunks = self.service.chunk_transcript(item.video, item.transcript)
+        return item
+
+    def _store(self, item: VideoWorkItem) -> None:
+        self.service.store_video(item.video, item.chunks, item.vectors)
+
+    def _start_stage(
+        self,
+        name: str,
+        num_workers: int,
+        handler: Callable[[VideoWorkItem], Any],
+        inbox: queue.Queue,
+        outbox: queue.Queue | None,
+        stats: IngestionStats,
+    ) -> list[threading.Thread]:
+        return self._start_threads(name, num_workers, self._run_worker, (handler, inbox, outbox, stats))
+
+    def _start_threads(
+        self, name: str, num_workers: int, target: Callable[..., None], args: tuple,
+    ) -> list[threading.Thread]:
+        workers = [
+            threading.Thread(target=target, args=args, name=f"ingest-{name}-{i}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        return workers
+
+    def _run_worker(
+        self,
+        handler: Callable[[VideoWorkItem], Any],
+        inbox: queue.Queue,
+        outbox: queue.Queue | None,
+        stats: IngestionStats,
+    ):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+
+            try:
+                result = handler(item)
+            except EmbeddingSpaceChangedError as e:
+                self._space_changed = e
+                with self._stats_lock:
+                    stats.failed.append(item.video.id)
+                continue
+            except Exception:
+                logger.exception(f"Failed to ingest video {item.video.id}")
+                with self._stats_lock:
+                    stats.failed.append(item.video.id)
+                continue
+
+            if outbox is not None:
+                outbox.put(result)
+            elif self.service.unit_of_work is None:
+                with self._stats_lock:
+                    stats.stored += 1
+
+    def _run_embed_worker(self, inbox: queue.Queue, outbox: queue.Queue, stats: IngestionStats):
+        done = False
+        while not done:
+            # Block for the first video, then take whatever else is already waiting
+            items = []
+            item = inbox.get()
+            while True:
+                if item is _DONE:
+                    done = True
+                    break
+                items.append(item)
+                add_to_batcher(self.batcher, len(items) - 1, item.chunks)
+                if self.batcher.is_full():
+                    break
+                try:
+                    item = inbox.get_nowait()
+                except queue.Empty:
+                    break
+
+            if not items:
+                continue
+
+            try:
+                vectors = self.service.embed_pending([item.video for item in items], self.batcher)
+            except Exception:
+                logger.exception(f"Failed to embed chunks of {len(items)} videos")
+                with self._stats_lock:
+                    stats.failed.extend(item.video.id for item in items)
+                continue
+
+            for i, item in enumerate(items):
+                item.vectors = vectors[i]
+                outbox.put(item)
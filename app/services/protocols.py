@@ -1,15 +1,17 @@
 import numpy as np
 
-from typing import Protocol, Tuple
+from collections.abc import Iterable, Iterator
+from typing import Protocol
 from youtube_transcript_api import FetchedTranscript
 from sentence_transformers import SentenceTransformer
 
 from app.chunking.chunk import Chunk
-from app.storage.models import Document, SearchResultChunk
+from app.storage.chunk_batch import ChunkBatch
+from app.storage.models import Chunk as DBChunk, Document, SearchFilters, SearchResultChunk
 
 
 class TranscriptChunker(Protocol):
-    def split_into_chunks(self, transcript: FetchedTranscript) -> list[Chunk]:
+    def split_into_chunks(self, transcript: FetchedTranscript) -> Iterable[Chunk]:
         ...
 
 
@@ -17,13 +19,19 @@ class Embedder(Protocol):
     def embed_text(self, text: str) -> np.ndarray:
         ...
 
-    def embed_texts(self, texts: list[str], batch_size: int = 32) -> np.ndarray:
+    def embed_texts(self, texts: list[str], batch_size: int = 32, use_cache: bool = True) -> np.ndarray:
         ...
 
     def get_model(self) -> SentenceTransformer:
         ...
 
 
+class Reranker(Protocol):
+    def score(self, query: str, texts: list[str]) -> np.ndarray:
+        """Relevance of every text to the query, higher is better."""
+        ...
+
+
 class TranscriptFetcher(Protocol):
     def fetch(self, video_id: str) -> FetchedTranscript:
         ...
@@ -34,7 +42,7 @@ class ReadOnlyRepository(Protocol):
         """List all documents (legacy method)."""
         ...
 
-    def list_documents_paginated(self, limit: int, offset: int) -> Tuple[list[Document], int]:
+    def list_documents_paginated(self, limit: int, offset: int) -> tuple[list[Document], int]:
         """
         List documents with pagination.
         
@@ -55,8 +63,15 @@ class ReadOnlyRepository(Protocol):
     def is_document_exists(self, url: str) -> bool:
         ...
 
+    def iter_chunks(self, batch_size: int = 10000) -> Iterator[list[DBChunk]]:
+        """Iterate over all stored chunks with their embeddings, in batches."""
+        ...
+
 
 class Repository(ReadOnlyRepository):
+    # Incremented whenever chunks are inserted, used to invalidate cached search results
+    index_version: int
+
     def insert_document(self, document: Document) -> int:
         ...
 
@@ -66,6 +81,29 @@ class Repository(ReadOnlyRepository):
     def insert_chunks(self, chunks: list[Chunk]):
         ...
 
-    def search(self, query_vector: np.ndarray, num_neighbors: int) -> list[SearchResultChunk]:
+    def bulk_insert(self, items: list[tuple[Document, list[DBChunk] | ChunkBatch]]) -> list[int]:
+        """Insert documents with their chunks in one transaction, returning the document ids."""
         ...
 
+    def search(
+        self,
+        query_vector: np.ndarray,
+        num_neighbors: int,
+        filters: SearchFilters | None = None,
+        with_embeddings: bool = False,
+    ) -> list[SearchResultChunk]:
+        """Nearest neighbors of the query, with their embeddings set if `with_embeddings`."""
+        ...
+
+    def search_many(self, query_vectors: np.ndarray, num_neighbors: int) -> list[list[SearchResultChunk]]:
+        """Nearest neighbors for every row of `query_vectors`, in the same order."""
+        ...
+
+
+
+class LexicalIndex(Protocol):
+    def lexical_search(
+        self, query: str, num_results: int, filters: SearchFilters | None = None,
+    ) -> list[SearchResultChunk]:
+        """Chunks ranked by term matches with the query, best first."""
+        ...
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+
+from app.metrics import Metrics
+from app.metrics import metrics as default_metrics
+
+
+class LRUCache[V]:
+    """
+    Bounded, thread-safe LRU cache with an optional time-to-live per entry.
+
+    Hits and misses are reported as `<name>.hits` / `<name>.misses` counters.
+    """
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        ttl_seconds: float | None = None,
+        metrics: Metrics = default_metrics,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.metrics = metrics
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.metrics.increment(f"{self.name}.misses")
+                return None
+            self._entries.move_to_end(key)
+        self.metrics.increment(f"{self.name}.hits")
+        return entry[1]
+
+    def put(self, key: Hashable, value: V):
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self) -> float:
+        counters = self.metrics.snapshot()["counters"]
+        hits = counters.get(f"{self.name}.hits", 0)
+        misses = counters.get(f"{self.name}.misses", 0)
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and self._clock() - created_at > self.ttl_seconds
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split())
@@ -0,0 +1,190 @@
+import logging
+import threading
+from collections.abc import Callable
+from functools import lru_cache
+from pathlib import Path
+from typing import TypeVar
+
+from app import config
+from app.chunking.cache import ChunkCache
+from app.embedding.cache import EmbeddingCache
+from app.embedding.embed import get_sentence_transformer_embedder
+from app.embedding.rerank import CrossEncoderReranker
+from app.services.crud import VideoCRUD
+from app.services.protocols import Embedder, Repository
+from app.services.query_cache import LRUCache
+from app.services.search import VideoSearchService
+from app.services.video_processing import VideoProcessingService
+from app.storage.ann_index import IVFVectorIndex
+from app.storage.embedding_spaces import EmbeddingSpaceStore
+from app.storage.ingestion_state import IngestionStateStore
+from app.storage.lexical_index import BM25Index
+from app.storage.models import EmbeddingSpace
+from app.storage.numpy_index import NumpyVectorIndex
+from app.storage.repository import NativeMariadDBRepository
+from app.youtube.fetcher import ConcurrentTranscriptFetcher, transcript_source
+from app.youtube.transcript_store import TranscriptStore
+from app.youtube.transform import TranscriptSentencesChunker, get_punctuator
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ServiceRegistry:
+    """
+    Process-wide container of shared, lazily-initialized services.
+
+    Every component is built at most once, on first access, and then reused by
+    the CLI and the Gradio frontend, so heavy models are not reloaded per request.
+    Initialization is guarded by a lock, as Gradio runs handlers in worker threads.
+    The embedder and the repository follow the active embedding space, read when the
+    first of them is built.
+    """
+    def __init__(
+        self,
+        embedder_factory: Callable[[], Embedder] | None = None,
+        repository_factory: Callable[[], Repository] | None = None,
+        embedding_space_factory: Callable[[], EmbeddingSpace] | None = None,
+    ):
+        self._embedder_factory = embedder_factory or (lambda: _default_embedder(self.embedding_space))
+        self._repository_factory = repository_factory or (lambda: _default_repository(self.embedding_space))
+        self._embedding_space_factory = embedding_space_factory or (lambda: EmbeddingSpaceStore().current_space())
+        self._instances: dict[str, object] = {}
+        self._lock = threading.RLock()
+
+    def _get_or_create(self, name: str, factory: Callable[[], T]) -> T:
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    logger.debug(f"Initializing {name}")
+                    instance = factory()
+                    self._instances[name] = instance
+        return instance
+
+    @property
+    def embedding_space(self) -> EmbeddingSpace:
+        return self._get_or_create("embedding_space", self._embedding_space_factory)
+
+    @property
+    def embedder(self) -> Embedder:
+        return self._get_or_create("embedder", self._embedder_factory)
+
+    @property
+    def punctuator(self):
+        return self._get_or_create("punctuator", get_punctuator)
+
+    @property
+    def reranker(self) -> CrossEncoderReranker:
+        return self._get_or_create("reranker", lambda: CrossEncoderReranker(config.RERANK_MODEL))
+
+    @property
+    def repository(self) -> Repository:
+        return self._get_or_create("repository", self._repository_factory)
+
+    @property
+    def transcript_fetcher(self) -> ConcurrentTranscriptFetcher:
+        return self._get_or_create(
+            "transcript_fetcher", lambda: ConcurrentTranscriptFetcher(transcript_source(), TranscriptStore()),
+        )
+
+    @property
+    def search_service(self) -> VideoSearchService:
+        return self._get_or_create(
+            "search_service",
+            lambda: VideoSearchService(
+                self.repository,
+                self.embedder,
+                query_cache=_optional_cache(
+                    "search.query_cache", config.QUERY_CACHE_SIZE, config.QUERY_CACHE_TTL_SECONDS,
+                ),
+                result_cache=_optional_cache(
+                    "search.result_cache", config.RESULT_CACHE_SIZE, config.RESULT_CACHE_TTL_SECONDS,
+                ),
+                lexical_index=self.repository if isinstance(self.repository, BM25Index) else None,
+                reranker=self.reranker if config.RERANK_ENABLED else None,
+            ),
+        )
+
+    @property
+    def video_crud(self) -> VideoCRUD:
+        return self._get_or_create("video_crud", lambda: VideoCRUD(self.repository))
+
+    @property
+    def video_processing_service(self) -> VideoProcessingService:
+        return self._get_or_create(
+            "video_processing_service",
+            lambda: VideoProcessingService(
+                self.repository,
+                self.transcript_fetcher,
+                TranscriptSentencesChunker(
+                    self.embedder.get_model(), config.TOKENS_PER_CHUNK, cache=ChunkCache(),
+                ),
+                self.embedder,
+                ingestion_state=IngestionStateStore(),
+                # The transcript fetcher retries failed requests itself
+                fetch_max_attempts=1,
+            ),
+        )
+
+    def warm_up(self, punctuator: bool = False):
+        """
+        Load models ahead of the first request.
+
+        The punctuation model is only needed for ingestion, so it is skipped by default.
+        """
+        logger.info("Warming up the embedding model")
+        self.embedder.get_model()
+        if config.RERANK_ENABLED:
+            logger.info(f"Warming up re-ranking model {config.RERANK_MODEL}")
+            self.reranker.get_model()
+        if punctuator:
+            logger.info(f"Warming up punctuation model {config.PUNC_MODEL}")
+            _ = self.punctuator
+
+    def reset(self):
+        with self._lock:
+            self._instances.clear()
+
+
+def _default_embedder(space: EmbeddingSpace) -> Embedder:
+    # Queries are embedded with the model of the searched column, which EMBEDDING_MODEL only picks for a new database
+    if space.model != config.EMBEDDING_MODEL:
+        logger.info(f"Using {space.model} of the active embedding space instead of EMBEDDING_MODEL={config.EMBEDDING_MODEL}")
+    cache = EmbeddingCache(space.model, dim=space.dim) if config.EMBEDDING_CACHE_ENABLED else None
+    return get_sentence_transformer_embedder(space.model, cache=cache)
+
+
+def _default_repository(space: EmbeddingSpace) -> Repository:
+    database = NativeMariadDBRepository(
+        embedding_column=space.column_name, space_check_seconds=config.EMBEDDING_SPACE_CHECK_SECONDS,
+    )
+    if config.SEARCH_BACKEND == "numpy":
+        repository = NumpyVectorIndex(database)
+    elif config.SEARCH_BACKEND == "ann":
+        repository = IVFVectorIndex.load(database, Path(config.ANN_INDEX_DIR), embedding_model=space.model)
+    else:
+        repository = database
+    if config.SEARCH_MODE != "vector":
+        # Wraps the vector backend, so inserted chunks are added to the lexical index as well
+        repository = BM25Index(repository)
+    return repository
+
+
+def _optional_cache(name: str, max_size: int, ttl_seconds: float) -> LRUCache | None:
+    return LRUCache(name, max_size, ttl_seconds=ttl_seconds) if max_size > 0 else None
+
+
+_registry_lock = threading.Lock()
+
+
+@lru_cache
+def _create_registry() -> ServiceRegistry:
+    return ServiceRegistry()
+
+
+def get_registry() -> ServiceRegistry:
+    with _registry_lock:
+        return _create_registry()
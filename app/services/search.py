@@ -1,25 +1,297 @@
 import logging
+import threading
+import time
+
+import numpy as np
+
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
 
 from app import config
-from app.services.protocols import Repository, Embedder
-from app.storage.models import SearchResultChunk
-from app.storage.repository import NativeMariadDBRepository
-from app.embedding.embed import get_sentence_transformer_embedder
+from app.metrics import Metrics, metrics as default_metrics
+from app.services.diversify import (
+    DIVERSIFY_MODES, collapse_by_document, maximal_marginal_relevance, merge_adjacent_chunks,
+)
+from app.services.protocols import Repository, Embedder, LexicalIndex, Reranker
+from app.services.query_cache import LRUCache, normalize_query
+from app.storage.models import SearchFilters, SearchResultChunk
 
 logger = logging.getLogger(__name__)
 
+# "vector" ranks by embedding distance, "lexical" by BM25, "hybrid" fuses both rankings
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+
 class VideoSearchService:
-    def __init__(self, repo: Repository, embedder: Embedder):
+    def __init__(
+        self,
+        repo: Repository,
+        embedder: Embedder,
+        query_cache: LRUCache[np.ndarray] | None = None,
+        result_cache: LRUCache[list[SearchResultChunk]] | None = None,
+        lexical_index: LexicalIndex | None = None,
+        mode: str = config.SEARCH_MODE,
+        reranker: Reranker | None = None,
+        rerank_candidate_multiplier: int = config.RERANK_CANDIDATE_MULTIPLIER,
+        rerank_time_budget_seconds: float = config.RERANK_TIME_BUDGET_SECONDS,
+        diversify: str = config.DIVERSIFY,
+        diversify_candidate_multiplier: int = config.DIVERSIFY_CANDIDATE_MULTIPLIER,
+        metrics: Metrics = default_metrics,
+        name: str = "search",
+    ):
         self.repo = repo
         self.embedder = embedder
+        self.query_cache = query_cache
+        self.result_cache = result_cache
+        self.lexical_index = lexical_index
+        self.mode = mode
+        self.reranker = reranker
+        self.rerank_candidate_multiplier = rerank_candidate_multiplier
+        self.rerank_time_budget_seconds = rerank_time_budget_seconds
+        self.diversify = diversify
+        self.diversify_candidate_multiplier = diversify_candidate_multiplier
+        # Stage timings are reported as `<name>.retrieve`, `<name>.rerank`, `<name>.diversify` and `<name>.total`
+        self.metrics = metrics
+        self.name = name
+        # A timed out forward pass cannot be interrupted, it finishes in this worker while the search returns.
+        # Searches do not queue behind a pass still running, they keep the first-stage order instead
+        self._rerank_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank") if reranker else None
+        self._rerank_lock = threading.Lock()
+        self._rerank_future: Future | None = None
+
+    def search(
+        self,
+        query: str,
+        num_neighbors: int = config.NUM_SEARCH_NEIGHBORS,
+        filters: SearchFilters | None = None,
+        mode: str | None = None,
+        rerank: bool | None = None,
+        diversify: str | None = None,
+    ) -> list[SearchResultChunk]:
+        """
+        Search with the given ranking mode, then optionally re-rank with the cross-encoder and diversify.
+
+        Re-ranking is on by default when the service has a reranker. It scores
+        `num_neighbors * rerank_candidate_multiplier` first-stage candidates, and is
+        skipped, keeping the first-stage order, when the search would exceed the time budget.
+        Diversification picks from `num_neighbors * diversify_candidate_multiplier` candidates,
+        fetched in the same first-stage search, with adjacent chunks of a video merged.
+        """
+        started_at = time.perf_counter()
+        query = normalize_query(query)
+        if filters is not None and filters.is_empty():
+            filters = None
+        mode = mode or self.mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {', '.join(SEARCH_MODES)}")
+        if mode != "vector" and self.lexical_index is None:
+            raise ValueError(f"{mode.capitalize()} search needs the lexical index, enabled with SEARCH_MODE={mode}")
+        rerank = self.reranker is not None if rerank is None else rerank
+        if rerank and self.reranker is None:
+            raise ValueError("Re-ranking needs the cross-encoder, enabled with RERANK_ENABLED=true")
+        diversify = diversify or self.diversify
+        if diversify not in DIVERSIFY_MODES:
+            raise ValueError(f"Unknown diversification {diversify!r}, expected one of {', '.join(DIVERSIFY_MODES)}")
+
+        # Any chunk insert bumps the index version, so stale result lists are never hit again
+        result_key = (query, num_neighbors, self.repo.index_version)
+        if filters is not None:
+            result_key += (filters.cache_key(),)
+        if mode != "vector":
+            result_key += (mode,)
+        if rerank:
+            result_key += ("rerank",)
+        if diversify != "none":
+            result_key += (diversify,)
+        if self.result_cache is not None:
+            results = self.result_cache.get(result_key)
+            if results is not None:
+                logger.info(f"Returning cached results for query: {query}")
+                return list(results)
+
+        with self.metrics.timed(f"{self.name}.retrieve"):
+            multiplier = max(
+                self.rerank_candidate_multiplier if rerank else 1,
+                self.diversify_candidate_multiplier if diversify != "none" else 1,
+            )
+            results = self._retrieve(query, num_neighbors * multiplier, filters, mode, with_embeddings=diversify == "mmr")
+        if rerank:
+            results, complete = self._rerank(query, results, started_at + self.rerank_time_budget_seconds)
+        else:
+            complete = True
+        if diversify != "none":
+            with self.metrics.timed(f"{self.name}.diversify"):
+                results = self._diversify(query, results, num_neighbors, diversify)
+        results = results[:num_neighbors]
+
+        # Results that fell back to the first-stage order are not cached, the next search may re-rank in time
+        if self.result_cache is not None and complete:
+            self.result_cache.put(result_key, list(results))
+        self.metrics.observe(f"{self.name}.total", time.perf_counter() - started_at)
+        return results
+
+    def _rerank(
+        self, query: str, candidates: list[SearchResultChunk], deadline: float,
+    ) -> tuple[list[SearchResultChunk], bool]:
+        """Order candidates by cross-encoder score, or keep their order if it fails or the deadline passes first."""
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0 or len(candidates) <= 1:
+            if remaining <= 0:
+                self.metrics.increment(f"{self.name}.rerank.timeouts")
+                logger.warning("No time left for re-ranking, returning first-stage results")
+            return candidates, remaining > 0
+
+        with self._rerank_lock:
+            if self._rerank_future is not None and not self._rerank_future.done():
+                self.metrics.increment(f"{self.name}.rerank.busy")
+                logger.warning("The cross-encoder is busy with another search, returning first-stage results")
+                return candidates, False
+            started_at = time.perf_counter()
+            future = self._rerank_future = self._rerank_executor.submit(
+                self.reranker.score, query, [result.text for result in candidates],
+            )
+        try:
+            scores = future.result(timeout=remaining)
+        except TimeoutError:
+            self.metrics.increment(f"{self.name}.rerank.timeouts")
+            logger.warning(f"Re-ranking {len(candidates)} candidates exceeded the time budget, returning first-stage results")
+            return candidates, False
+        except Exception:
+            # The cross-encoder is an optional second stage, its failures do not fail the search
+            self.metrics.increment(f"{self.name}.rerank.errors")
+            logger.exception(f"Re-ranking {len(candidates)} candidates failed, returning first-stage results")
+            return candidates, False
+        finally:
+            self.metrics.observe(f"{self.name}.rerank", time.perf_counter() - started_at)
+
+        order = np.argsort(-np.asarray(scores), kind="stable")
+        return [candidates[i].model_copy(update={"score": float(scores[i])}) for i in order], True
+
+    def _diversify(
+        self, query: str, candidates: list[SearchResultChunk], num_neighbors: int, diversify: str,
+    ) -> list[SearchResultChunk]:
+        candidates = merge_adjacent_chunks(candidates)
+        if diversify == "collapse" or len(candidates) <= 1:
+            return collapse_by_document(candidates, num_neighbors, config.COLLAPSE_MAX_PER_VIDEO)
+
+        # Lexical results come without embeddings, those are embedded together in one batch.
+        # Like queries, candidates (possibly merged from adjacent chunks) stay out of the persistent embedding cache
+        missing = [i for i, result in enumerate(candidates) if result.embedding is None]
+        if missing:
+            texts = [candidates[i].text for i in missing]
+            for i, embedding in zip(missing, self.embedder.embed_texts(texts, use_cache=False), strict=True):
+                candidates[i] = candidates[i].model_copy(update={"embedding": embedding})
+        embeddings = np.stack([result.embedding for result in candidates]).astype(np.float32)
+        picked = maximal_marginal_relevance(self.embed_query(query), embeddings, num_neighbors, config.MMR_DIVERSITY)
+        return [candidates[i] for i in picked]
+
+    def _retrieve(
+        self, query: str, num_neighbors: int, filters: SearchFilters | None, mode: str, with_embeddings: bool = False,
+    ) -> list[SearchResultChunk]:
+        """First-stage results, with embeddings of the vector results when MMR needs them."""
+        if mode == "lexical":
+            logger.info(f"Searching in lexical index with {num_neighbors} results")
+            return self.lexical_index.lexical_search(query, num_neighbors, filters=filters)
+
+        query_vector = self.embed_query(query)
+        if mode == "vector":
+            logger.info(f"Searching in vector store with {num_neighbors} neighbors")
+            return self.repo.search(
+                query_vector, num_neighbors=num_neighbors, filters=filters, with_embeddings=with_embeddings,
+            )
+
+        # Both rankings contribute deeper candidate lists, so results found by only one of them can still make it
+        num_candidates = num_neighbors * config.HYBRID_CANDIDATE_MULTIPLIER
+        logger.info(f"Searching in vector store and lexical index with {num_candidates} candidates each")
+        vector_results = self.repo.search(
+            query_vector, num_neighbors=num_candidates, filters=filters, with_embeddings=with_embeddings,
+        )
+        lexical_results = self.lexical_index.lexical_search(query, num_candidates, filters=filters)
+        return reciprocal_rank_fusion([vector_results, lexical_results])[:num_neighbors]
+
+    def search_many(
+        self, queries: list[str], num_neighbors: int = config.NUM_SEARCH_NEIGHBORS,
+    ) -> list[list[SearchResultChunk]]:
+        """
+        Search for many queries at once, returning results in the order of `queries`.
+
+        Cached queries are reused, all remaining ones are embedded in one batch and
+        sent to the repository in one `search_many` call.
+        """
+        queries = [normalize_query(query) for query in queries]
+        results: list[list[SearchResultChunk] | None] = [None] * len(queries)
+        index_version = self.repo.index_version
+
+        pending: dict[str, list[int]] = {}
+        for i, query in enumerate(queries):
+            cached = None
+            if self.result_cache is not None:
+                cached = self.result_cache.get((query, num_neighbors, index_version))
+            if cached is not None:
+                results[i] = list(cached)
+            else:
+                # Duplicate queries are embedded and searched only once
+                pending.setdefault(query, []).append(i)
+
+        if pending:
+            query_vectors = self.embed_queries(list(pending))
+            logger.info(f"Searching in vector store for {len(pending)} queries with {num_neighbors} neighbors")
+            for (query, positions), query_results in zip(
+                pending.items(), self.repo.search_many(query_vectors, num_neighbors=num_neighbors), strict=True,
+            ):
+                if self.result_cache is not None:
+                    self.result_cache.put((query, num_neighbors, index_version), list(query_results))
+                for i in positions:
+                    results[i] = list(query_results)
+        return results
+
+    def embed_queries(self, queries: list[str]) -> np.ndarray:
+        vectors: list[np.ndarray | None] = [None] * len(queries)
+        if self.query_cache is not None:
+            vectors = [self.query_cache.get(query) for query in queries]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            logger.info(f"Embedding {len(missing)} queries")
+            # Queries are kept in the query cache, not in the persistent cache of chunk embeddings
+            missing_vectors = self.embedder.embed_texts([queries[i] for i in missing], use_cache=False)
+            for i, vector in zip(missing, missing_vectors, strict=True):
+                vectors[i] = vector
+                if self.query_cache is not None:
+                    self.query_cache.put(queries[i], vector)
+        return np.stack(vectors)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        if self.query_cache is not None:
+            query_vector = self.query_cache.get(query)
+            if query_vector is not None:
+                return query_vector
 
-    def search(self, query: str, num_neighbors: int = config.NUM_SEARCH_NEIGHBORS) -> list[SearchResultChunk]:
         logger.info(f"Embedding query: {query}")
         query_vector = self.embedder.embed_text(query)
-        logger.info(f"Searching in vector store with {num_neighbors} neighbors")
-        return self.repo.search(query_vector, num_neighbors=num_neighbors)
+        if self.query_cache is not None:
+            self.query_cache.put(query, query_vector)
+        return query_vector
+
+def reciprocal_rank_fusion(
+    rankings: list[list[SearchResultChunk]], k: int = config.HYBRID_RRF_K,
+) -> list[SearchResultChunk]:
+    """
+    Merge rankings by reciprocal rank fusion: a result scores the sum of 1 / (k + rank) over the rankings it is in.
+
+    Only ranks are used, so BM25 scores and vector distances need no normalization.
+    Results are matched by document and chunk index, and the first ranking's copy
+    of a result is kept, so vector distances are preserved.
+    """
+    results: dict[tuple[str, int], SearchResultChunk] = {}
+    scores: dict[tuple[str, int], float] = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, start=1):
+            key = (result.document_url, result.chunk_index)
+            results.setdefault(key, result)
+            scores[key] = scores.get(key, 0.0) + 1 / (k + rank)
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    return [results[key].model_copy(update={"score": scores[key]}) for key in ranked]
 
 def get_default_video_search_service() -> VideoSearchService:
-    repository = NativeMariadDBRepository()
-    embedder = get_sentence_transformer_embedder(config.EMBEDDING_MODEL)
-    return VideoSearchService(repository, embedder)
\ No newline at end of file
+    from app.services.registry import get_registry
+    return get_registry().search_service
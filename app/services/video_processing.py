@@ -1,23 +1,33 @@
 import json
 import logging
+import time
 import numpy as np
 
+from collections.abc import Callable
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import TypeVar
+
+from youtube_transcript_api import FetchedTranscript
+
 from app import config
+from app.embedding.batcher import EmbeddingBatcher
+from app.services.bulk_load import BulkLoader
+from app.services.ingestion_pipeline import VideoIngestionPipeline, add_to_batcher
 from app.services.protocols import Embedder, TranscriptChunker, TranscriptFetcher, Repository
+from app.storage.chunk_batch import ChunkBatch
 from app.storage.db import create_db_and_tables
+from app.storage.embedding_spaces import EmbeddingSpaceChangedError
+from app.storage.ingestion_state import IngestionStateStore
 from app.storage.models import Document
-from app.storage.models import Chunk as DBChunk
-from app.chunking.chunk import Chunk
-from app.youtube.data_loader import Video, load_videos
-from app.embedding.embed import get_sentence_transformer_embedder
-from app.youtube.fetcher import YouTubeTranscriptFetcherWithCache
-from app.youtube.transform import TranscriptSentencesChunker
-from app.storage.repository import NativeMariadDBRepository
+from app.storage.unit_of_work import UnitOfWork
+from app.youtube.data_loader import Video, load_videos, video_id_from_url
+from app.youtube.fetcher import PermanentFetchError
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class VideoProcessingService:
     def __init__(
@@ -25,40 +35,216 @@ class VideoProcessingService:
             transcript_fetcher: TranscriptFetcher, 
             transcript_chunker: TranscriptChunker, 
             embedder: Embedder,
+            ingestion_state: IngestionStateStore | None = None,
+            max_attempts: int = config.INGEST_MAX_ATTEMPTS,
+            retry_backoff_seconds: float = config.INGEST_RETRY_BACKOFF_SECONDS,
+            fetch_max_attempts: int | None = None,
         ):
         self.repo = repo
         self.transcript_fetcher = transcript_fetcher
         self.transcript_chunker = transcript_chunker
         self.embedder = embedder
+        # Records the stage every video reached, so an interrupted populate resumes after the stored ones
+        self.ingestion_state = ingestion_state
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff_seconds = retry_backoff_seconds
+        # Attempts of the fetch stage, 1 for fetchers that retry their requests themselves
+        self.fetch_max_attempts = max(1, fetch_max_attempts or max_attempts)
+        # Set while populating: stored videos are buffered and committed in batches
+        self.unit_of_work: UnitOfWork | None = None
+        # Urls of videos the ingestion state marks as stored, loaded once per populate
+        self._stored_urls: set[str] = set()
 
-    def populate_default_videos(self, drop_db_first: bool = False):
+    def populate_default_videos(
+        self,
+        drop_db_first: bool = False,
+        workers: int = 1,
+        process_workers: int = 1,
+        queue_size: int = config.INGEST_QUEUE_SIZE,
+        bulk: bool = False,
+    ):
         logger.info("Creating database and tables")
-        create_db_and_tables(drop_db_first=drop_db_first)
+        # In bulk mode the vector index is built once after all chunks are loaded
+        create_db_and_tables(drop_db_first=drop_db_first, vector_index=not bulk)
 
         videos = load_videos()
 
+        bulk_loader = BulkLoader(self.repo) if bulk else None
+        self.unit_of_work = bulk_loader.unit_of_work if bulk_loader else UnitOfWork(self.repo)
+        # Buffered videos are stored by the unit of work, which retries the batch like a stage
+        self.unit_of_work.max_attempts = self.max_attempts
+        self.unit_of_work.retry_backoff_seconds = self.retry_backoff_seconds
+        # A failed commit is reported for every video of its batch, not only the one whose add triggered it
+        self.unit_of_work.on_failure = self._record_store_failure
+        if self.ingestion_state is not None:
+            self.unit_of_work.on_commit = self._record_stored
+            self._stored_urls = self.ingestion_state.stored_urls()
+        started_at = time.perf_counter()
+        try:
+            with self.unit_of_work:
+                self._process_videos(videos, workers, process_workers, queue_size)
+        finally:
+            self.unit_of_work = None
+            self._stored_urls = set()
+        logger.info(f"Processed {len(videos)} videos in {time.perf_counter() - started_at:.1f}s")
+
+        if bulk_loader is not None:
+            bulk_loader.finish()
+
+    def _process_videos(self, videos: list[Video], workers: int, process_workers: int, queue_size: int):
+        if workers > 1:
+            pipeline = VideoIngestionPipeline(
+                self,
+                fetch_workers=workers,
+                process_workers=process_workers,
+                queue_size=queue_size,
+            )
+            pipeline.run(videos)
+            return
+
         logger.info(f"Processing {len(videos)} videos")
 
+        # Chunks of consecutive videos are embedded together, as in the pipelined mode
+        batcher = EmbeddingBatcher(self.embedder)
+        chunked: list[tuple[Video, ChunkBatch]] = []
+        failed: list[str] = []
         for video in videos:
+            if self.is_video_stored(video):
+                logger.info(f"Document {video.id} already exists, skipping")
+                continue
+
+            # A failed video is given up on, without losing the videos buffered before it
             logger.info(f"Processing video {video.id}")
-            self.process_video(video)
+            try:
+                transcript = self.fetch_transcript(video)
+                chunks = self.chunk_transcript(video, transcript)
+            except Exception:
+                logger.exception(f"Failed to ingest video {video.id}")
+                failed.append(video.id)
+                continue
+            add_to_batcher(batcher, len(chunked), chunks)
+            chunked.append((video, chunks))
+            if batcher.is_full():
+                failed.extend(self._embed_and_store(chunked, batcher))
+                chunked = []
+        failed.extend(self._embed_and_store(chunked, batcher))
+        failed.extend(video_id_from_url(document.url) for document in self.unit_of_work.failed_documents)
+        if failed:
+            logger.warning(f"Failed videos: {', '.join(dict.fromkeys(failed))}")
+
+    def _embed_and_store(self, chunked: list[tuple[Video, ChunkBatch]], batcher: EmbeddingBatcher) -> list[str]:
+        """Embed and store the chunked videos, returning the ids of the ones that failed."""
+        if not chunked:
+            return []
+        try:
+            vectors = self.embed_pending([video for video, _ in chunked], batcher)
+        except Exception:
+            logger.exception(f"Failed to embed chunks of {len(chunked)} videos")
+            return [video.id for video, _ in chunked]
 
+        failed = []
+        for i, (video, chunks) in enumerate(chunked):
+            num_failed_commits = len(self.unit_of_work.failed_documents)
+            try:
+                self.store_video(video, chunks, vectors[i])
+            except EmbeddingSpaceChangedError:
+                # No later video can be stored either
+                raise
+            except Exception:
+                if len(self.unit_of_work.failed_documents) > num_failed_commits:
+                    # The video completed a batch whose commit failed, the whole batch was reported already
+                    continue
+                logger.exception(f"Failed to store video {video.id}")
+                failed.append(video.id)
+        return failed
 
     def process_video(self, video: Video):
-        if self.repo.is_document_exists(video.url):
+        if self.is_video_stored(video):
             logger.info(f"Document {video.id} already exists, skipping")
             return
 
         logger.info("Document does not exist, fetching transcript")
-        transcript = self.transcript_fetcher.fetch(video.id)
+        transcript = self.fetch_transcript(video)
 
         logger.info("Splitting text into chunks for future embedding")
-        chunks = self.transcript_chunker.split_into_chunks(transcript)
+        chunks = self.chunk_transcript(video, transcript)
         
+        vectors = self.run_stage(video, "embed", lambda: self.embed_chunks(chunks))
+
+        self.store_video(video, chunks, vectors)
+
+    def is_video_stored(self, video: Video) -> bool:
+        return video.url in self._stored_urls or self.repo.is_document_exists(video.url)
+
+    def fetch_transcript(self, video: Video) -> FetchedTranscript:
+        return self.run_stage(
+            video, "fetch", lambda: self.transcript_fetcher.fetch(video.id), max_attempts=self.fetch_max_attempts,
+        )
+
+    def chunk_transcript(self, video: Video, transcript: FetchedTranscript) -> ChunkBatch:
+        # Punctuation runs as part of chunking, punctuated text is reused from the chunk cache on retries
+        return self.run_stage(
+            video, "chunk", lambda: ChunkBatch.from_chunks(self.transcript_chunker.split_into_chunks(transcript)),
+        )
+
+    def run_stage(self, video: Video, stage: str, action: Callable[[], T], max_attempts: int | None = None) -> T:
+        """
+        Run an ingestion stage of the video, retrying failures with exponential backoff,
+        up to `max_attempts` or the service's attempts. Permanent fetch errors are not retried.
+
+        Completed stages are recorded in the ingestion state with their duration,
+        failed attempts with their error.
+        """
+        max_attempts = max_attempts or self.max_attempts
+        for attempt in range(1, max_attempts + 1):
+            started_at = time.perf_counter()
+            try:
+                result = action()
+            except Exception as e:
+                if self.ingestion_state is not None:
+                    self.ingestion_state.record_failure(video.url, video.id, stage, f"{type(e).__name__}: {e}")
+                if attempt == max_attempts or isinstance(e, PermanentFetchError):
+                    raise
+                delay = self.retry_backoff_seconds * 2 ** (attempt - 1)
+                logger.warning(
+                    f"Stage {stage} of video {video.id} failed ({e}), attempt {attempt} of {max_attempts}, "
+                    f"retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+                continue
+
+            if self.ingestion_state is not None:
+                self.ingestion_state.record_stage(video.url, video.id, stage, time.perf_counter() - started_at)
+            return result
+
+    def embed_pending(self, videos: list[Video], batcher: EmbeddingBatcher) -> dict[int, np.ndarray]:
+        """
+        Embed the chunks of the videos pending in the batcher together, returning vectors per batcher key.
+
+        The embed stage of every video is recorded with an equal part of the batch time,
+        or as failed with the batch's error.
+        """
+        started_at = time.perf_counter()
+        try:
+            vectors = batcher.flush()
+        except Exception as e:
+            if self.ingestion_state is not None:
+                for video in videos:
+                    self.ingestion_state.record_failure(video.url, video.id, "embed", f"{type(e).__name__}: {e}")
+            raise
+        if self.ingestion_state is not None:
+            self.ingestion_state.record_stages(
+                [(video.url, video.id) for video in videos], "embed", (time.perf_counter() - started_at) / len(videos),
+            )
+        return vectors
+
+    def embed_chunks(self, chunks: ChunkBatch) -> np.ndarray:
         logger.info(f"Embedding {len(chunks)} chunks")
-        vectors = self.embedder.embed_texts([chunk.text for chunk in chunks])
+        vectors = self.embedder.embed_texts(chunks.texts)
         logger.info(f"Embedded {len(chunks)} chunks")
+        return vectors
 
+    def store_video(self, video: Video, chunks: ChunkBatch, vectors: np.ndarray):
         logger.info("Inserting document and chunks into database")
         doc = Document(
             title=video.title, 
@@ -67,7 +253,12 @@ class VideoProcessingService:
             meta=video.meta,
         )
 
-        self._insert_vectors(doc, chunks, vectors)
+        if self.unit_of_work is not None:
+            # Written, and retried on failure, when the unit of work commits the batch
+            self._insert_vectors(doc, chunks, vectors)
+        else:
+            # The document and its chunks are one transaction, so a failed attempt leaves nothing to clean up
+            self.run_stage(video, "store", lambda: self._insert_vectors(doc, chunks, vectors))
         logger.info("Document and chunks inserted into database")
 
     def export_videos_as_json_file(self, file_path: Path):
@@ -80,28 +271,30 @@ class VideoProcessingService:
         with open(file_path, "w") as f:
             json.dump(videos, f, indent=4)
 
-    def _insert_vectors(self, doc: Document, chunks: list[Chunk], vectors: np.ndarray):
-        document_id = self.repo.insert_document(doc)
-
-        db_chunks = [
-            DBChunk(
-                chunk_index=i,
-                start_ts=chunk.metadata.start_time,
-                end_ts=chunk.metadata.end_time,
-                text=chunk.text,
-                document_id=document_id,
-                embedding=vectors[i],
-            )
-            for i, chunk in enumerate(chunks)
-        ]
+    def _insert_vectors(self, doc: Document, chunks: ChunkBatch, vectors: np.ndarray):
+        # Chunks get their document id when the document is written, in the same transaction
+        chunks.set_embeddings(vectors)
 
-        self.repo.insert_chunks(db_chunks)
+        if self.unit_of_work is not None:
+            # Recorded as stored once the unit of work commits the batch
+            self.unit_of_work.add(doc, chunks)
+        else:
+            self.repo.bulk_insert([(doc, chunks)])
 
+    def _record_stored(self, documents: list[Document], seconds: float):
+        self.ingestion_state.record_stages(
+            [(doc.url, video_id_from_url(doc.url)) for doc in documents], "store", seconds / len(documents),
+        )
+
+    def _record_store_failure(self, documents: list[Document], error: Exception):
+        video_ids = [video_id_from_url(doc.url) for doc in documents]
+        logger.error(f"Failed to store videos {', '.join(video_ids)}: {error}")
+        if self.ingestion_state is None:
+            return
+        for doc, video_id in zip(documents, video_ids, strict=True):
+            self.ingestion_state.record_failure(doc.url, video_id, "store", f"{type(error).__name__}: {error}")
 
-def get_default_video_processing_service() -> VideoProcessingService:
-    repository = NativeMariadDBRepository()
-    embedder = get_sentence_transformer_embedder(config.EMBEDDING_MODEL)
-    transcript_fetcher = YouTubeTranscriptFetcherWithCache()
-    transcript_chunker = TranscriptSentencesChunker(embedder.get_model(), config.TOKENS_PER_CHUNK)
 
-    return VideoProcessingService(repository, transcript_fetcher, transcript_chunker, embedder)
+def get_default_video_processing_service() -> VideoProcessingService:
+    from app.services.registry import get_registry
+    return get_registry().video_processing_service
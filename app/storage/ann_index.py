@@ -0,0 +1,309 @@
+import json
+import logging
+import time
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+
+import numpy as np
+
+from app import config
+from app.services.protocols import Repository
+from app.storage.chunk_batch import ChunkBatch
+from app.storage.models import Chunk, Document, SearchFilters, SearchResultChunk
+from app.storage.numpy_index import (
+    UNKNOWN_ID,
+    NumpyVectorIndex,
+    chunk_id,
+    top_k_smallest,
+)
+
+logger = logging.getLogger(__name__)
+
+ANN_INDEX_FORMAT = "ivf-flat"
+ANN_INDEX_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+DOCUMENTS_FILE = "documents.json"
+TEXTS_FILE = "texts.bin"
+ARRAY_FILES = (
+    "centroids", "list_offsets", "vectors", "squared_norms",
+    "ids", "chunk_indexes", "start_ts", "end_ts", "document_ids", "text_offsets",
+)
+
+# Vectors sampled per cluster to train the coarse quantizer, as in common IVF implementations
+TRAINING_SAMPLES_PER_LIST = 256
+# Rows processed at once when assigning vectors to their nearest centroid
+ASSIGNMENT_BATCH_SIZE = 65536
+
+
+class IVFVectorIndex:
+    """
+    Approximate nearest neighbor search with an inverted file (IVF-Flat) index.
+
+    Embeddings are clustered with k-means into `nlist` inverted lists, and stored
+    grouped by list, so every list is a contiguous slice of the vector matrix.
+    A query scans only the `nprobe` lists whose centroids are closest to it, and
+    ranks their vectors by exact Euclidean distance: raising `nprobe` trades
+    latency for recall, with `nprobe == nlist` being exact search.
+
+    The index is saved as a directory with a versioned manifest and `.npy` arrays,
+    which are memory-mapped on load, so startup does not read the whole file.
+    Chunks inserted after the build are kept in an exact in-memory index and
+    searched alongside the IVF lists until the next rebuild.
+    """
+    def __init__(
+        self,
+        source: Repository,
+        arrays: dict[str, np.ndarray],
+        texts: bytes | np.ndarray,
+        documents: dict[int, tuple[str, str, dict]],
+        nprobe: int = config.ANN_NPROBE,
+    ):
+        self.source = source
+        self.nprobe = nprobe
+        self._arrays = arrays
+        self._texts = texts
+        self._documents = documents
+        # New chunks go through this index: it writes them to the source and keeps them searchable
+        self._delta = NumpyVectorIndex(source, load=False)
+
+    @property
+    def nlist(self) -> int:
+        return len(self._arrays["centroids"])
+
+    @property
+    def index_version(self) -> int:
+        return self._delta.index_version
+
+    def __len__(self) -> int:
+        return len(self._arrays["ids"]) + len(self._delta)
+
+    @classmethod
+    def build(
+        cls,
+        source: Repository,
+        nlist: int | None = None,
+        iterations: int = 20,
+        seed: int = 0,
+        nprobe: int = config.ANN_NPROBE,
+    ) -> "IVFVectorIndex":
+        started_at = time.perf_counter()
+        documents = {doc.id: (doc.title, doc.url, doc.meta) for doc in source.list_documents()}
+        chunks = [chunk for batch in source.iter_chunks() for chunk in batch]
+        if not chunks:
+            raise ValueError("Cannot build an ANN index without any chunks")
+
+        vectors = np.stack([chunk.embedding for chunk in chunks]).astype(np.float32)
+        nlist = min(nlist or max(1, int(4 * np.sqrt(len(vectors)))), len(vectors))
+        rng = np.random.default_rng(seed)
+
+        logger.info(f"Training {nlist} IVF centroids on {len(vectors)} vectors")
+        centroids = _train_kmeans(vectors, nlist, iterations, rng)
+        assignments = _nearest_centroids(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))])
+
+        texts = [chunks[i].text.encode() for i in order]
+        arrays = {
+            "centroids": centroids,
+            "list_offsets": list_offsets.astype(np.int64),
+            "vectors": vectors[order],
+            "squared_norms": np.einsum("ij,ij->i", vectors[order], vectors[order]),
+            "ids": np.array([UNKNOWN_ID if chunks[i].id is None else chunks[i].id for i in order], dtype=np.int64),
+            "chunk_indexes": np.array([chunks[i].chunk_index for i in order], dtype=np.int32),
+            "start_ts": np.array([chunks[i].start_ts for i in order], dtype=np.float64),
+            "end_ts": np.array([chunks[i].end_ts for i in order], dtype=np.float64),
+            "document_ids": np.array([chunks[i].document_id for i in order], dtype=np.int64),
+            "text_offsets": np.concatenate([[0], np.cumsum([len(text) for text in texts])]).astype(np.int64),
+        }
+        logger.info(f"Built IVF index in {time.perf_counter() - started_at:.1f}s")
+        return cls(source, arrays, b"".join(texts), documents, nprobe=nprobe)
+
+    def save(self, path: Path, embedding_model: str = config.EMBEDDING_MODEL):
+        path.mkdir(parents=True, exist_ok=True)
+        # An index being overwritten is incomplete until the new manifest is in place
+        (path / MANIFEST_FILE).unlink(missing_ok=True)
+        for name in ARRAY_FILES:
+            np.save(path / f"{name}.npy", self._arrays[name])
+        with open(path / TEXTS_FILE, "wb") as f:
+            f.write(bytes(self._texts))
+        with open(path / DOCUMENTS_FILE, "w") as f:
+            json.dump({str(doc_id): list(doc) for doc_id, doc in self._documents.items()}, f)
+        # The manifest is written last and marks the index as complete
+        manifest = {
+            "format": ANN_INDEX_FORMAT,
+            "version": ANN_INDEX_FORMAT_VERSION,
+            "dim": int(self._arrays["vectors"].shape[1]),
+            "num_vectors": len(self._arrays["ids"]),
+            "nlist": self.nlist,
+            "embedding_model": embedding_model,
+            "created_at": datetime.now(UTC).isoformat(),
+        }
+        with open(path / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=4)
+        logger.info(f"Saved IVF index with {manifest['num_vectors']} vectors to {path}")
+
+    @classmethod
+    def load(
+        cls,
+        source: Repository,
+        path: Path,
+        nprobe: int = config.ANN_NPROBE,
+        embedding_model: str = config.EMBEDDING_MODEL,
+    ) -> "IVFVectorIndex":
+        with open(path / MANIFEST_FILE) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != ANN_INDEX_FORMAT or manifest.get("version") != ANN_INDEX_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported ANN index format {manifest.get('format')} v{manifest.get('version')} at {path}, "
+                f"expected {ANN_INDEX_FORMAT} v{ANN_INDEX_FORMAT_VERSION}"
+            )
+        if manifest["embedding_model"] != embedding_model:
+            logger.warning(
+                f"ANN index at {path} was built for {manifest['embedding_model']}, "
+                f"but chunks are embedded with {embedding_model}, rebuild it with `index build`"
+            )
+
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ARRAY_FILES}
+        texts = np.memmap(path / TEXTS_FILE, dtype=np.uint8, mode="r") if manifest["num_vectors"] else b""
+        with open(path / DOCUMENTS_FILE) as f:
+            # Indexes saved before document meta was stored have [title, url] entries
+            documents = {int(doc_id): (*doc, {})[:3] for doc_id, doc in json.load(f).items()}
+        logger.info(f"Memory-mapped IVF index with {manifest['num_vectors']} vectors from {path}")
+        return cls(source, arrays, texts, documents, nprobe=nprobe)
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        num_neighbors: int = 5,
+        nprobe: int | None = None,
+        filters: SearchFilters | None = None,
+        with_embeddings: bool = False,
+    ) -> list[SearchResultChunk]:
+        # Results always carry their embeddings, views of the memory-mapped vectors that cost nothing to return
+        if num_neighbors <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        mask = None if filters is None or filters.is_empty() else self._filter_mask(filters)
+
+        if mask is not None and mask.mean() <= config.SEARCH_PREFILTER_SELECTIVITY:
+            # Narrow filter: the matching rows are few enough to be scanned exactly
+            results = self._scan(np.flatnonzero(mask), query, num_neighbors)
+        else:
+            centroid_distances = ((self._arrays["centroids"] - query) ** 2).sum(axis=1)
+            lists = top_k_smallest(centroid_distances, nprobe)
+            offsets = self._arrays["list_offsets"]
+            candidates = np.concatenate(
+                [np.arange(offsets[i], offsets[i + 1]) for i in lists] or [np.empty(0, dtype=np.int64)]
+            )
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            results = self._scan(candidates, query, num_neighbors)
+            if mask is not None and len(results) < min(num_neighbors, int(mask.sum())):
+                # The probed lists hold too few matching rows, fall back to scanning all of them
+                results = self._scan(np.flatnonzero(mask), query, num_neighbors)
+
+        if len(self._delta):
+            results = sorted(
+                results + self._delta.search(query, num_neighbors, filters=filters),
+                key=lambda result: result.distance,
+            )[:num_neighbors]
+        return results
+
+    def search_many(
+        self, query_vectors: np.ndarray, num_neighbors: int = 5, nprobe: int | None = None,
+    ) -> list[list[SearchResultChunk]]:
+        # Every query probes its own set of lists, so there is no shared matrix product to batch
+        return [self.search(query_vector, num_neighbors, nprobe=nprobe) for query_vector in query_vectors]
+
+    def insert_document(self, document: Document) -> int:
+        return self._delta.insert_document(document)
+
+    def insert_chunk(self, chunk: Chunk):
+        self._delta.insert_chunk(chunk)
+
+    def insert_chunks(self, chunks: list[Chunk]):
+        self._delta.insert_chunks(chunks)
+
+    def bulk_insert(self, items: list[tuple[Document, list[Chunk] | ChunkBatch]]) -> list[int]:
+        return self._delta.bulk_insert(items)
+
+    def is_document_exists(self, url: str) -> bool:
+        return self.source.is_document_exists(url)
+
+    def iter_chunks(self, batch_size: int = 10000) -> Iterator[list[Chunk]]:
+        return self.source.iter_chunks(batch_size)
+
+    def list_documents(self) -> list[Document]:
+        return self.source.list_documents()
+
+    def list_documents_paginated(self, limit: int, offset: int) -> tuple[list[Document], int]:
+        return self.source.list_documents_paginated(limit, offset)
+
+    def get_document(self, document_id: int) -> Document:
+        return self.source.get_document(document_id)
+
+    def _scan(self, rows: np.ndarray, query: np.ndarray, num_neighbors: int) -> list[SearchResultChunk]:
+        """Exact nearest neighbors of the query among the given rows."""
+        if not len(rows):
+            return []
+        squared_distances = (
+            self._arrays["squared_norms"][rows]
+            - 2 * (self._arrays["vectors"][rows] @ query)
+            + query @ query
+        )
+        top = top_k_smallest(squared_distances, num_neighbors)
+        distances = np.sqrt(np.maximum(squared_distances[top], 0))
+        return [self._result(int(rows[i]), float(distance)) for i, distance in zip(top, distances, strict=True)]
+
+    def _filter_mask(self, filters: SearchFilters) -> np.ndarray:
+        allowed = [doc_id for doc_id, (_, _, meta) in self._documents.items() if filters.matches(doc_id, meta)]
+        return np.isin(self._arrays["document_ids"], allowed)
+
+    def _result(self, i: int, distance: float) -> SearchResultChunk:
+        text_offsets = self._arrays["text_offsets"]
+        text = bytes(self._texts[text_offsets[i]:text_offsets[i + 1]]).decode()
+        document_id = int(self._arrays["document_ids"][i])
+        title, url, _ = self._documents.get(document_id, ("", "", {}))
+        return SearchResultChunk(
+            id=chunk_id(self._arrays["ids"][i]),
+            chunk_index=int(self._arrays["chunk_indexes"][i]),
+            start_ts=float(self._arrays["start_ts"][i]),
+            end_ts=float(self._arrays["end_ts"][i]),
+            text=text,
+            distance=distance,
+            document_title=title,
+            document_url=url,
+            embedding=self._arrays["vectors"][i],
+        )
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGNMENT_BATCH_SIZE):
+        batch = vectors[start:start + ASSIGNMENT_BATCH_SIZE]
+        # |x - c|^2 without the |x|^2 term, which does not change the argmin
+        assignments[start:start + len(batch)] = np.argmin(centroid_norms - 2 * (batch @ centroids.T), axis=1)
+    return assignments
+
+
+def _train_kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    sample_size = min(len(vectors), k * TRAINING_SAMPLES_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _nearest_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+        # Empty clusters restart from random sample points instead of staying unused
+        num_empty = int((~non_empty).sum())
+        if num_empty:
+            centroids[~non_empty] = sample[rng.choice(len(sample), num_empty, replace=False)]
+    return centroids
@@ -0,0 +1,97 @@
+from collections.abc import Iterable
+
+import numpy as np
+
+from app.chunking.chunk import Chunk as TranscriptChunk
+from app.storage.models import Chunk
+from app.storage.vectors import VECTOR_DTYPE
+
+
+class ChunkBatch:
+    """
+    Chunks of one document in columns: texts, float64 start and end times, chunk
+    indexes, and once embedded, one float32 matrix of their embeddings.
+
+    Ingestion passes a batch from chunking through embedding to `Repository.bulk_insert`
+    instead of one pydantic `Chunk` with its own small array per chunk, so there is
+    no per-chunk object to allocate or validate. `to_chunks()` converts it for code
+    that needs chunk objects.
+    """
+    __slots__ = ("chunk_index", "document_id", "embeddings", "end_ts", "start_ts", "texts", "token_counts")
+
+    def __init__(
+        self,
+        texts: list[str],
+        start_ts: np.ndarray,
+        end_ts: np.ndarray,
+        token_counts: np.ndarray | None = None,
+        embeddings: np.ndarray | None = None,
+        document_id: int = 0,
+    ):
+        self.texts = texts
+        self.start_ts = np.asarray(start_ts, dtype=np.float64)
+        self.end_ts = np.asarray(end_ts, dtype=np.float64)
+        self.chunk_index = np.arange(len(texts), dtype=np.int32)
+        # Token counts from chunking, if every chunk has one
+        self.token_counts = token_counts
+        self.embeddings = None
+        if embeddings is not None:
+            self.set_embeddings(embeddings)
+        # Set when the document is written, in the same transaction as the chunks
+        self.document_id = document_id
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[TranscriptChunk]) -> "ChunkBatch":
+        texts, start_ts, end_ts, token_counts = [], [], [], []
+        for chunk in chunks:
+            texts.append(chunk.text)
+            start_ts.append(chunk.metadata.start_time)
+            end_ts.append(chunk.metadata.end_time)
+            token_counts.append(chunk.token_count)
+        return cls(
+            texts,
+            np.array(start_ts, dtype=np.float64),
+            np.array(end_ts, dtype=np.float64),
+            np.array(token_counts, dtype=np.int32) if None not in token_counts else None,
+        )
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def set_embeddings(self, embeddings: np.ndarray):
+        embeddings = np.ascontiguousarray(embeddings, dtype=VECTOR_DTYPE)
+        if embeddings.ndim != 2 or len(embeddings) != len(self.texts):
+            raise ValueError(f"Expected embeddings of {len(self.texts)} chunks, got an array of shape {embeddings.shape}")
+        self.embeddings = embeddings
+
+    def to_chunks(self) -> list[Chunk]:
+        """The chunks as `Chunk` models, built without validation, as the columns are already typed."""
+        return [
+            Chunk.model_construct(
+                id=None,
+                chunk_index=int(self.chunk_index[i]),
+                start_ts=float(self.start_ts[i]),
+                end_ts=float(self.end_ts[i]),
+                text=self.texts[i],
+                document_id=self.document_id,
+                embedding=self.embeddings[i],
+            )
+            for i in range(len(self.texts))
+        ]
+
+    def to_rows(self) -> list[tuple]:
+        """Rows of (chunk_index, start_ts, end_ts, text, document_id, embedding bytes), as inserted into `chunks`."""
+        # The embedding matrix is contiguous float32, each row is already in the binary VECTOR format
+        return list(zip(
+            self.chunk_index.tolist(),
+            self.start_ts.tolist(),
+            self.end_ts.tolist(),
+            self.texts,
+            [self.document_id] * len(self.texts),
+            [embedding.tobytes() for embedding in self.embeddings],
+            strict=True,
+        ))
+
+
+def as_chunks(chunks: list[Chunk] | ChunkBatch) -> list[Chunk]:
+    return chunks.to_chunks() if isinstance(chunks, ChunkBatch) else chunks
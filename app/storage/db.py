@@ -2,8 +2,8 @@ import mariadb
 from functools import lru_cache
 
 from app import config
+from app.storage.pool import ConnectionPool
 
-@lru_cache
 def native_connection():
     conn = mariadb.connect(
        host=config.DB_HOST,
@@ -13,43 +13,109 @@ def native_connection():
    )
     return conn
 
+@lru_cache
+def connection_pool() -> ConnectionPool:
+    return ConnectionPool(
+        native_connection,
+        size=config.DB_POOL_SIZE,
+        timeout=config.DB_POOL_TIMEOUT_SECONDS,
+        health_check_interval=config.DB_POOL_HEALTH_CHECK_SECONDS,
+    )
+
 def drop_database():
-    conn = native_connection()
-    cur = conn.cursor()
-    cur.execute(f"DROP DATABASE IF EXISTS {config.DB_NAME};")
-
-def native_on_startup():
-    conn = native_connection()
-    cur = conn.cursor()
-       
-    cur.execute(f"CREATE DATABASE IF NOT EXISTS {config.DB_NAME};")
-    cur.execute(f"""
-        CREATE TABLE IF NOT EXISTS {config.DB_NAME}.documents (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            title VARCHAR(512) NOT NULL,
-            url VARCHAR(256) NOT NULL,
-            created_at DATETIME NOT NULL,
-            meta JSON NOT NULL
-        );
-    """)
-    cur.execute(f"""
-        CREATE TABLE IF NOT EXISTS {config.DB_NAME}.chunks (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            chunk_index INT NOT NULL,
-            start_ts FLOAT NOT NULL,
-            end_ts FLOAT NOT NULL,
-            text LONGTEXT NOT NULL,
-            document_id INT NOT NULL,
-            FOREIGN KEY (document_id) REFERENCES documents(id),
-            embedding VECTOR(384) NOT NULL,
-            VECTOR INDEX (embedding)
-        );
-    """)
-
-
-def create_db_and_tables(drop_db_first: bool = False):
+    with connection_pool().connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"DROP DATABASE IF EXISTS {config.DB_NAME};")
+
+def native_on_startup(vector_index: bool = True):
+    with connection_pool().connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS {config.DB_NAME};")
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {config.DB_NAME}.documents (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                title VARCHAR(512) NOT NULL,
+                url VARCHAR(256) NOT NULL,
+                created_at DATETIME NOT NULL,
+                meta JSON NOT NULL
+            );
+        """)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {config.DB_NAME}.chunks (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                chunk_index INT NOT NULL,
+                start_ts FLOAT NOT NULL,
+                end_ts FLOAT NOT NULL,
+                text LONGTEXT NOT NULL,
+                document_id INT NOT NULL,
+                FOREIGN KEY (document_id) REFERENCES documents(id),
+                embedding VECTOR({config.EMBEDDING_DIM}) NOT NULL
+                {", VECTOR INDEX (embedding)" if vector_index else ""}
+            );
+        """)
+        # Every embedding model the chunks are (being) embedded with, see `EmbeddingSpaceStore`
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {config.DB_NAME}.embedding_spaces (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                model VARCHAR(256) NOT NULL,
+                dim INT NOT NULL,
+                column_name VARCHAR(64) NOT NULL,
+                status VARCHAR(16) NOT NULL,
+                migrated_chunk_id INT NOT NULL DEFAULT 0,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        # Progress of every video through `video populate`, see `IngestionStateStore`
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {config.DB_NAME}.ingestion_state (
+                url VARCHAR(256) PRIMARY KEY,
+                video_id VARCHAR(64) NOT NULL,
+                stage VARCHAR(16) NOT NULL,
+                attempts INT NOT NULL DEFAULT 0,
+                error TEXT NULL,
+                fetch_seconds FLOAT NULL,
+                chunk_seconds FLOAT NULL,
+                embed_seconds FLOAT NULL,
+                store_seconds FLOAT NULL,
+                started_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            );
+        """)
+        cur.execute(
+            f"""
+            INSERT INTO {config.DB_NAME}.embedding_spaces (model, dim, column_name, status)
+            SELECT %s, %s, 'embedding', 'active' FROM DUAL
+            WHERE NOT EXISTS (SELECT 1 FROM {config.DB_NAME}.embedding_spaces)
+            """,
+            (config.EMBEDDING_MODEL, config.EMBEDDING_DIM)
+        )
+        conn.commit()
+
+def has_vector_index() -> bool:
+    with connection_pool().connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'chunks' AND INDEX_TYPE = 'VECTOR'
+            """,
+            (config.DB_NAME,)
+        )
+        return cur.fetchone()[0] > 0
+
+def create_vector_index():
+    """Build the vector index over all existing chunks at once, used after bulk loading."""
+    if has_vector_index():
+        return
+    with connection_pool().connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"ALTER TABLE {config.DB_NAME}.chunks ADD VECTOR INDEX (embedding);")
+
+
+def create_db_and_tables(drop_db_first: bool = False, vector_index: bool = True):
     if drop_db_first:
         drop_database()
         
-    native_on_startup()
+    native_on_startup(vector_index=vector_index)
     
\ No newline at end of file
@@ -0,0 +1,190 @@
+import logging
+
+import mariadb
+import numpy as np
+
+from app import config
+from app.storage.db import connection_pool
+from app.storage.models import EmbeddingSpace
+from app.storage.pool import ConnectionPool
+from app.storage.vectors import to_vector_bytes
+
+logger = logging.getLogger(__name__)
+
+# Column of the embedding space every database starts with
+LEGACY_COLUMN = "embedding"
+# Unknown database and unknown table: the schema was not created yet, or before embedding spaces existed
+MISSING_SCHEMA_ERRNOS = (1049, 1146)
+
+
+class EmbeddingSpaceChangedError(RuntimeError):
+    """Another embedding space became active after the process started, it has to be restarted to use it."""
+
+
+def initial_space() -> EmbeddingSpace:
+    """The space `create_db_and_tables` registers for the `embedding` column of a new database."""
+    return EmbeddingSpace(
+        id=0, model=config.EMBEDDING_MODEL, dim=config.EMBEDDING_DIM, column_name=LEGACY_COLUMN, status="active",
+    )
+
+
+class EmbeddingSpaceStore:
+    """
+    Embedding spaces, each an embedding model with its own vector column in `chunks`.
+
+    The active space is the one searched and written on ingestion. Moving to another
+    model creates a migrating space with a new nullable column, which is backfilled
+    in batches while the active column keeps serving, and becomes active on cutover.
+    """
+    def __init__(self, pool: ConnectionPool | None = None):
+        self.pool = pool or connection_pool()
+
+    def list_spaces(self) -> list[EmbeddingSpace]:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(
+                """
+                SELECT id, model, dim, column_name, status, migrated_chunk_id, created_at
+                FROM semantic_search.embedding_spaces ORDER BY id
+                """
+            )
+            return [EmbeddingSpace(**row) for row in cursor.fetchall()]
+
+    def active_space(self) -> EmbeddingSpace | None:
+        return next((space for space in self.list_spaces() if space.status == "active"), None)
+
+    def current_space(self) -> EmbeddingSpace:
+        """The active space, or the initial one when the schema does not exist yet."""
+        try:
+            space = self.active_space()
+        except mariadb.Error as e:
+            if getattr(e, "errno", None) not in MISSING_SCHEMA_ERRNOS:
+                raise
+            logger.info(f"No embedding spaces in the database yet ({e}), using {config.EMBEDDING_MODEL}")
+            space = None
+        return space or initial_space()
+
+    def migrating_space(self) -> EmbeddingSpace | None:
+        return next((space for space in self.list_spaces() if space.status == "migrating"), None)
+
+    def create_space(self, model: str, dim: int) -> EmbeddingSpace:
+        """Register a migrating space and add its nullable column, which does not rebuild the table."""
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "INSERT INTO semantic_search.embedding_spaces (model, dim, column_name, status) VALUES (%s, %s, '', 'migrating')",
+                (model, dim)
+            )
+            space_id = cursor.lastrowid
+            column_name = f"embedding_{space_id}"
+            cursor.execute(
+                "UPDATE semantic_search.embedding_spaces SET column_name = %s WHERE id = %s", (column_name, space_id)
+            )
+            connection.commit()
+            cursor.execute(f"ALTER TABLE semantic_search.chunks ADD COLUMN IF NOT EXISTS {column_name} VECTOR({dim}) NULL")
+        logger.info(f"Created embedding space {space_id} for {model} ({dim} dimensions)")
+        return EmbeddingSpace(id=space_id, model=model, dim=dim, column_name=column_name, status="migrating")
+
+    def count_chunks(self, space: EmbeddingSpace) -> tuple[int, int]:
+        """Number of chunks embedded in the space, and of all chunks."""
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT COUNT({space.column_name}), COUNT(*) FROM semantic_search.chunks")
+            embedded, total = cursor.fetchone()
+            return embedded, total
+
+    def chunks_to_embed(
+        self, space: EmbeddingSpace, batch_size: int, after_id: int | None = None,
+    ) -> list[tuple[int, str]]:
+        """
+        Ids and texts of the next chunks without an embedding in the space, in id order,
+        after `after_id` or the resume point of the space.
+        """
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                f"""
+                SELECT id, text FROM semantic_search.chunks
+                WHERE id > %s AND {space.column_name} IS NULL
+                ORDER BY id
+                LIMIT %s
+                """,
+                (space.migrated_chunk_id if after_id is None else after_id, batch_size)
+            )
+            return [(chunk_id, text) for chunk_id, text in cursor.fetchall()]
+
+    def write_embeddings(self, space: EmbeddingSpace, chunk_ids: list[int], embeddings: np.ndarray):
+        """Store embeddings of the chunks and advance the resume point in the same transaction."""
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.executemany(
+                f"UPDATE semantic_search.chunks SET {space.column_name} = %s WHERE id = %s",
+                [(to_vector_bytes(embedding), chunk_id) for chunk_id, embedding in zip(chunk_ids, embeddings, strict=True)]
+            )
+            cursor.execute(
+                # Chunks found behind the resume point do not move it back
+                "UPDATE semantic_search.embedding_spaces SET migrated_chunk_id = GREATEST(migrated_chunk_id, %s) "
+                "WHERE id = %s",
+                (max(chunk_ids), space.id)
+            )
+            connection.commit()
+        space.migrated_chunk_id = max(space.migrated_chunk_id, *chunk_ids)
+
+    def cut_over(self, space: EmbeddingSpace):
+        """
+        Make a fully backfilled space the active one, then move the vector index to its column.
+
+        The space is marked active first, so that running processes notice the change and
+        stop instead of writing and searching the old column, and a cutover interrupted
+        before the index moved is finished by calling it again. A table holds one vector
+        index, so a single ALTER moves it from the retired column to the new one. Retired
+        columns become nullable, as ingestion only writes the active one.
+        """
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "UPDATE semantic_search.embedding_spaces SET status = 'retired' WHERE status = 'active' AND id != %s",
+                (space.id,)
+            )
+            cursor.execute(
+                "UPDATE semantic_search.embedding_spaces SET status = 'active' WHERE id = %s", (space.id,)
+            )
+            connection.commit()
+        space.status = "active"
+
+        changes = self.pending_schema_changes(space)
+        if changes:
+            logger.info(f"Building the vector index of embedding space {space.id}")
+            with self.pool.connection() as connection:
+                connection.cursor().execute(f"ALTER TABLE semantic_search.chunks {', '.join(changes)}")
+
+    def pending_schema_changes(self, space: EmbeddingSpace) -> list[str]:
+        """Changes of the `chunks` table left to make the space's column the indexed one, empty after its cutover."""
+        retired = [other for other in self.list_spaces() if other.status == "retired"]
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """
+                SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = 'semantic_search' AND TABLE_NAME = 'chunks' AND INDEX_TYPE = 'VECTOR'
+                """
+            )
+            indexes = cursor.fetchall()
+            cursor.execute(
+                """
+                SELECT COLUMN_NAME, IS_NULLABLE FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = 'semantic_search' AND TABLE_NAME = 'chunks'
+                """
+            )
+            nullable = {column_name: is_nullable == "YES" for column_name, is_nullable in cursor.fetchall()}
+
+        changes = [f"DROP INDEX {index_name}" for index_name, column_name in indexes if column_name != space.column_name]
+        changes += [
+            f"MODIFY {other.column_name} VECTOR({other.dim}) NULL"
+            for other in retired if nullable.get(other.column_name) is False
+        ]
+        if nullable.get(space.column_name):
+            changes.append(f"MODIFY {space.column_name} VECTOR({space.dim}) NOT NULL")
+        if all(column_name != space.column_name for _, column_name in indexes):
+            changes.append(f"ADD VECTOR INDEX {space.column_name} ({space.column_name})")
+        return changes
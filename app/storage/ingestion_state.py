@@ -0,0 +1,58 @@
+from app.storage.db import connection_pool
+from app.storage.models import IngestionState
+from app.storage.pool import ConnectionPool
+
+# Ingestion stages of a video, in order, with the state a video is in once the stage completes
+STAGES = {"fetch": "fetched", "chunk": "chunked", "embed": "embedded", "store": "stored"}
+
+
+class IngestionStateStore:
+    """
+    Per-video ingestion progress in the `ingestion_state` table, keyed by video url.
+
+    Every completed stage is recorded with its duration, and every failed attempt
+    with its error, so `video populate` skips stored videos without checking the
+    documents table one by one, and `video status` can report throughput and failures.
+    """
+    def __init__(self, pool: ConnectionPool | None = None):
+        self.pool = pool or connection_pool()
+
+    def stored_urls(self) -> set[str]:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT url FROM semantic_search.ingestion_state WHERE stage = 'stored'")
+            return {url for url, in cursor.fetchall()}
+
+    def list_states(self) -> list[IngestionState]:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM semantic_search.ingestion_state ORDER BY started_at, url")
+            return [IngestionState(**row) for row in cursor.fetchall()]
+
+    def record_stage(self, url: str, video_id: str, stage: str, seconds: float):
+        self.record_stages([(url, video_id)], stage, seconds)
+
+    def record_stages(self, videos: list[tuple[str, str]], stage: str, seconds: float):
+        """Mark videos, given as (url, video id), as having completed the stage, which took `seconds` each."""
+        with self.pool.connection() as connection:
+            connection.cursor().executemany(
+                f"""
+                INSERT INTO semantic_search.ingestion_state (url, video_id, stage, attempts, {stage}_seconds)
+                VALUES (%s, %s, %s, 1, %s)
+                ON DUPLICATE KEY UPDATE stage = VALUES(stage), error = NULL, {stage}_seconds = VALUES({stage}_seconds)
+                """,
+                [(url, video_id, STAGES[stage], seconds) for url, video_id in videos]
+            )
+            connection.commit()
+
+    def record_failure(self, url: str, video_id: str, stage: str, error: str):
+        with self.pool.connection() as connection:
+            connection.cursor().execute(
+                """
+                INSERT INTO semantic_search.ingestion_state (url, video_id, stage, attempts, error)
+                VALUES (%s, %s, 'pending', 1, %s)
+                ON DUPLICATE KEY UPDATE attempts = attempts + 1, error = VALUES(error)
+                """,
+                (url, video_id, f"{stage}: {error}")
+            )
+            connection.commit()
@@ -0,0 +1,203 @@
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+from collections.abc import Iterator
+
+import numpy as np
+
+from app.services.protocols import Repository
+from app.storage.chunk_batch import ChunkBatch, as_chunks
+from app.storage.models import Chunk, Document, SearchFilters, SearchResultChunk
+from app.storage.numpy_index import top_k_smallest
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class _Postings:
+    """Rows containing a term and the term frequency in each, as compact typed arrays."""
+    __slots__ = ("frequencies", "rows")
+
+    def __init__(self):
+        self.rows = array("i")
+        self.frequencies = array("i")
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over chunk texts, for exact term matches
+    ("PEP 703", "uvloop") that embeddings rank poorly.
+
+    Every term maps to postings of row numbers and term frequencies, stored in
+    typed arrays that new chunks are appended to, so the index is updated
+    incrementally by `insert_chunks` without a rebuild. Like `NumpyVectorIndex`,
+    it wraps the source repository: writes and all other reads, including
+    vector search, are delegated to it.
+    """
+    def __init__(self, source: Repository, load: bool = True, k1: float = 1.2, b: float = 0.75):
+        self.source = source
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._postings: dict[str, _Postings] = {}
+        self._lengths = array("i")
+        self._document_ids = array("q")
+        self._total_length = 0
+        self._chunks: list[tuple[int | None, int, float, float, str, int]] = []
+        self._documents: dict[int, tuple[str, str, dict]] = {}
+        if load:
+            self.load()
+
+    @property
+    def index_version(self) -> int:
+        return self.source.index_version
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def load(self):
+        started_at = time.perf_counter()
+        with self._lock:
+            self._postings, self._chunks, self._total_length = {}, [], 0
+            self._lengths, self._document_ids = array("i"), array("q")
+            self._documents = {doc.id: (doc.title, doc.url, doc.meta) for doc in self.source.list_documents()}
+            for batch in self.source.iter_chunks():
+                self._add(batch)
+        logger.info(
+            f"Built lexical index over {len(self._chunks)} chunks with {len(self._postings)} terms "
+            f"in {time.perf_counter() - started_at:.2f}s"
+        )
+
+    def lexical_search(
+        self, query: str, num_results: int = 5, filters: SearchFilters | None = None,
+    ) -> list[SearchResultChunk]:
+        terms = set(tokenize(query))
+        if not terms or num_results <= 0:
+            return []
+
+        # Scoring reads the typed arrays in place, which cannot grow meanwhile, so it holds the lock
+        with self._lock:
+            if not self._chunks:
+                return []
+            scores = self._score(terms)
+            if filters is not None and not filters.is_empty():
+                allowed = [
+                    doc_id for doc_id, (_, _, meta) in self._documents.items() if filters.matches(doc_id, meta)
+                ]
+                scores[~np.isin(np.frombuffer(self._document_ids, dtype=np.int64), allowed)] = 0
+
+            candidates = np.flatnonzero(scores)
+            top = candidates[top_k_smallest(-scores[candidates], num_results)]
+            return [self._result(int(i), float(scores[i])) for i in top]
+
+    def insert_document(self, document: Document) -> int:
+        document_id = self.source.insert_document(document)
+        with self._lock:
+            self._documents[document_id] = (document.title, document.url, document.meta)
+        return document_id
+
+    def insert_chunk(self, chunk: Chunk):
+        self.insert_chunks([chunk])
+
+    def insert_chunks(self, chunks: list[Chunk]):
+        self.source.insert_chunks(chunks)
+        with self._lock:
+            for document_id in {chunk.document_id for chunk in chunks} - self._documents.keys():
+                document = self.source.get_document(document_id)
+                self._documents[document_id] = (document.title, document.url, document.meta)
+            self._add(chunks)
+
+    def bulk_insert(self, items: list[tuple[Document, list[Chunk] | ChunkBatch]]) -> list[int]:
+        document_ids = self.source.bulk_insert(items)
+        with self._lock:
+            for document_id, (document, _) in zip(document_ids, items, strict=True):
+                self._documents[document_id] = (document.title, document.url, document.meta)
+            self._add([chunk for _, chunks in items for chunk in as_chunks(chunks)])
+        return document_ids
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        num_neighbors: int = 5,
+        filters: SearchFilters | None = None,
+        with_embeddings: bool = False,
+    ) -> list[SearchResultChunk]:
+        return self.source.search(query_vector, num_neighbors, filters=filters, with_embeddings=with_embeddings)
+
+    def search_many(self, query_vectors: np.ndarray, num_neighbors: int = 5) -> list[list[SearchResultChunk]]:
+        return self.source.search_many(query_vectors, num_neighbors)
+
+    def is_document_exists(self, url: str) -> bool:
+        return self.source.is_document_exists(url)
+
+    def iter_chunks(self, batch_size: int = 10000) -> Iterator[list[Chunk]]:
+        return self.source.iter_chunks(batch_size)
+
+    def list_documents(self) -> list[Document]:
+        return self.source.list_documents()
+
+    def list_documents_paginated(self, limit: int, offset: int) -> tuple[list[Document], int]:
+        return self.source.list_documents_paginated(limit, offset)
+
+    def get_document(self, document_id: int) -> Document:
+        return self.source.get_document(document_id)
+
+    def _score(self, terms: set[str]) -> np.ndarray:
+        """BM25 score of every row for the query terms, with the lock held."""
+        num_rows = len(self._chunks)
+        average_length = self._total_length / num_rows
+        lengths = np.frombuffer(self._lengths, dtype=np.int32)
+        scores = np.zeros(num_rows, dtype=np.float32)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            rows = np.frombuffer(postings.rows, dtype=np.int32)
+            frequencies = np.frombuffer(postings.frequencies, dtype=np.int32).astype(np.float32)
+            idf = math.log(1 + (num_rows - len(rows) + 0.5) / (len(rows) + 0.5))
+            normalization = self.k1 * (1 - self.b + self.b * lengths[rows] / average_length)
+            scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + normalization)
+        return scores
+
+    def _add(self, chunks: list[Chunk]):
+        """Append chunks to the postings, with the lock held."""
+        for chunk in chunks:
+            row = len(self._chunks)
+            terms = tokenize(chunk.text)
+            frequencies: dict[str, int] = {}
+            for term in terms:
+                frequencies[term] = frequencies.get(term, 0) + 1
+            for term, frequency in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                postings.rows.append(row)
+                postings.frequencies.append(frequency)
+            self._lengths.append(len(terms))
+            self._document_ids.append(chunk.document_id)
+            self._total_length += len(terms)
+            self._chunks.append(
+                (chunk.id, chunk.chunk_index, chunk.start_ts, chunk.end_ts, chunk.text, chunk.document_id)
+            )
+
+    def _result(self, row: int, score: float) -> SearchResultChunk:
+        chunk_id, chunk_index, start_ts, end_ts, text, document_id = self._chunks[row]
+        title, url, _ = self._documents.get(document_id, ("", "", {}))
+        return SearchResultChunk(
+            id=chunk_id,
+            chunk_index=chunk_index,
+            start_ts=start_ts,
+            end_ts=end_ts,
+            text=text,
+            score=score,
+            document_title=title,
+            document_url=url,
+        )
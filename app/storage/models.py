@@ -1,3 +1,4 @@
+import json
 import numpy as np
 
 from pydantic import BaseModel, Field, ConfigDict
@@ -26,12 +27,105 @@ class Chunk(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
 
+class IngestionState(BaseModel):
+    """Progress of a video through ingestion, with the time spent in every completed stage."""
+    url: str
+    video_id: str
+    # Last completed stage: "pending", "fetched", "chunked", "embedded" or "stored"
+    stage: str
+    attempts: int = 0
+    # Error of the last failed attempt, cleared when a stage completes
+    error: str | None = None
+    fetch_seconds: float | None = None
+    chunk_seconds: float | None = None
+    embed_seconds: float | None = None
+    store_seconds: float | None = None
+    started_at: datetime | None = None
+    updated_at: datetime | None = None
+
+
+class EmbeddingSpace(BaseModel):
+    """An embedding model with the column of `chunks` holding its vectors."""
+    id: int
+    model: str
+    dim: int
+    column_name: str
+    # "active" is searched and written by ingestion, "migrating" is being backfilled, "retired" is no longer used
+    status: str
+    # Chunks up to this id are embedded, so an interrupted migration resumes after it
+    migrated_chunk_id: int = 0
+    created_at: datetime | None = None
+
+
 class SearchResultChunk(BaseModel):
     id: int | None = None
     chunk_index: int
     start_ts: float
     end_ts: float
     text: str
-    distance: float
+    # Vector distance, None for results found only by lexical search
+    distance: float | None = None
+    # Ranking score when not ranked by distance alone (BM25 or fused rank score), higher is better
+    score: float | None = None
     document_title: str
     document_url: str
+    # Chunk embedding, when the backend has it at hand, so results can be diversified without another query
+    embedding: np.ndarray | None = Field(default=None, exclude=True, repr=False)
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SearchResultChunk):
+            return NotImplemented
+        if (self.embedding is None) != (other.embedding is None):
+            return False
+        if self.embedding is not None and not np.array_equal(self.embedding, other.embedding):
+            return False
+        return self.model_dump() == other.model_dump()
+
+    # Mutable, like any model that is not frozen
+    __hash__ = None
+
+
+class SearchFilters(BaseModel):
+    """
+    Restricts a search to documents whose `meta` has all the given values, and optionally to the given document ids.
+
+    Meta values are compared as JSON scalars in text form, the way `JSON_VALUE` returns them,
+    so `year=2023` matches both `{"year": 2023}` and `{"year": "2023"}`.
+    """
+    meta: dict[str, str | int | float | bool] = Field(default_factory=dict)
+    document_ids: list[int] | None = None
+
+    @classmethod
+    def parse(cls, expressions: list[str]) -> "SearchFilters":
+        """Parse `key=value` expressions, where the `document_id` key selects document ids."""
+        meta, document_ids = {}, None
+        for expression in expressions:
+            key, separator, value = expression.partition("=")
+            if not separator or not key.strip():
+                raise ValueError(f"Invalid filter {expression!r}, expected key=value")
+            if key.strip() == "document_id":
+                document_ids = (document_ids or []) + [int(value)]
+            else:
+                meta[key.strip()] = value.strip()
+        return cls(meta=meta, document_ids=document_ids)
+
+    def is_empty(self) -> bool:
+        return not self.meta and self.document_ids is None
+
+    def meta_items(self) -> list[tuple[str, str]]:
+        return sorted((key, meta_value_text(value)) for key, value in self.meta.items())
+
+    def matches(self, document_id: int, meta: dict) -> bool:
+        if self.document_ids is not None and document_id not in self.document_ids:
+            return False
+        return all(key in meta and meta_value_text(meta[key]) == value for key, value in self.meta_items())
+
+    def cache_key(self) -> tuple:
+        document_ids = tuple(sorted(self.document_ids)) if self.document_ids is not None else None
+        return tuple(self.meta_items()), document_ids
+
+
+def meta_value_text(value) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
@@ -0,0 +1,271 @@
+import logging
+import threading
+import time
+from collections.abc import Iterator
+
+import numpy as np
+
+from app import config
+from app.services.protocols import Repository
+from app.storage.chunk_batch import ChunkBatch
+from app.storage.models import Chunk, Document, SearchFilters, SearchResultChunk
+
+logger = logging.getLogger(__name__)
+
+# Id of chunks appended after an insert, whose database ids are not known to the index
+UNKNOWN_ID = -1
+
+
+class _IndexArrays:
+    """Immutable snapshot of the index: chunk metadata in parallel arrays next to the embedding matrix."""
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        ids: np.ndarray,
+        chunk_indexes: np.ndarray,
+        start_ts: np.ndarray,
+        end_ts: np.ndarray,
+        document_ids: np.ndarray,
+        texts: list[str],
+    ):
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.squared_norms = np.einsum("ij,ij->i", self.embeddings, self.embeddings)
+        self.ids = ids
+        self.chunk_indexes = chunk_indexes
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.document_ids = document_ids
+        self.texts = texts
+
+    @classmethod
+    def from_chunks(cls, chunks: list[Chunk], dim: int = 0) -> "_IndexArrays":
+        if not chunks:
+            return cls(
+                np.empty((0, dim), dtype=np.float32),
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.int32),
+                np.empty(0, dtype=np.float64),
+                np.empty(0, dtype=np.float64),
+                np.empty(0, dtype=np.int64),
+                [],
+            )
+        return cls(
+            np.stack([chunk.embedding for chunk in chunks]),
+            np.array([UNKNOWN_ID if chunk.id is None else chunk.id for chunk in chunks], dtype=np.int64),
+            np.array([chunk.chunk_index for chunk in chunks], dtype=np.int32),
+            np.array([chunk.start_ts for chunk in chunks], dtype=np.float64),
+            np.array([chunk.end_ts for chunk in chunks], dtype=np.float64),
+            np.array([chunk.document_id for chunk in chunks], dtype=np.int64),
+            [chunk.text for chunk in chunks],
+        )
+
+    @classmethod
+    def from_batch(cls, batch: ChunkBatch) -> "_IndexArrays":
+        return cls(
+            batch.embeddings,
+            np.full(len(batch), UNKNOWN_ID, dtype=np.int64),
+            batch.chunk_index,
+            batch.start_ts,
+            batch.end_ts,
+            np.full(len(batch), batch.document_id, dtype=np.int64),
+            list(batch.texts),
+        )
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def concat(self, *others: "_IndexArrays") -> "_IndexArrays":
+        parts = [arrays for arrays in (self, *others) if len(arrays)]
+        if len(parts) <= 1:
+            return parts[0] if parts else self
+        return _IndexArrays(
+            np.concatenate([arrays.embeddings for arrays in parts]),
+            np.concatenate([arrays.ids for arrays in parts]),
+            np.concatenate([arrays.chunk_indexes for arrays in parts]),
+            np.concatenate([arrays.start_ts for arrays in parts]),
+            np.concatenate([arrays.end_ts for arrays in parts]),
+            np.concatenate([arrays.document_ids for arrays in parts]),
+            [text for arrays in parts for text in arrays.texts],
+        )
+
+
+def chunk_id(value: np.int64) -> int | None:
+    return None if value == UNKNOWN_ID else int(value)
+
+
+class NumpyVectorIndex:
+    """
+    In-process exact nearest neighbor search over all chunk embeddings.
+
+    Embeddings are loaded from the source repository into one contiguous float32
+    matrix with precomputed squared norms, so a query is a single matrix-vector
+    product followed by `argpartition`. Results use the same Euclidean distance as
+    the MariaDB search. Writes and non-search reads are delegated to the source
+    repository, and inserted chunks are appended to the in-memory index as well.
+    """
+    def __init__(self, source: Repository, load: bool = True):
+        self.source = source
+        self.index_version = 0
+        self._lock = threading.Lock()
+        self._arrays = _IndexArrays.from_chunks([])
+        # Title, url and meta of every document, by id
+        self._documents: dict[int, tuple[str, str, dict]] = {}
+        if load:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._arrays)
+
+    def load(self):
+        started_at = time.perf_counter()
+        documents = {doc.id: (doc.title, doc.url, doc.meta) for doc in self.source.list_documents()}
+        chunks = [chunk for batch in self.source.iter_chunks() for chunk in batch]
+        arrays = _IndexArrays.from_chunks(chunks)
+        with self._lock:
+            self._documents = documents
+            self._arrays = arrays
+            self.index_version += 1
+        logger.info(
+            f"Loaded {len(arrays)} chunks of {len(documents)} documents into the in-process index "
+            f"in {time.perf_counter() - started_at:.2f}s"
+        )
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        num_neighbors: int = 5,
+        filters: SearchFilters | None = None,
+        with_embeddings: bool = False,
+    ) -> list[SearchResultChunk]:
+        # Results always carry their embeddings, views of the in-memory matrix that cost nothing to return.
+        # Appends swap the whole snapshot, so searches never see partially updated arrays
+        arrays = self._arrays
+        if len(arrays) == 0 or num_neighbors <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        mask = None if filters is None or filters.is_empty() else self._filter_mask(arrays.document_ids, filters)
+        if mask is not None and mask.mean() <= config.SEARCH_PREFILTER_SELECTIVITY:
+            # Narrow filter: only the matching rows are scored
+            rows = np.flatnonzero(mask)
+            squared_distances = arrays.squared_norms[rows] - 2 * (arrays.embeddings[rows] @ query) + query @ query
+        else:
+            rows = np.arange(len(arrays))
+            squared_distances = arrays.squared_norms - 2 * (arrays.embeddings @ query) + query @ query
+            if mask is not None:
+                # Broad filter: scanning everything is cheaper than gathering the matching rows
+                squared_distances[~mask] = np.inf
+                num_neighbors = min(num_neighbors, int(mask.sum()))
+
+        top = top_k_smallest(squared_distances, num_neighbors)
+        distances = np.sqrt(np.maximum(squared_distances[top], 0))
+        return [self._result(arrays, int(rows[i]), float(distance)) for i, distance in zip(top, distances, strict=True)]
+
+    def search_many(self, query_vectors: np.ndarray, num_neighbors: int = 5) -> list[list[SearchResultChunk]]:
+        arrays = self._arrays
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if len(arrays) == 0 or num_neighbors <= 0:
+            return [[] for _ in range(len(queries))]
+
+        results = []
+        # Queries are scored in blocks: one matrix-matrix product per block, with the
+        # distance matrix bounded to block size x number of chunks
+        for start in range(0, len(queries), config.SEARCH_MANY_QUERY_BLOCK_SIZE):
+            block = queries[start:start + config.SEARCH_MANY_QUERY_BLOCK_SIZE]
+            block_distances = (
+                arrays.squared_norms[None, :]
+                - 2 * (block @ arrays.embeddings.T)
+                + np.einsum("ij,ij->i", block, block)[:, None]
+            )
+            for squared_distances in block_distances:
+                top = top_k_smallest(squared_distances, num_neighbors)
+                distances = np.sqrt(np.maximum(squared_distances[top], 0))
+                results.append(
+                    [self._result(arrays, int(i), float(distance)) for i, distance in zip(top, distances, strict=True)]
+                )
+        return results
+
+    def insert_document(self, document: Document) -> int:
+        document_id = self.source.insert_document(document)
+        with self._lock:
+            self._documents[document_id] = (document.title, document.url, document.meta)
+        return document_id
+
+    def insert_chunk(self, chunk: Chunk):
+        self.insert_chunks([chunk])
+
+    def insert_chunks(self, chunks: list[Chunk]):
+        self.source.insert_chunks(chunks)
+        self._append(chunks)
+
+    def bulk_insert(self, items: list[tuple[Document, list[Chunk] | ChunkBatch]]) -> list[int]:
+        document_ids = self.source.bulk_insert(items)
+        with self._lock:
+            for document_id, (document, _) in zip(document_ids, items, strict=True):
+                self._documents[document_id] = (document.title, document.url, document.meta)
+        # Batches are appended as they are, without going through chunk objects
+        new_arrays = [
+            _IndexArrays.from_batch(chunks) if isinstance(chunks, ChunkBatch) else _IndexArrays.from_chunks(chunks)
+            for _, chunks in items if len(chunks)
+        ]
+        if new_arrays:
+            with self._lock:
+                self._arrays = self._arrays.concat(*new_arrays)
+                self.index_version += 1
+        return document_ids
+
+    def is_document_exists(self, url: str) -> bool:
+        return self.source.is_document_exists(url)
+
+    def iter_chunks(self, batch_size: int = 10000) -> Iterator[list[Chunk]]:
+        return self.source.iter_chunks(batch_size)
+
+    def list_documents(self) -> list[Document]:
+        return self.source.list_documents()
+
+    def list_documents_paginated(self, limit: int, offset: int) -> tuple[list[Document], int]:
+        return self.source.list_documents_paginated(limit, offset)
+
+    def get_document(self, document_id: int) -> Document:
+        return self.source.get_document(document_id)
+
+    def _append(self, chunks: list[Chunk]):
+        if not chunks:
+            return
+        with self._lock:
+            for document_id in {chunk.document_id for chunk in chunks} - self._documents.keys():
+                document = self.source.get_document(document_id)
+                self._documents[document_id] = (document.title, document.url, document.meta)
+            self._arrays = self._arrays.concat(_IndexArrays.from_chunks(chunks))
+            self.index_version += 1
+
+    def _filter_mask(self, document_ids: np.ndarray, filters: SearchFilters) -> np.ndarray:
+        """Which rows belong to documents matching the filters."""
+        with self._lock:
+            documents = list(self._documents.items())
+        allowed = [doc_id for doc_id, (_, _, meta) in documents if filters.matches(doc_id, meta)]
+        return np.isin(document_ids, allowed)
+
+    def _result(self, arrays: _IndexArrays, i: int, distance: float) -> SearchResultChunk:
+        document_id = int(arrays.document_ids[i])
+        title, url, _ = self._documents.get(document_id, ("", "", {}))
+        return SearchResultChunk(
+            id=chunk_id(arrays.ids[i]),
+            chunk_index=int(arrays.chunk_indexes[i]),
+            start_ts=float(arrays.start_ts[i]),
+            end_ts=float(arrays.end_ts[i]),
+            text=arrays.texts[i],
+            distance=distance,
+            document_title=title,
+            document_url=url,
+            embedding=arrays.embeddings[i],
+        )
+
+
+def top_k_smallest(values: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k smallest values, in ascending order of value."""
+    if k < len(values):
+        candidates = np.argpartition(values, k - 1)[:k]
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(values[candidates], kind="stable")]
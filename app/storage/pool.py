@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, suppress
+
+import mariadb
+
+from app.metrics import Metrics
+from app.metrics import metrics as default_metrics
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a connection can no longer be trusted and is closed instead of reused
+CONNECTION_ERRORS = (mariadb.InterfaceError, mariadb.OperationalError)
+
+
+class PoolTimeoutError(TimeoutError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of up to `size` database connections, opened lazily.
+
+    Connections are borrowed for one operation with `connection()`. A borrower waits
+    up to `timeout` seconds for a free connection, and the wait is reported as the
+    `<name>.wait` timing. Connections idle for longer than `health_check_interval`
+    are pinged before being handed out, and replaced if the ping fails; connections
+    that fail with a connection error while borrowed are closed, so the next borrower
+    gets a fresh one.
+    """
+    def __init__(
+        self,
+        connect: Callable[[], mariadb.Connection],
+        size: int,
+        timeout: float,
+        health_check_interval: float,
+        metrics: Metrics = default_metrics,
+        name: str = "db.pool",
+    ):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.metrics = metrics
+        self.name = name
+        self._condition = threading.Condition()
+        self._idle: list[tuple[mariadb.Connection, float]] = []
+        self._num_open = 0
+
+    @property
+    def num_open(self) -> int:
+        return self._num_open
+
+    @property
+    def num_idle(self) -> int:
+        return len(self._idle)
+
+    @contextmanager
+    def connection(self) -> Iterator[mariadb.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            self._discard(conn)
+            raise
+        except BaseException:
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._num_open -= len(idle)
+            self._condition.notify_all()
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def _acquire(self) -> mariadb.Connection:
+        started_at = time.monotonic()
+        deadline = started_at + self.timeout
+        with self._condition:
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._num_open < self.size:
+                    self._num_open += 1
+                    conn, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.metrics.increment(f"{self.name}.timeouts")
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s (pool size {self.size})"
+                    )
+                self._condition.wait(remaining)
+        self.metrics.observe(f"{self.name}.wait", time.monotonic() - started_at)
+
+        if conn is None:
+            return self._open()
+        if time.monotonic() - released_at > self.health_check_interval and not self._is_alive(conn):
+            logger.warning("Replacing a database connection that failed its health check")
+            self.metrics.increment(f"{self.name}.reconnects")
+            _close_quietly(conn)
+            return self._open()
+        return conn
+
+    def _open(self) -> mariadb.Connection:
+        # The slot is already counted in `_num_open`, and is given back if connecting fails
+        try:
+            conn = self.connect()
+        except BaseException:
+            with self._condition:
+                self._num_open -= 1
+                self._condition.notify()
+            raise
+        self.metrics.increment(f"{self.name}.connects")
+        return conn
+
+    def _release(self, conn: mariadb.Connection):
+        try:
+            # Ends the read snapshot of the borrower, so the next one sees rows committed in the meantime
+            conn.rollback()
+        except CONNECTION_ERRORS:
+            self._discard(conn)
+            return
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def _discard(self, conn: mariadb.Connection):
+        _close_quietly(conn)
+        with self._condition:
+            self._num_open -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _is_alive(conn: mariadb.Connection) -> bool:
+        try:
+            conn.ping()
+            return True
+        except mariadb.Error:
+            return False
+
+
+def _close_quietly(conn: mariadb.Connection):
+    with suppress(mariadb.Error):
+        conn.close()
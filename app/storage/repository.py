@@ -1,92 +1,356 @@
 import json
-from typing import Tuple
+import math
+import time
+from collections.abc import Iterator
 
+import mariadb
 import numpy as np
-from app.storage.models import Document, Chunk, SearchResultChunk
-from app.storage.db import native_connection
+
+from app import config
+from app.storage.chunk_batch import ChunkBatch
+from app.storage.db import connection_pool
+from app.storage.embedding_spaces import (
+    LEGACY_COLUMN,
+    MISSING_SCHEMA_ERRNOS,
+    EmbeddingSpaceChangedError,
+)
+from app.storage.models import Chunk, Document, SearchFilters, SearchResultChunk
+from app.storage.pool import ConnectionPool
+from app.storage.vectors import from_vector_bytes, to_vector_bytes
 
 
 class NativeMariadDBRepository:
-    def __init__(self):
-        self.connection = native_connection()
+    def __init__(
+        self,
+        pool: ConnectionPool | None = None,
+        embedding_column: str = LEGACY_COLUMN,
+        space_check_seconds: float | None = None,
+    ):
+        # Every operation borrows its own connection, so concurrent requests do not queue on one socket
+        self.pool = pool or connection_pool()
+        # Column of the active embedding space, searched and written on insert
+        self.embedding_column = embedding_column
+        # Writes check that the column is still the active one, searches at most this often, None never checks
+        self.space_check_seconds = space_check_seconds
+        self._space_checked_at: float | None = None
+        self.index_version = 0
+        # Total number of chunks with the index version it was counted at, to estimate filter selectivity
+        self._chunk_count: tuple[int, int] | None = None
+        # Distance between ids of rows inserted by one statement, 0 when they may not be consecutive
+        self._id_step: int | None = None
 
     def insert_document(self, document: Document) -> int:
-        cursor = self.connection.cursor()
-        cursor.execute(
-            "INSERT INTO semantic_search.documents (title, url, created_at, meta) VALUES (%s, %s, %s, %s)",
-            (document.title, document.url, document.created_at, json.dumps(document.meta))
-        )
-        self.connection.commit()
-        return cursor.lastrowid
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "INSERT INTO semantic_search.documents (title, url, created_at, meta) VALUES (%s, %s, %s, %s)",
+                (document.title, document.url, document.created_at, json.dumps(document.meta))
+            )
+            connection.commit()
+            return cursor.lastrowid
     
     def insert_chunk(self, chunk: Chunk):
-        self.connection.cursor().execute(
-            "INSERT INTO semantic_search.chunks (start_ts, end_ts, text, document_id, embedding) VALUES (%s, %s, %s, %s, %s)",
-            (chunk.start_ts, chunk.end_ts, chunk.text, chunk.document_id, chunk.embedding)
-        )
-        self.connection.commit()
+        with self.pool.connection() as connection:
+            self._check_embedding_space(connection)
+            connection.cursor().execute(
+                f"INSERT INTO semantic_search.chunks (chunk_index, start_ts, end_ts, text, document_id, {self.embedding_column}) VALUES (%s, %s, %s, %s, %s, %s)",
+                (chunk.chunk_index, chunk.start_ts, chunk.end_ts, chunk.text, chunk.document_id, to_vector_bytes(chunk.embedding))
+            )
+            connection.commit()
+        self.index_version += 1
 
     def insert_chunks(self, chunks: list[Chunk]):
-        self.connection.cursor().executemany(
-            "INSERT INTO semantic_search.chunks (chunk_index, start_ts, end_ts, text, document_id, embedding) VALUES (%s, %s, %s, %s, %s,  VEC_FromText(%s))",
-            [(chunk.chunk_index, chunk.start_ts, chunk.end_ts, chunk.text, chunk.document_id, str(chunk.embedding.tolist())) for chunk in chunks]
-        )
-        self.connection.commit()
+        with self.pool.connection() as connection:
+            self._check_embedding_space(connection)
+            connection.cursor().executemany(
+                f"INSERT INTO semantic_search.chunks (chunk_index, start_ts, end_ts, text, document_id, {self.embedding_column}) VALUES (%s, %s, %s, %s, %s, %s)",
+                [(chunk.chunk_index, chunk.start_ts, chunk.end_ts, chunk.text, chunk.document_id, to_vector_bytes(chunk.embedding)) for chunk in chunks]
+            )
+            connection.commit()
+        self.index_version += 1
+
+    def bulk_insert(
+        self,
+        items: list[tuple[Document, list[Chunk] | ChunkBatch]],
+        rows_per_statement: int = config.BULK_LOAD_ROWS_PER_INSERT,
+    ) -> list[int]:
+        """
+        Insert documents with their chunks in one transaction, using multi-row inserts for both.
+
+        A failure rolls back the whole batch, so no document is left without its chunks.
+        Sets `document_id` on the chunks and returns the ids of the inserted documents.
+        """
+        with self.pool.connection() as connection:
+            self._check_embedding_space(connection)
+            cursor = connection.cursor()
+            document_ids = self._insert_documents(cursor, [document for document, _ in items])
+            rows = []
+            for document_id, (_, chunks) in zip(document_ids, items, strict=True):
+                if isinstance(chunks, ChunkBatch):
+                    chunks.document_id = document_id
+                    rows.extend(chunks.to_rows())
+                    continue
+                for chunk in chunks:
+                    chunk.document_id = document_id
+                    rows.append(
+                        (chunk.chunk_index, chunk.start_ts, chunk.end_ts, chunk.text, chunk.document_id, to_vector_bytes(chunk.embedding))
+                    )
+
+            for start in range(0, len(rows), rows_per_statement):
+                batch = rows[start:start + rows_per_statement]
+                cursor.execute(
+                    f"INSERT INTO semantic_search.chunks (chunk_index, start_ts, end_ts, text, document_id, {self.embedding_column}) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch)),
+                    [value for row in batch for value in row]
+                )
+            connection.commit()
+        self.index_version += 1
+        return document_ids
 
     def is_document_exists(self, url: str) -> bool:
-        cursor = self.connection.cursor()
-        cursor.execute(
-            "SELECT COUNT(*) FROM semantic_search.documents WHERE url = %s",
-            (url,)
-        )
-        return cursor.fetchone()[0] > 0
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT COUNT(*) FROM semantic_search.documents WHERE url = %s",
+                (url,)
+            )
+            return cursor.fetchone()[0] > 0
 
-    def search(self, query_vector: np.ndarray, num_neighbors: int = 5) -> list[SearchResultChunk]:
-        cursor = self.connection.cursor(dictionary=True)
-        cursor.execute(
+    def search(
+        self,
+        query_vector: np.ndarray,
+        num_neighbors: int = 5,
+        filters: SearchFilters | None = None,
+        with_embeddings: bool = False,
+    ) -> list[SearchResultChunk]:
+        # Vectors are only selected when asked for, they make up most of the size of a result row
+        with self.pool.connection() as connection:
+            self._check_embedding_space(connection, self.space_check_seconds)
+            cursor = connection.cursor(dictionary=True)
+            if filters is None or filters.is_empty():
+                cursor.execute(self._search_sql("", with_embeddings), (to_vector_bytes(query_vector), num_neighbors))
+                result = cursor.fetchall()
+            else:
+                result = self._filtered_search(cursor, to_vector_bytes(query_vector), num_neighbors, filters, with_embeddings)
+        return [_row_to_search_result(row) for row in result]
+
+    def search_many(self, query_vectors: np.ndarray, num_neighbors: int = 5) -> list[list[SearchResultChunk]]:
         """
-        SELECT chunk_index, start_ts, end_ts, text, document_id,
-               VEC_DISTANCE_EUCLIDEAN(embedding, VEC_FromText(%s)) as distance,
-               documents.title as document_title,
-               documents.url as document_url
-        FROM semantic_search.chunks
-        JOIN semantic_search.documents ON chunks.document_id = documents.id
-        ORDER BY distance ASC
-        LIMIT %s;
-        """,
-            (str(query_vector.tolist()), num_neighbors)
-        )
-        result = cursor.fetchall()
-        return [SearchResultChunk(**row) for row in result]
+        Nearest neighbors of many queries in a single round trip.
+
+        Every query is a separate `ORDER BY distance LIMIT` subquery, so each one can
+        still use the vector index, and the subqueries are combined with UNION ALL.
+        """
+        results: list[list[SearchResultChunk]] = [[] for _ in range(len(query_vectors))]
+        for start in range(0, len(query_vectors), config.SEARCH_MANY_QUERIES_PER_STATEMENT):
+            batch = query_vectors[start:start + config.SEARCH_MANY_QUERIES_PER_STATEMENT]
+            subquery = f"""
+            (SELECT %s as query_index, chunk_index, start_ts, end_ts, text, document_id,
+                    VEC_DISTANCE_EUCLIDEAN({self.embedding_column}, %s) as distance,
+                    documents.title as document_title,
+                    documents.url as document_url
+             FROM semantic_search.chunks
+             JOIN semantic_search.documents ON chunks.document_id = documents.id
+             ORDER BY distance ASC
+             LIMIT %s)
+            """
+            params = []
+            for i, query_vector in enumerate(batch):
+                params.extend((start + i, to_vector_bytes(query_vector), num_neighbors))
+
+            with self.pool.connection() as connection:
+                self._check_embedding_space(connection, self.space_check_seconds)
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute(" UNION ALL ".join([subquery] * len(batch)) + " ORDER BY query_index, distance", params)
+                rows = cursor.fetchall()
+            for row in rows:
+                results[row.pop("query_index")].append(_row_to_search_result(row))
+        return results
     
+    def iter_chunks(self, batch_size: int = 10000) -> Iterator[list[Chunk]]:
+        """Iterate over all chunks with their embeddings, in batches ordered by chunk id."""
+        last_id = 0
+        while True:
+            # The connection is given back between batches, while the consumer processes them
+            with self.pool.connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute(
+                    f"""
+                    SELECT id, chunk_index, start_ts, end_ts, text, document_id, {self.embedding_column} as embedding
+                    FROM semantic_search.chunks
+                    WHERE id > %s
+                    ORDER BY id
+                    LIMIT %s
+                    """,
+                    (last_id, batch_size)
+                )
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            for row in rows:
+                row["embedding"] = from_vector_bytes(row["embedding"])
+            yield [Chunk(**row) for row in rows]
+            last_id = rows[-1]["id"]
+
     def list_documents(self) -> list[Document]:
-        cursor = self.connection.cursor(dictionary=True)
-        cursor.execute("SELECT id, title, created_at, url, meta FROM semantic_search.documents")
-        return [_dict_to_document(row) for row in cursor.fetchall()]
+        with self.pool.connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT id, title, created_at, url, meta FROM semantic_search.documents")
+            return [_dict_to_document(row) for row in cursor.fetchall()]
     
-    def list_documents_paginated(self, limit: int, offset: int) -> Tuple[list[Document], int]:
+    def list_documents_paginated(self, limit: int, offset: int) -> tuple[list[Document], int]:
         """List documents with pagination."""
-        # First, get the total count
-        count_cursor = self.connection.cursor()
-        count_cursor.execute("SELECT COUNT(*) FROM semantic_search.documents")
-        total_count = count_cursor.fetchone()[0]
-        
-        # Then get the paginated results
-        cursor = self.connection.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT id, title, created_at, url, meta FROM semantic_search.documents ORDER BY id LIMIT %s OFFSET %s",
-            (limit, offset)
-        )
-        
-        documents = [_dict_to_document(row) for row in cursor.fetchall()]
+        with self.pool.connection() as connection:
+            # First, get the total count
+            count_cursor = connection.cursor()
+            count_cursor.execute("SELECT COUNT(*) FROM semantic_search.documents")
+            total_count = count_cursor.fetchone()[0]
+            
+            # Then get the paginated results
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(
+                "SELECT id, title, created_at, url, meta FROM semantic_search.documents ORDER BY id LIMIT %s OFFSET %s",
+                (limit, offset)
+            )
+            
+            documents = [_dict_to_document(row) for row in cursor.fetchall()]
         return documents, total_count
     
     def get_document(self, document_id: int) -> Document:
-        cursor = self.connection.cursor(dictionary=True)
-        cursor.execute("SELECT id, title, created_at, url, meta FROM semantic_search.documents WHERE id = %s", (document_id,))
-        return _dict_to_document(cursor.fetchone())
+        with self.pool.connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT id, title, created_at, url, meta FROM semantic_search.documents WHERE id = %s", (document_id,))
+            return _dict_to_document(cursor.fetchone())
+
+    def _filtered_search(
+        self, cursor, query: bytes, num_neighbors: int, filters: SearchFilters, with_embeddings: bool,
+    ) -> list[dict]:
+        """
+        Nearest neighbors among the chunks of documents matching the filters.
+
+        Narrow filters scan only the matching chunks, found through the `document_id` index,
+        so latency is bounded by their number. Broad filters let the vector index find
+        proportionally more neighbors than requested and drop the non-matching ones,
+        falling back to the scan if too few of them match.
+        """
+        document_ids = self._matching_document_ids(cursor, filters)
+        if not document_ids:
+            return []
+        in_documents = f"document_id IN ({', '.join(['%s'] * len(document_ids))})"
+        cursor.execute(f"SELECT COUNT(*) AS num_chunks FROM semantic_search.chunks WHERE {in_documents}", document_ids)
+        num_matching = cursor.fetchone()["num_chunks"]
+        num_total = self._count_chunks(cursor)
+
+        if num_matching > num_total * config.SEARCH_PREFILTER_SELECTIVITY:
+            num_candidates = math.ceil(2 * num_neighbors * num_total / num_matching)
+            cursor.execute(
+                f"SELECT * FROM ({self._search_sql('', with_embeddings)}) AS nearest WHERE {in_documents} ORDER BY distance LIMIT %s",
+                (query, num_candidates, *document_ids, num_neighbors)
+            )
+            rows = cursor.fetchall()
+            if len(rows) >= min(num_neighbors, num_matching):
+                return rows
+
+        cursor.execute(self._search_sql(f"WHERE {in_documents}", with_embeddings), (query, *document_ids, num_neighbors))
+        return cursor.fetchall()
+
+    def _search_sql(self, where: str, with_embeddings: bool) -> str:
+        embedding = f"{self.embedding_column} as embedding," if with_embeddings else ""
+        return _SEARCH_SQL.format(column=self.embedding_column, embedding=embedding, where=where)
+
+    @staticmethod
+    def _matching_document_ids(cursor, filters: SearchFilters) -> list[int]:
+        conditions, params = [], []
+        for key, value in filters.meta_items():
+            conditions.append("JSON_VALUE(meta, %s) = %s")
+            params.extend((f'$."{key}"', value))
+        if filters.document_ids is not None:
+            if not filters.document_ids:
+                return []
+            conditions.append(f"id IN ({', '.join(['%s'] * len(filters.document_ids))})")
+            params.extend(filters.document_ids)
+        cursor.execute(f"SELECT id FROM semantic_search.documents WHERE {' AND '.join(conditions)}", params)
+        return [row["id"] for row in cursor.fetchall()]
+
+    def _check_embedding_space(self, connection, max_age_seconds: float = 0.0):
+        """
+        Raise `EmbeddingSpaceChangedError` when another space became active since the repository was created,
+        unless the column was found active less than `max_age_seconds` ago.
+        """
+        if self.space_check_seconds is None:
+            return
+        now = time.monotonic()
+        if self._space_checked_at is not None and now - self._space_checked_at < max_age_seconds:
+            return
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT column_name FROM semantic_search.embedding_spaces WHERE status = 'active'")
+            row = cursor.fetchone()
+        except mariadb.Error as e:
+            # A database created before embedding spaces only has the legacy column
+            if getattr(e, "errno", None) not in MISSING_SCHEMA_ERRNOS:
+                raise
+            row = None
+        active_column = row[0] if row else LEGACY_COLUMN
+        if active_column != self.embedding_column:
+            raise EmbeddingSpaceChangedError(
+                f"The active embedding space moved from column {self.embedding_column} to {active_column}, "
+                f"restart to use it"
+            )
+        self._space_checked_at = now
+
+    def _count_chunks(self, cursor) -> int:
+        if self._chunk_count is None or self._chunk_count[0] != self.index_version:
+            cursor.execute("SELECT COUNT(*) AS num_chunks FROM semantic_search.chunks")
+            self._chunk_count = (self.index_version, cursor.fetchone()["num_chunks"])
+        return self._chunk_count[1]
+
+    def _insert_documents(self, cursor, documents: list[Document]) -> list[int]:
+        """Insert documents with one multi-row statement, and resolve their ids from `lastrowid`."""
+        if not documents:
+            return []
+        if self._id_step is None:
+            cursor.execute("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")
+            lock_mode, increment = cursor.fetchone()
+            # With interleaved lock mode, ids of one statement are not guaranteed to be consecutive
+            self._id_step = int(increment) if int(lock_mode) != 2 else 0
+
+        rows = [(doc.title, doc.url, doc.created_at, json.dumps(doc.meta)) for doc in documents]
+        sql = "INSERT INTO semantic_search.documents (title, url, created_at, meta) VALUES "
+        if not self._id_step:
+            document_ids = []
+            for row in rows:
+                cursor.execute(sql + "(%s, %s, %s, %s)", row)
+                document_ids.append(cursor.lastrowid)
+            return document_ids
+
+        cursor.execute(
+            sql + ", ".join(["(%s, %s, %s, %s)"] * len(rows)),
+            [value for row in rows for value in row]
+        )
+        # `lastrowid` of a multi-row insert is the id of its first row
+        return [cursor.lastrowid + i * self._id_step for i in range(len(rows))]
+
+
+_SEARCH_SQL = """
+    SELECT chunk_index, start_ts, end_ts, text, document_id, {embedding}
+           VEC_DISTANCE_EUCLIDEAN({column}, %s) as distance,
+           documents.title as document_title,
+           documents.url as document_url
+    FROM semantic_search.chunks
+    JOIN semantic_search.documents ON chunks.document_id = documents.id
+    {where}
+    ORDER BY distance ASC
+    LIMIT %s
+"""
+
+
+def _row_to_search_result(row: dict) -> SearchResultChunk:
+    if "embedding" in row:
+        row["embedding"] = from_vector_bytes(row["embedding"])
+    return SearchResultChunk(**row)
 
 
 def _dict_to_document(row: dict) -> Document:
     row["meta"] = json.loads(row["meta"])
-    return Document(**row)
\ No newline at end of file
+    return Document(**row)
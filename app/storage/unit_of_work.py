@@ -0,0 +1,95 @@
+import logging
+import time
+from collections.abc import Callable
+
+from app import config
+from app.metrics import metrics
+from app.services.protocols import Repository
+from app.storage.chunk_batch import ChunkBatch
+from app.storage.embedding_spaces import EmbeddingSpaceChangedError
+from app.storage.models import Chunk, Document
+
+logger = logging.getLogger(__name__)
+
+
+class UnitOfWork:
+    """
+    Buffers documents with their chunks and writes them `commit_interval` documents per transaction.
+
+    Every batch is written with `Repository.bulk_insert`, so a document is never
+    committed without its chunks, and the commit cost is shared by the whole batch.
+    Used as a context manager, the remaining documents are committed on exit, or
+    discarded if the block raised. Commit times are reported as `<name>.commit` timings,
+    and `on_commit` is called with the committed documents and the commit duration.
+    A failed commit is retried with exponential backoff, the transaction is rolled back
+    in between, unless the active embedding space changed. Documents of a commit that
+    failed for good are kept in `failed_documents` and passed to `on_failure` with the error.
+    """
+    def __init__(
+        self,
+        repo: Repository,
+        commit_interval: int = config.INGEST_COMMIT_INTERVAL,
+        name: str = "unit_of_work",
+        on_commit: Callable[[list[Document], float], None] | None = None,
+        on_failure: Callable[[list[Document], Exception], None] | None = None,
+        max_attempts: int = config.INGEST_MAX_ATTEMPTS,
+        retry_backoff_seconds: float = config.INGEST_RETRY_BACKOFF_SECONDS,
+    ):
+        self.repo = repo
+        self.commit_interval = max(1, commit_interval)
+        self.name = name
+        self.on_commit = on_commit
+        self.on_failure = on_failure
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.num_documents = 0
+        self.num_chunks = 0
+        self.commit_seconds = 0.0
+        self.failed_documents: list[Document] = []
+        self._pending: list[tuple[Document, list[Chunk] | ChunkBatch]] = []
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        elif self._pending:
+            logger.warning(f"Discarding {len(self._pending)} uncommitted documents")
+            self._pending = []
+
+    def add(self, document: Document, chunks: list[Chunk] | ChunkBatch):
+        self._pending.append((document, chunks))
+        if len(self._pending) >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        if not self._pending:
+            return
+        items, self._pending = self._pending, []
+        documents = [document for document, _ in items]
+        for attempt in range(1, self.max_attempts + 1):
+            started_at = time.perf_counter()
+            try:
+                self.repo.bulk_insert(items)
+                break
+            except Exception as e:
+                if attempt == self.max_attempts or isinstance(e, EmbeddingSpaceChangedError):
+                    self.failed_documents.extend(documents)
+                    if self.on_failure is not None:
+                        self.on_failure(documents, e)
+                    raise
+                delay = self.retry_backoff_seconds * 2 ** (attempt - 1)
+                logger.warning(
+                    f"Committing {len(items)} documents failed ({e}), attempt {attempt} of {self.max_attempts}, "
+                    f"retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+        elapsed = time.perf_counter() - started_at
+        metrics.observe(f"{self.name}.commit", elapsed)
+
+        self.commit_seconds += elapsed
+        self.num_documents += len(items)
+        self.num_chunks += sum(len(chunks) for _, chunks in items)
+        if self.on_commit is not None:
+            self.on_commit(documents, elapsed)
@@ -0,0 +1,14 @@
+import numpy as np
+
+# MariaDB stores VECTOR values as packed little-endian float32, and accepts the same bytes as a parameter
+VECTOR_DTYPE = np.dtype("<f4")
+
+
+def to_vector_bytes(vector: np.ndarray) -> bytes:
+    """Serialize a vector to the binary VECTOR format, without formatting it as text."""
+    return np.ascontiguousarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def from_vector_bytes(data: bytes) -> np.ndarray:
+    """Parse a binary VECTOR value into a float32 array."""
+    return np.frombuffer(data, dtype=VECTOR_DTYPE).astype(np.float32)
@@ -18,6 +18,10 @@ class Video(BaseModel):
         return f"{YOUTUBE_VIDEO_URL_PREFIX}{self.id}"
 
 
+def video_id_from_url(url: str) -> str:
+    return url.split("=")[-1]
+
+
 def load_videos_from_json_file_path(file_path: Path) -> list[Video]:
     with open(file_path) as f:
         data = json.load(f)
@@ -1,47 +1,237 @@
-import pickle
 import logging
-from pathlib import Path
+import threading
+import time
+
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Protocol
+
+import requests
+
+from pydantic import BaseModel, Field
 from youtube_transcript_api import (
-    YouTubeTranscriptApi, FetchedTranscript, TranscriptsDisabled, NoTranscriptFound,
+    AgeRestricted,
+    CouldNotRetrieveTranscript,
+    FetchedTranscript,
+    FetchedTranscriptSnippet,
+    InvalidVideoId,
+    NoTranscriptFound,
+    RequestBlocked,
+    TranscriptsDisabled,
+    VideoUnavailable,
+    VideoUnplayable,
+    YouTubeRequestFailed,
+    YouTubeTranscriptApi,
 )
 
+from app import config
+from app.metrics import metrics
+from app.youtube.transcript_store import TranscriptStore
+
 logger = logging.getLogger(__name__)
 
-PICKLE_DIR = Path(__file__).resolve().parents[2] / "data" / "youtube_transcripts"
+
+class PermanentFetchError(Exception):
+    """A transcript that cannot be fetched however often it is retried, e.g. of a removed video."""
+
+
+# Failures of a single transcript request, any other error is a bug and stops a prefetch
+FETCH_ERRORS = (PermanentFetchError, CouldNotRetrieveTranscript, requests.RequestException)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed later: network errors, throttling and server errors."""
+    if isinstance(error, requests.HTTPError):
+        status_code = error.response.status_code if error.response is not None else None
+        return status_code is not None and (status_code == 429 or status_code >= 500)
+    # Requests to YouTube fail with its own errors, which wrap HTTP errors and blocking by rate limits
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, YouTubeRequestFailed, RequestBlocked))
+
+
+class TranscriptSource(Protocol):
+    def fetch(self, video_id: str) -> FetchedTranscript | list:
+        """The transcript of the video, or an empty list if it has none."""
+        ...
+
+
+class YouTubeTranscriptSource:
+    """Transcripts fetched from YouTube, every thread reusing its own HTTP session."""
+    def __init__(self, languages: Iterable[str] = ("en",)):
+        self.languages = list(languages)
+        self._local = threading.local()
+
+    def fetch(self, video_id: str) -> FetchedTranscript | list:
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = self._local.api = YouTubeTranscriptApi(http_client=requests.Session())
+        try:
+            return api.fetch(video_id, languages=self.languages)
+        except (TranscriptsDisabled, NoTranscriptFound):
+            return []
+        except (VideoUnavailable, VideoUnplayable, InvalidVideoId, AgeRestricted) as e:
+            raise PermanentFetchError(f"{type(e).__name__} for video {video_id}") from e
+
+
+class HttpTranscriptSource:
+    """
+    Transcripts served as JSON at `<base_url>/<video id>` by a transcript mirror,
+    with `language`, `language_code`, `is_generated` and a list of `snippets`
+    of `text`, `start` and `duration`. A 404 means the video has no transcript.
+    """
+    def __init__(self, base_url: str, timeout_seconds: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+        self._local = threading.local()
+
+    def fetch(self, video_id: str) -> FetchedTranscript | list:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.get(f"{self.base_url}/{video_id}", timeout=self.timeout_seconds)
+        if response.status_code == 404:
+            return []
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise PermanentFetchError(f"HTTP {response.status_code} for video {video_id}")
+        response.raise_for_status()
+
+        data = response.json()
+        return FetchedTranscript(
+            snippets=[FetchedTranscriptSnippet(**snippet) for snippet in data["snippets"]],
+            video_id=video_id,
+            language=data["language"],
+            language_code=data["language_code"],
+            is_generated=data["is_generated"],
+        )
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, in bursts of up to `capacity`.
+
+    A caller that finds the bucket empty reserves the next token and sleeps until
+    it is due, so waiting callers are served in order. A rate of 0 disables the limit.
+    """
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated_at = clock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+
+
+class PrefetchStats(BaseModel):
+    total: int = 0
+    cached: int = 0
+    fetched: int = 0
+    failed: list[str] = Field(default_factory=list)
+    elapsed_seconds: float = 0.0
 
 
-class YouTubeTranscriptFetcherWithCache:
-    def fetch(self, video_id: str) -> FetchedTranscript:
-        return fetch_video_transcript_with_cache(video_id)
+class ConcurrentTranscriptFetcher:
+    """
+    Transcripts from the store, fetched from the source and stored when missing.
 
+    Requests from all threads share one token bucket, so concurrent fetches stay
+    under the source's rate limit, and failed requests are retried with exponential
+    backoff if they may succeed later, see `is_retryable`. `prefetch` fetches many
+    videos with a thread pool, ahead of ingestion. Request times are reported as
+    `fetch.request` timings.
+    """
+    def __init__(
+        self,
+        source: TranscriptSource,
+        store: TranscriptStore,
+        rate_per_second: float = config.FETCH_RATE_PER_SECOND,
+        burst: int = config.FETCH_BURST,
+        max_attempts: int = config.FETCH_MAX_ATTEMPTS,
+        retry_backoff_seconds: float = config.FETCH_RETRY_BACKOFF_SECONDS,
+        workers: int = config.FETCH_WORKERS,
+    ):
+        self.source = source
+        self.store = store
+        self.rate_limit = TokenBucket(rate_per_second, burst)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.workers = max(1, workers)
 
-def fetch_video_transcript(video_id: str, to_pickle: bool) -> FetchedTranscript:
-    try:
-        yt = YouTubeTranscriptApi()
-        transcript = yt.fetch(video_id, languages=["en"])
-    except (TranscriptsDisabled, NoTranscriptFound):
-        transcript = []
+    def fetch(self, video_id: str) -> FetchedTranscript | list:
+        transcript = self.store.get(video_id)
+        if transcript is not None:
+            logger.debug(f"Loaded transcript of video {video_id} from the store")
+            return transcript
+        transcript = self._fetch_with_retries(video_id)
+        self.store.put(video_id, transcript)
+        return transcript
 
-    if to_pickle:
-        PICKLE_DIR.mkdir(parents=True, exist_ok=True)
-        file_path = PICKLE_DIR / f"{video_id}.pkl"
-        with open(file_path, "wb") as f:
-            pickle.dump(transcript, f)
+    def prefetch(self, video_ids: list[str], workers: int | None = None) -> PrefetchStats:
+        """Fetch and store the transcripts of all videos not stored yet, `workers` at a time."""
+        workers = max(1, workers or self.workers)
+        stats = PrefetchStats(total=len(video_ids))
+        started_at = time.perf_counter()
+        missing = [video_id for video_id in video_ids if video_id not in self.store]
+        stats.cached = len(video_ids) - len(missing)
+        logger.info(f"Fetching {len(missing)} transcripts with {workers} workers, {stats.cached} already stored")
 
-    return transcript
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as executor:
+            futures = {video_id: executor.submit(self.fetch, video_id) for video_id in missing}
+            for video_id, future in futures.items():
+                try:
+                    future.result()
+                    stats.fetched += 1
+                except FETCH_ERRORS as e:
+                    logger.warning(f"Failed to fetch the transcript of video {video_id}: {e}")
+                    stats.failed.append(video_id)
+                except Exception:
+                    executor.shutdown(cancel_futures=True)
+                    raise
 
+        stats.elapsed_seconds = time.perf_counter() - started_at
+        return stats
 
-def load_video_transcript(video_id: str) -> FetchedTranscript:
-    file_path = PICKLE_DIR / f"{video_id}.pkl"
-    with open(file_path, "rb") as f:
-        return pickle.load(f)
+    def _fetch_with_retries(self, video_id: str) -> FetchedTranscript | list:
+        for attempt in range(1, self.max_attempts + 1):
+            self.rate_limit.acquire()
+            started_at = time.perf_counter()
+            try:
+                transcript = self.source.fetch(video_id)
+            except Exception as e:
+                if attempt == self.max_attempts or not is_retryable(e):
+                    raise
+                delay = self.retry_backoff_seconds * 2 ** (attempt - 1)
+                metrics.increment("fetch.retries")
+                logger.warning(
+                    f"Fetching the transcript of video {video_id} failed ({e}), "
+                    f"attempt {attempt} of {self.max_attempts}, retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+                continue
+            finally:
+                metrics.observe("fetch.request", time.perf_counter() - started_at)
+            return transcript
 
 
-def fetch_video_transcript_with_cache(video_id: str) -> FetchedTranscript:
-    file_path = PICKLE_DIR / f"{video_id}.pkl"
-    if file_path.exists():
-        logger.debug(f"Loading transcript from cache for video {video_id}")
-        return load_video_transcript(video_id)
-    else:
-        logger.debug(f"Fetching transcript for video from YouTube {video_id}")
-        return fetch_video_transcript(video_id, to_pickle=True)
+def transcript_source() -> TranscriptSource:
+    """The configured source: a transcript mirror when TRANSCRIPT_SOURCE_URL is set, YouTube otherwise."""
+    if config.TRANSCRIPT_SOURCE_URL:
+        return HttpTranscriptSource(config.TRANSCRIPT_SOURCE_URL)
+    return YouTubeTranscriptSource()
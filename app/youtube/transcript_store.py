@@ -0,0 +1,135 @@
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from youtube_transcript_api import FetchedTranscript, FetchedTranscriptSnippet
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_STORE_PATH = Path(__file__).resolve().parents[2] / "data" / "transcripts.sqlite3"
+# Transcripts were stored as one pickle per video before, these are imported on first use
+LEGACY_PICKLE_DIR = Path(__file__).resolve().parents[2] / "data" / "youtube_transcripts"
+
+
+class TranscriptStore:
+    """
+    Fetched transcripts in a single SQLite database, one row per video id.
+
+    Snippets are stored as zlib-compressed JSON, next to the transcript language.
+    Videos without a transcript are stored too, so they are not fetched again, and
+    read back as an empty list. Transcripts pickled by earlier versions are imported
+    from `legacy_dir` the first time they are read.
+    """
+    def __init__(self, path: Path = TRANSCRIPT_STORE_PATH, legacy_dir: Path | None = LEGACY_PICKLE_DIR):
+        self.path = path
+        self.legacy_dir = legacy_dir
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the fetcher threads, every statement runs under the lock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    video_id TEXT PRIMARY KEY,
+                    language TEXT,
+                    language_code TEXT,
+                    is_generated INTEGER,
+                    snippets BLOB,
+                    fetched_at REAL NOT NULL
+                )
+                """
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+
+    def __contains__(self, video_id: str) -> bool:
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM transcripts WHERE video_id = ?", (video_id,)).fetchone()
+        return row is not None or self._legacy_path(video_id) is not None
+
+    def video_ids(self) -> list[str]:
+        """Ids of the videos with a transcript, in id order."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT video_id FROM transcripts WHERE snippets IS NOT NULL ORDER BY video_id"
+            ).fetchall()
+        return [video_id for video_id, in rows]
+
+    def get(self, video_id: str) -> FetchedTranscript | list | None:
+        """The stored transcript, an empty list if the video has none, or None if it was not fetched yet."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT language, language_code, is_generated, snippets FROM transcripts WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+        if row is None:
+            return self._import_legacy(video_id)
+
+        language, language_code, is_generated, snippets = row
+        if snippets is None:
+            return []
+        return FetchedTranscript(
+            snippets=[
+                FetchedTranscriptSnippet(text=text, start=start, duration=duration)
+                for text, start, duration in json.loads(zlib.decompress(snippets))
+            ],
+            video_id=video_id,
+            language=language,
+            language_code=language_code,
+            is_generated=bool(is_generated),
+        )
+
+    def put(self, video_id: str, transcript: FetchedTranscript | list):
+        if isinstance(transcript, FetchedTranscript):
+            snippets = zlib.compress(json.dumps(
+                [[snippet.text, snippet.start, snippet.duration] for snippet in transcript.snippets]
+            ).encode())
+            row = (video_id, transcript.language, transcript.language_code, int(transcript.is_generated), snippets)
+        else:
+            row = (video_id, None, None, None, None)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?)", (*row, time.time())
+            )
+
+    def import_legacy(self) -> int:
+        """Import all pickled transcripts not stored yet, returning how many were imported."""
+        if self.legacy_dir is None or not self.legacy_dir.exists():
+            return 0
+        with self._lock:
+            stored = {video_id for video_id, in self._connection.execute("SELECT video_id FROM transcripts")}
+        imported = 0
+        for path in sorted(self.legacy_dir.glob("*.pkl")):
+            if path.stem not in stored:
+                self._import_legacy(path.stem)
+                imported += 1
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _legacy_path(self, video_id: str) -> Path | None:
+        if self.legacy_dir is None:
+            return None
+        path = self.legacy_dir / f"{video_id}.pkl"
+        return path if path.exists() else None
+
+    def _import_legacy(self, video_id: str) -> FetchedTranscript | list | None:
+        path = self._legacy_path(video_id)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            transcript = pickle.load(f)
+        logger.debug(f"Imported the pickled transcript of video {video_id}")
+        self.put(video_id, transcript)
+        return transcript
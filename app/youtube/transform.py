@@ -1,34 +1,142 @@
 import logging
 
-from copy import copy
+from collections.abc import Iterable, Iterator
 from functools import lru_cache
+from itertools import islice
 
-from youtube_transcript_api import FetchedTranscript
+from youtube_transcript_api import FetchedTranscript, FetchedTranscriptSnippet
 from transformers import AutoTokenizer, AutoModelForTokenClassification
 from transformers import pipeline
 from sentence_transformers import SentenceTransformer
 from app import config
+from app.chunking.alignment import AlignmentIndex, count_alphanumeric
+from app.chunking.cache import ChunkCache
 from app.chunking.chunk import (
     Chunk, ChunkMetadata, 
     chunk_by_sentence,
+    iter_merged_chunks,
+    iter_merged_text_chunks_with_token_counts,
+    iter_sentences,
     merge_chunks_by_tokenizer, 
-    merge_text_chunks_by_tokenizer,
 )
 
 logger = logging.getLogger(__name__)
 
+# Merged chunks punctuated at a time by the streaming chunker
+PUNCTUATION_WINDOW_SIZE = 64
+
 
 class TranscriptSentencesChunker:
     """
     Split transcript into chunks by sentences. 
     As transcript does not have any punctuation, we need to restore it first.
     """
-    def __init__(self, sentence_transformer: SentenceTransformer, tokens_per_chunk: int):
+    def __init__(
+        self,
+        sentence_transformer: SentenceTransformer,
+        tokens_per_chunk: int,
+        punctuation_batch_size: int = config.PUNCTUATION_BATCH_SIZE,
+        cache: ChunkCache | None = None,
+    ):
         self.sentence_transformer = sentence_transformer
         self.tokens_per_chunk = tokens_per_chunk
+        self.punctuation_batch_size = punctuation_batch_size
+        self.cache = cache
+
+    def split_into_chunks(self, transcript: FetchedTranscript) -> Iterator[Chunk]:
+        """
+        Chunks of the transcript, yielded while it is punctuated and split, see `iter_sentences_chunks`.
+
+        With a cache, cached chunks or punctuated text are reused, and new cache
+        entries are written from the same stream.
+        """
+        if self.cache is None:
+            yield from iter_sentences_chunks(
+                transcript.snippets, self.sentence_transformer, self.tokens_per_chunk,
+                punctuation_batch_size=self.punctuation_batch_size,
+            )
+            return
+
+        tokenizer_name = self._tokenizer_name()
+        chunks = self.cache.get_chunks(transcript, config.PUNC_MODEL, tokenizer_name, self.tokens_per_chunk)
+        if chunks is not None:
+            yield from chunks
+            return
+
+        punctuated = self.cache.get_punctuated(transcript, config.PUNC_MODEL)
+        if punctuated is not None:
+            alignment = AlignmentIndex.from_snippets(transcript.snippets)
+        else:
+            alignment = AlignmentIndex()
+            merged_chunks = iter_merged_chunks(
+                _iter_snippet_chunks(transcript.snippets, alignment), get_punctuator().tokenizer,
+            )
+            punctuated = self.cache.stream_punctuated(
+                transcript,
+                config.PUNC_MODEL,
+                _iter_punctuated_chunks(merged_chunks, PUNCTUATION_WINDOW_SIZE, self.punctuation_batch_size),
+            )
+        yield from self.cache.stream_chunks(
+            transcript,
+            config.PUNC_MODEL,
+            tokenizer_name,
+            self.tokens_per_chunk,
+            _iter_sentences_chunks(
+                (chunk.text for chunk in punctuated), alignment, self.sentence_transformer, self.tokens_per_chunk,
+            ),
+        )
+
+    def split_many_into_chunks(self, transcripts: list[FetchedTranscript]) -> list[list[Chunk]]:
+        """Same as `split_into_chunks`, but punctuation of all transcripts runs as one batched inference."""
+        if self.cache is None:
+            return split_many_into_sentences_chunks(
+                transcripts, self.sentence_transformer, self.tokens_per_chunk,
+                punctuation_batch_size=self.punctuation_batch_size,
+            )
+
+        tokenizer_name = self._tokenizer_name()
+        results = [
+            self.cache.get_chunks(transcript, config.PUNC_MODEL, tokenizer_name, self.tokens_per_chunk)
+            for transcript in transcripts
+        ]
+
+        # Only transcripts without cached punctuation go through the punctuation model
+        punctuated = {}
+        to_punctuate = []
+        for i, transcript in enumerate(transcripts):
+            if results[i] is not None:
+                continue
+            cached = self.cache.get_punctuated(transcript, config.PUNC_MODEL)
+            if cached is None:
+                to_punctuate.append(i)
+            else:
+                punctuated[i] = cached
+
+        if to_punctuate:
+            merged_chunks_per_transcript = punctuate_transcripts(
+                [transcripts[i] for i in to_punctuate], batch_size=self.punctuation_batch_size,
+            )
+            for i, merged_chunks in zip(to_punctuate, merged_chunks_per_transcript, strict=True):
+                self.cache.put_punctuated(transcripts[i], config.PUNC_MODEL, merged_chunks)
+                punctuated[i] = merged_chunks
+
+        for i, merged_chunks in punctuated.items():
+            results[i] = split_punctuated_chunks_into_sentences_chunks(
+                merged_chunks, transcripts[i].snippets, self.sentence_transformer, self.tokens_per_chunk,
+            )
+            self.cache.put_chunks(
+                transcripts[i], config.PUNC_MODEL, tokenizer_name, self.tokens_per_chunk, results[i],
+            )
+
+        logger.debug(
+            f"Chunked {len(transcripts)} transcripts, {len(transcripts) - len(punctuated)} from cache, "
+            f"{len(to_punctuate)} punctuated"
+        )
+        return results
 
-    def split_into_chunks(self, transcript: FetchedTranscript) -> list[Chunk]:
-        return split_into_sentences_chunks(transcript, self.sentence_transformer, self.tokens_per_chunk)
+    def _tokenizer_name(self) -> str:
+        tokenizer = self.sentence_transformer.tokenizer
+        return getattr(tokenizer, "name_or_path", type(tokenizer).__name__)
 
 
 @lru_cache
@@ -39,7 +147,18 @@ def get_punctuator():
     return punctuator
 
 def restore_punctuation(text: str) -> str:
-    punctuated_tokens = get_punctuator()(text.lower())
+    return _join_punctuated_tokens(get_punctuator()(text.lower()))
+
+def restore_punctuation_batch(
+    texts: list[str], batch_size: int = config.PUNCTUATION_BATCH_SIZE,
+) -> list[str]:
+    """Restore punctuation of many texts with batched inference, output matches `restore_punctuation`."""
+    if not texts:
+        return []
+    punctuated = get_punctuator()([text.lower() for text in texts], batch_size=batch_size)
+    return [_join_punctuated_tokens(tokens) for tokens in punctuated]
+
+def _join_punctuated_tokens(punctuated_tokens: list[dict]) -> str:
     punctuated_text = ""
     for token in punctuated_tokens:
         word = token["word"]
@@ -53,39 +172,120 @@ def restore_punctuation(text: str) -> str:
 def split_into_sentences_chunks(
     transcript: FetchedTranscript, 
     embedding_model: SentenceTransformer, 
-    tokens_per_chunk: int
+    tokens_per_chunk: int,
+    punctuation_batch_size: int = config.PUNCTUATION_BATCH_SIZE,
 ) -> list[Chunk]:
-    chunks = [
-        Chunk(snippet.text, ChunkMetadata(snippet.start, snippet.duration))
-        for snippet in transcript.snippets
+    return split_many_into_sentences_chunks(
+        [transcript], embedding_model, tokens_per_chunk, punctuation_batch_size,
+    )[0]
+
+def split_many_into_sentences_chunks(
+    transcripts: list[FetchedTranscript],
+    embedding_model: SentenceTransformer,
+    tokens_per_chunk: int,
+    punctuation_batch_size: int = config.PUNCTUATION_BATCH_SIZE,
+) -> list[list[Chunk]]:
+    merged_chunks_per_transcript = punctuate_transcripts(transcripts, batch_size=punctuation_batch_size)
+    return [
+        split_punctuated_chunks_into_sentences_chunks(
+            merged_chunks, transcript.snippets, embedding_model, tokens_per_chunk,
+        )
+        for transcript, merged_chunks in zip(transcripts, merged_chunks_per_transcript, strict=True)
     ]
 
-    # Merge chuns to run punctuation model on them
-    merged_chunks = merge_chunks_by_tokenizer(chunks, get_punctuator().tokenizer)
+def punctuate_transcripts(
+    transcripts: list[FetchedTranscript],
+    batch_size: int = config.PUNCTUATION_BATCH_SIZE,
+) -> list[list[Chunk]]:
+    """Merge transcript snippets into model-sized chunks and restore their punctuation."""
+    # Merge chunks to run punctuation model on them
+    merged_chunks_per_transcript = [
+        merge_chunks_by_tokenizer(
+            [
+                Chunk(snippet.text, ChunkMetadata(snippet.start, snippet.duration))
+                for snippet in transcript.snippets
+            ],
+            get_punctuator().tokenizer,
+        )
+        for transcript in transcripts
+    ]
+
+    # Restore punctuation of all merged chunks at once
+    all_merged_chunks = [chunk for merged_chunks in merged_chunks_per_transcript for chunk in merged_chunks]
+    punctuated_texts = restore_punctuation_batch(
+        [chunk.text for chunk in all_merged_chunks], batch_size=batch_size,
+    )
+    for chunk, punctuated_text in zip(all_merged_chunks, punctuated_texts, strict=True):
+        chunk.text = punctuated_text
+
+    return merged_chunks_per_transcript
 
-    # Restore punctuation per chunk
-    for chunk in merged_chunks:
-        chunk.text = restore_punctuation(chunk.text)
+def split_punctuated_chunks_into_sentences_chunks(
+    merged_chunks: list[Chunk],
+    snippets: list[FetchedTranscriptSnippet],
+    embedding_model: SentenceTransformer,
+    tokens_per_chunk: int,
+) -> list[Chunk]:
+    return list(_iter_sentences_chunks(
+        (chunk.text for chunk in merged_chunks),
+        AlignmentIndex.from_snippets(snippets),
+        embedding_model,
+        tokens_per_chunk,
+    ))
 
-    # Split whole text into sentences
-    full_text = " ".join([chunk.text for chunk in merged_chunks])
-    sentences = chunk_by_sentence(full_text)
+def iter_sentences_chunks(
+    snippets: Iterable[FetchedTranscriptSnippet],
+    embedding_model: SentenceTransformer,
+    tokens_per_chunk: int,
+    punctuation_batch_size: int = config.PUNCTUATION_BATCH_SIZE,
+    window_size: int = PUNCTUATION_WINDOW_SIZE,
+) -> Iterator[Chunk]:
+    """
+    Same chunks as `split_into_sentences_chunks`, yielded while the snippets are consumed.
 
-    merged_sentences = merge_text_chunks_by_tokenizer(
-        sentences, embedding_model.tokenizer, max_tokens=tokens_per_chunk,
+    Snippets are merged into model-sized chunks lazily, and punctuated `window_size`
+    merged chunks at a time, so memory is bounded by the window instead of the whole
+    transcript: the transcript text is never joined, and of the snippets already
+    consumed only their offsets and timestamps are kept, for timestamp alignment.
+    """
+    alignment = AlignmentIndex()
+    merged_chunks = iter_merged_chunks(_iter_snippet_chunks(snippets, alignment), get_punctuator().tokenizer)
+    yield from _iter_sentences_chunks(
+        (chunk.text for chunk in _iter_punctuated_chunks(merged_chunks, window_size, punctuation_batch_size)),
+        alignment,
+        embedding_model,
+        tokens_per_chunk,
     )
 
-    # Enrich merged sentences with metadata from original transcript segments.
-    num_chars = 0
-    final_chunks = []
-    tok = get_punctuator().tokenizer
-    for sentence in merged_sentences:
-        num_chars += len(tok.tokenize(sentence))
-        original_chunk_num = num_chars // tok.model_max_length
+def _iter_snippet_chunks(snippets: Iterable[FetchedTranscriptSnippet], alignment: AlignmentIndex) -> Iterator[Chunk]:
+    for snippet in snippets:
+        alignment.add(snippet.text, snippet.start, snippet.duration)
+        yield Chunk(snippet.text, ChunkMetadata(snippet.start, snippet.duration))
+
+def _iter_punctuated_chunks(merged_chunks: Iterator[Chunk], window_size: int, batch_size: int) -> Iterator[Chunk]:
+    while chunks := list(islice(merged_chunks, window_size)):
+        punctuated_texts = restore_punctuation_batch([chunk.text for chunk in chunks], batch_size=batch_size)
+        for chunk, text in zip(chunks, punctuated_texts, strict=True):
+            chunk.text = text
+            yield chunk
 
-        original_chunk = copy(merged_chunks[original_chunk_num])
-        original_chunk.text = sentence
-        
-        final_chunks.append(original_chunk)
+def _iter_sentences_chunks(
+    punctuated_texts: Iterable[str],
+    alignment: AlignmentIndex,
+    embedding_model: SentenceTransformer,
+    tokens_per_chunk: int,
+) -> Iterator[Chunk]:
+    # Split the punctuated text into sentences and merge them up to the chunk size
+    merged_sentences = iter_merged_text_chunks_with_token_counts(
+        iter_sentences(punctuated_texts, split=chunk_by_sentence),
+        embedding_model.tokenizer,
+        max_tokens=tokens_per_chunk,
+    )
 
-    return final_chunks
+    # Timestamps of a chunk are those of the snippets its first and last characters come from
+    position = 0
+    for sentence, token_count in merged_sentences:
+        num_chars = count_alphanumeric(sentence)
+        start_time, end_time = alignment.span(position, position + num_chars)
+        position += num_chars
+        yield Chunk(sentence, ChunkMetadata(start_time, end_time - start_time), token_count)
@@ -0,0 +1,5 @@
+"""
+Standalone benchmarks for the ingestion and search pipelines.
+
+Run them as modules from the repository root, e.g. `uv run -m benchmarks.punctuation`.
+"""
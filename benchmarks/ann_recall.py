@@ -0,0 +1,90 @@
+"""
+Recall@k and latency of the IVF index against exact in-process search.
+
+Uses synthetic clustered 384-dim embeddings by default, or the chunks table with --from-db.
+
+    uv run -m benchmarks.ann_recall --num-vectors 200000 --nprobe 1 --nprobe 8 --nprobe 32
+"""
+import time
+from typing import Annotated
+from unittest.mock import Mock
+
+import numpy as np
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from app.services.protocols import Repository
+from app.storage.ann_index import IVFVectorIndex
+from app.storage.models import Chunk
+from app.storage.numpy_index import NumpyVectorIndex
+
+console = Console()
+
+NPROBE_VALUES = (1, 4, 8, 16, 32)
+
+
+def synthetic_repository(num_vectors: int, dim: int, seed: int = 0) -> Repository:
+    """An in-memory stand-in for the chunks table with clustered, normalized embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, num_vectors // 500), dim))
+    vectors = centers[rng.integers(0, len(centers), size=num_vectors)] + 0.5 * rng.normal(size=(num_vectors, dim))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+    chunks = [
+        Chunk(id=i + 1, chunk_index=i, start_ts=0, end_ts=0, text="", document_id=1, embedding=vector)
+        for i, vector in enumerate(vectors)
+    ]
+    repo = Mock(spec=Repository)
+    repo.list_documents.return_value = []
+    repo.iter_chunks.side_effect = lambda batch_size=10000: iter([chunks])
+    return repo
+
+
+def main(
+    num_vectors: int = typer.Option(100_000, help="Number of synthetic vectors"),
+    dim: int = typer.Option(384, help="Dimension of synthetic vectors"),
+    num_queries: int = typer.Option(200, help="Number of queries, sampled from the indexed vectors plus noise"),
+    k: int = typer.Option(10, help="Number of neighbors"),
+    nlist: int = typer.Option(None, help="Number of IVF lists, 4 * sqrt(num_vectors) by default"),
+    nprobe: Annotated[list[int], typer.Option(help="nprobe values to compare")] = NPROBE_VALUES,
+    from_db: bool = typer.Option(False, help="Use the chunks table instead of synthetic vectors"),
+):
+    if from_db:
+        from app.storage.repository import NativeMariadDBRepository
+        source = NativeMariadDBRepository()
+    else:
+        source = synthetic_repository(num_vectors, dim)
+
+    exact = NumpyVectorIndex(source)
+    started_at = time.perf_counter()
+    ann = IVFVectorIndex.build(source, nlist=nlist)
+    console.print(f"Built IVF index with {ann.nlist} lists over {len(exact)} vectors in {time.perf_counter() - started_at:.1f}s")
+
+    rng = np.random.default_rng(1)
+    base = exact._arrays.embeddings
+    queries = base[rng.integers(0, len(base), size=num_queries)] + 0.05 * rng.normal(size=(num_queries, base.shape[1]))
+
+    def run(search) -> tuple[list[set[int]], float]:
+        results = []
+        started_at = time.perf_counter()
+        for query in queries:
+            results.append({result.id for result in search(query)})
+        return results, (time.perf_counter() - started_at) / len(queries) * 1000
+
+    expected, exact_ms = run(lambda query: exact.search(query, k))
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Search")
+    table.add_column(f"Recall@{k}")
+    table.add_column("Mean latency, ms")
+    table.add_row("exact", "1.000", f"{exact_ms:.3f}")
+    for value in nprobe:
+        actual, ann_ms = run(lambda query, value=value: ann.search(query, k, nprobe=value))
+        recall = np.mean([len(a & e) / len(e) for a, e in zip(actual, expected, strict=True)])
+        table.add_row(f"ivf nprobe={value}", f"{recall:.3f}", f"{ann_ms:.3f}")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    typer.run(main)
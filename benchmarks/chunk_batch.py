@@ -0,0 +1,95 @@
+"""
+Memory and time of holding ingested chunks as pydantic `Chunk` models, one embedding
+array each, against one columnar `ChunkBatch` with an embedding matrix.
+
+Both variants start from the chunker's output and the embedder's matrix, and end with
+the rows sent to the database, so conversion and serialization are timed as well.
+
+    uv run -m benchmarks.chunk_batch --num-chunks 100000
+"""
+import random
+import time
+import tracemalloc
+
+import numpy as np
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from app.chunking.chunk import Chunk, ChunkMetadata
+from app.storage.chunk_batch import ChunkBatch
+from app.storage.models import Chunk as DBChunk
+from app.storage.vectors import to_vector_bytes
+from benchmarks.common import WORDS
+
+console = Console()
+
+
+def transcript_chunks(num_chunks: int, seed: int = 0) -> list[Chunk]:
+    words = random.Random(seed)
+    return [
+        Chunk(" ".join(words.choice(WORDS) for _ in range(60)), ChunkMetadata(i * 20.0, 20.0), token_count=60)
+        for i in range(num_chunks)
+    ]
+
+
+def as_models(chunks: list[Chunk], vectors: np.ndarray) -> tuple[list[DBChunk], list[tuple]]:
+    models = [
+        DBChunk(
+            chunk_index=i,
+            start_ts=chunk.metadata.start_time,
+            end_ts=chunk.metadata.end_time,
+            text=chunk.text,
+            document_id=0,
+            embedding=vectors[i],
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+    rows = [
+        (chunk.chunk_index, chunk.start_ts, chunk.end_ts, chunk.text, chunk.document_id, to_vector_bytes(chunk.embedding))
+        for chunk in models
+    ]
+    return models, rows
+
+
+def as_batch(chunks: list[Chunk], vectors: np.ndarray) -> tuple[ChunkBatch, list[tuple]]:
+    batch = ChunkBatch.from_chunks(chunks)
+    batch.set_embeddings(vectors)
+    return batch, batch.to_rows()
+
+
+def measure(convert, chunks: list[Chunk], vectors: np.ndarray) -> tuple[float, float, float]:
+    """Seconds taken, and MiB allocated at the peak and still held by the result without its rows."""
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    result, rows = convert(chunks, vectors)
+    seconds = time.perf_counter() - started_at
+    _, peak = tracemalloc.get_traced_memory()
+    del rows
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return seconds, peak / 2**20, held / 2**20
+
+
+def main(
+    num_chunks: int = typer.Option(100_000, help="Number of chunks in the batch"),
+    dim: int = typer.Option(384, help="Dimension of synthetic embeddings"),
+):
+    chunks = transcript_chunks(num_chunks)
+    vectors = np.random.default_rng(0).normal(size=(num_chunks, dim)).astype(np.float32)
+    console.print(f"Converting {num_chunks} chunks with {dim}-dimensional embeddings")
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Representation")
+    table.add_column("Seconds")
+    table.add_column("Peak MiB")
+    table.add_column("Held MiB")
+    for label, convert in (("pydantic chunks", as_models), ("chunk batch", as_batch)):
+        seconds, peak, held = measure(convert, chunks, vectors)
+        table.add_row(label, f"{seconds:.2f}", f"{peak:.1f}", f"{held:.1f}")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    typer.run(main)
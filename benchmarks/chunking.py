@@ -0,0 +1,142 @@
+"""
+Time and peak memory of streaming chunking against chunking of whole transcripts,
+and whether both produce the same chunks.
+
+The whole-transcript variant is the chunking as it was before streaming: snippets merged
+with `Chunk.merge`, the punctuated text joined and split into sentences at once.
+Only chunk texts are compared, as timestamps are now aligned per snippet, not per merged chunk.
+Multi-hour synthetic transcripts are used when no transcripts are cached locally.
+
+    uv run -m benchmarks.chunking --num-transcripts 3 --synthetic-snippets 6000
+"""
+import time
+import tracemalloc
+from copy import copy
+from functools import partial
+
+import typer
+from rich.console import Console
+from rich.table import Table
+from sentence_transformers import SentenceTransformer
+from youtube_transcript_api import FetchedTranscript
+
+from app import config
+from app.chunking.chunk import Chunk, ChunkMetadata, chunk_by_sentence
+from app.youtube.transform import (
+    get_punctuator,
+    iter_sentences_chunks,
+    restore_punctuation_batch,
+)
+from benchmarks.common import load_transcripts
+
+console = Console()
+
+
+def whole_transcript_chunks(
+    transcript: FetchedTranscript, embedding_model: SentenceTransformer, tokens_per_chunk: int,
+) -> list[Chunk]:
+    tokenizer = get_punctuator().tokenizer
+    sep_token_count = len(tokenizer.tokenize(" "))
+    merged_chunks = []
+    current_chunk = Chunk("", ChunkMetadata(0, 0))
+    current_token_count = 0
+    for snippet in transcript.snippets:
+        chunk = Chunk(snippet.text, ChunkMetadata(snippet.start, snippet.duration))
+        chunk_token_count = len(tokenizer.tokenize(chunk.text))
+        if current_token_count + sep_token_count + chunk_token_count <= tokenizer.model_max_length:
+            current_chunk = current_chunk.merge(chunk)
+            current_token_count += sep_token_count + chunk_token_count
+        else:
+            merged_chunks.append(current_chunk)
+            current_chunk = chunk
+            current_token_count = chunk_token_count
+    merged_chunks.append(current_chunk)
+
+    for chunk, text in zip(merged_chunks, restore_punctuation_batch([chunk.text for chunk in merged_chunks]), strict=True):
+        chunk.text = text
+    sentences = chunk_by_sentence(" ".join(chunk.text for chunk in merged_chunks))
+
+    max_tokens = min(tokens_per_chunk, embedding_model.tokenizer.model_max_length)
+    sep_token_count = len(embedding_model.tokenizer.tokenize(" "))
+    merged_sentences = []
+    current_text = ""
+    current_token_count = 0
+    for sentence in sentences:
+        sentence_token_count = len(embedding_model.tokenizer.tokenize(sentence))
+        if current_token_count + sep_token_count + sentence_token_count <= max_tokens:
+            current_text += sentence + " "
+            current_token_count += sep_token_count + sentence_token_count
+        else:
+            merged_sentences.append(current_text.strip())
+            current_text = sentence
+            current_token_count = sentence_token_count
+    merged_sentences.append(current_text.strip())
+
+    final_chunks = []
+    num_chars = 0
+    for sentence in merged_sentences:
+        num_chars += len(tokenizer.tokenize(sentence))
+        final_chunk = copy(merged_chunks[num_chars // tokenizer.model_max_length])
+        final_chunk.text = sentence
+        final_chunks.append(final_chunk)
+    return final_chunks
+
+
+def streaming_chunk_texts(
+    transcript: FetchedTranscript, embedding_model: SentenceTransformer, tokens_per_chunk: int,
+) -> list[str]:
+    # Consumed chunk by chunk, as the ingestion pipeline would
+    return [
+        chunk.text for chunk in iter_sentences_chunks(iter(transcript.snippets), embedding_model, tokens_per_chunk)
+    ]
+
+
+def measure(chunk) -> tuple[list[Chunk], float, float]:
+    """Chunks returned by `chunk()`, with the seconds and peak MiB allocated while it ran."""
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    chunks = chunk()
+    seconds = time.perf_counter() - started_at
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return chunks, seconds, peak / 2**20
+
+
+def main(
+    num_transcripts: int = typer.Option(3, help="Number of transcripts to chunk"),
+    synthetic_snippets: int = typer.Option(
+        6000, help="Snippets per synthetic transcript, about 4 hours of captions, used when none are cached locally",
+    ),
+    tokens_per_chunk: int = typer.Option(int(config.TOKENS_PER_CHUNK), help="Tokens per final chunk"),
+):
+    transcripts = load_transcripts(num_transcripts, synthetic_snippets)
+    embedding_model = SentenceTransformer(config.EMBEDDING_MODEL)
+    # Warm-up, so that model loading is not attributed to the first variant
+    restore_punctuation_batch(["warm up"])
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Transcript")
+    table.add_column("Snippets")
+    table.add_column("Variant")
+    table.add_column("Seconds")
+    table.add_column("Peak MiB")
+    table.add_column("Mismatching chunk texts")
+    for transcript in transcripts:
+        expected, seconds, peak = measure(
+            partial(whole_transcript_chunks, transcript, embedding_model, tokens_per_chunk)
+        )
+        table.add_row(
+            transcript.video_id, str(len(transcript.snippets)), "whole transcript", f"{seconds:.2f}", f"{peak:.1f}", "",
+        )
+
+        actual, seconds, peak = measure(
+            partial(streaming_chunk_texts, transcript, embedding_model, tokens_per_chunk)
+        )
+        expected = [chunk.text for chunk in expected]
+        mismatches = sum(a != e for a, e in zip(actual, expected, strict=False)) + abs(len(actual) - len(expected))
+        table.add_row("", "", "streaming", f"{seconds:.2f}", f"{peak:.1f}", str(mismatches))
+    console.print(table)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,59 @@
+import random
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from youtube_transcript_api import FetchedTranscript, FetchedTranscriptSnippet
+
+from app.youtube.transcript_store import TranscriptStore
+
+WORDS = [
+    "python", "async", "await", "event", "loop", "the", "global", "interpreter", "lock", "threads",
+    "processes", "type", "hints", "packaging", "wheels", "django", "fastapi", "request", "response",
+    "database", "query", "index", "vector", "embedding", "model", "token", "we", "are", "going",
+    "to", "talk", "about", "how", "this", "works",
+]
+
+
+def load_cached_transcripts(limit: int) -> list[FetchedTranscript]:
+    """Transcripts previously fetched by `video populate` or `video prefetch`, if any are stored locally."""
+    store = TranscriptStore()
+    try:
+        store.import_legacy()
+        transcripts = [store.get(video_id) for video_id in store.video_ids()[:limit]]
+    finally:
+        store.close()
+    return [transcript for transcript in transcripts if isinstance(transcript, FetchedTranscript)]
+
+
+def synthetic_transcript(num_snippets: int, seed: int = 0) -> FetchedTranscript:
+    """An unpunctuated, lower-case transcript similar to auto-generated YouTube captions."""
+    rng = random.Random(seed)
+    snippets = []
+    start = 0.0
+    for _ in range(num_snippets):
+        duration = round(rng.uniform(1.5, 4.0), 2)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 10)))
+        snippets.append(FetchedTranscriptSnippet(text=text, start=round(start, 2), duration=duration))
+        start += duration
+    return FetchedTranscript(
+        snippets=snippets,
+        video_id=f"synthetic-{seed}",
+        language="English (auto-generated)",
+        language_code="en",
+        is_generated=True,
+    )
+
+
+def load_transcripts(limit: int, synthetic_snippets: int) -> list[FetchedTranscript]:
+    transcripts = load_cached_transcripts(limit)
+    if not transcripts:
+        transcripts = [synthetic_transcript(synthetic_snippets, seed=i) for i in range(limit)]
+    return transcripts
+
+
+@contextmanager
+def timer(label: str, results: dict[str, float]) -> Iterator[None]:
+    started_at = time.perf_counter()
+    yield
+    results[label] = time.perf_counter() - started_at
@@ -0,0 +1,95 @@
+"""
+Latency of lexical (BM25) and hybrid search against pure vector search with the in-process index.
+
+Uses a synthetic corpus of caption-like chunks with random normalized embeddings,
+and a stand-in embedder, so only retrieval and fusion are timed, not the model.
+
+    uv run -m benchmarks.hybrid_search --num-chunks 100000
+"""
+import random
+import time
+from unittest.mock import Mock
+
+import numpy as np
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from app.services.protocols import Repository
+from app.services.search import VideoSearchService
+from app.storage.lexical_index import BM25Index
+from app.storage.models import Chunk, Document
+from app.storage.numpy_index import NumpyVectorIndex
+from benchmarks.common import WORDS
+
+console = Console()
+
+RARE_TERMS = ["pep703", "uvloop", "asgi", "cython", "mypyc", "pyodide", "nogil", "hatch"]
+
+
+def synthetic_repository(num_chunks: int, dim: int, seed: int = 0) -> Repository:
+    rng = np.random.default_rng(seed)
+    words = random.Random(seed)
+    vectors = rng.normal(size=(num_chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    chunks = []
+    for i, vector in enumerate(vectors):
+        text = " ".join(words.choice(WORDS) for _ in range(60))
+        if i % 50 == 0:
+            text += " " + words.choice(RARE_TERMS)
+        chunks.append(Chunk(
+            id=i + 1, chunk_index=i, start_ts=0, end_ts=0, text=text, document_id=i // 100 + 1, embedding=vector,
+        ))
+
+    repo = Mock(spec=Repository)
+    repo.index_version = 0
+    repo.list_documents.return_value = [
+        Document(id=doc_id, title=f"Video {doc_id}", url=f"https://www.youtube.com/watch?v={doc_id}", created_at=0)
+        for doc_id in range(1, num_chunks // 100 + 2)
+    ]
+    repo.iter_chunks.side_effect = lambda batch_size=10000: iter([chunks])
+    return repo
+
+
+def main(
+    num_chunks: int = typer.Option(100_000, help="Number of synthetic chunks"),
+    dim: int = typer.Option(384, help="Dimension of synthetic embeddings"),
+    num_queries: int = typer.Option(200, help="Number of queries"),
+    k: int = typer.Option(10, help="Number of results"),
+):
+    source = synthetic_repository(num_chunks, dim)
+
+    started_at = time.perf_counter()
+    vector_index = NumpyVectorIndex(source)
+    console.print(f"Loaded vector index over {len(vector_index)} chunks in {time.perf_counter() - started_at:.1f}s")
+    started_at = time.perf_counter()
+    repository = BM25Index(vector_index)
+    console.print(f"Built BM25 index in {time.perf_counter() - started_at:.1f}s")
+
+    rng = np.random.default_rng(1)
+    embedder = Mock()
+    embedder.embed_text.side_effect = lambda text: rng.normal(size=dim).astype(np.float32)
+    service = VideoSearchService(repository, embedder, lexical_index=repository)
+
+    words = random.Random(1)
+    queries = [
+        f"{words.choice(WORDS)} {words.choice(WORDS)} {words.choice(RARE_TERMS)}" for _ in range(num_queries)
+    ]
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Mode")
+    table.add_column("Mean latency, ms")
+    table.add_column("p95 latency, ms")
+    for mode in ("vector", "lexical", "hybrid"):
+        latencies = []
+        for query in queries:
+            started_at = time.perf_counter()
+            service.search(query, k, mode=mode)
+            latencies.append((time.perf_counter() - started_at) * 1000)
+        table.add_row(mode, f"{np.mean(latencies):.2f}", f"{np.percentile(latencies, 95):.2f}")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,77 @@
+"""
+Compare punctuation restoration with one pipeline call per merged chunk
+against batched inference over all merged chunks of the transcripts.
+
+    uv run -m benchmarks.punctuation --num-transcripts 3 --batch-size 8
+"""
+from typing import Annotated
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from app.chunking.chunk import Chunk, ChunkMetadata, merge_chunks_by_tokenizer
+from app.youtube.transform import (
+    get_punctuator,
+    restore_punctuation,
+    restore_punctuation_batch,
+)
+from benchmarks.common import load_transcripts, timer
+
+console = Console()
+
+BATCH_SIZES = (4, 8, 16)
+
+
+def main(
+    num_transcripts: int = typer.Option(3, help="Number of transcripts to punctuate"),
+    synthetic_snippets: int = typer.Option(
+        1500, help="Snippets per synthetic transcript, used when no transcripts are cached locally",
+    ),
+    batch_size: Annotated[list[int], typer.Option(help="Batch sizes to compare")] = BATCH_SIZES,
+):
+    transcripts = load_transcripts(num_transcripts, synthetic_snippets)
+    tokenizer = get_punctuator().tokenizer
+    texts = [
+        chunk.text
+        for transcript in transcripts
+        for chunk in merge_chunks_by_tokenizer(
+            [Chunk(s.text, ChunkMetadata(s.start, s.duration)) for s in transcript.snippets],
+            tokenizer,
+        )
+    ]
+    console.print(f"Punctuating {len(texts)} merged chunks from {len(transcripts)} transcripts")
+
+    # Warm-up, so that model loading is not attributed to the first variant
+    restore_punctuation(texts[0])
+
+    timings: dict[str, float] = {}
+    with timer("loop", timings):
+        expected = [restore_punctuation(text) for text in texts]
+
+    mismatches = {}
+    for size in batch_size:
+        label = f"batch_size={size}"
+        with timer(label, timings):
+            actual = restore_punctuation_batch(texts, batch_size=size)
+        mismatches[label] = sum(a != e for a, e in zip(actual, expected, strict=True))
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Variant")
+    table.add_column("Seconds")
+    table.add_column("Chunks/s")
+    table.add_column("Speedup")
+    table.add_column("Mismatching outputs")
+    for label, seconds in timings.items():
+        table.add_row(
+            label,
+            f"{seconds:.2f}",
+            f"{len(texts) / seconds:.1f}",
+            f"{timings['loop'] / seconds:.2f}x",
+            str(mismatches.get(label, 0)),
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,29 @@
+from youtube_transcript_api import FetchedTranscriptSnippet
+
+from app.chunking.alignment import AlignmentIndex, count_alphanumeric
+
+
+def test_count_alphanumeric_ignores_case_spacing_and_punctuation():
+    assert count_alphanumeric("Hello, World! It's 2024.") == count_alphanumeric("hello world its 2024")
+
+
+def test_span_finds_snippets_of_first_and_last_character():
+    index = AlignmentIndex.from_snippets([
+        FetchedTranscriptSnippet(text="so today", start=0.0, duration=1.5),
+        FetchedTranscriptSnippet(text="[♪]", start=1.5, duration=1.0),
+        FetchedTranscriptSnippet(text="we talk", start=2.5, duration=2.0),
+        FetchedTranscriptSnippet(text="about asyncio", start=4.5, duration=3.0),
+    ])
+
+    # "sotoday" is 0-6, "wetalk" 7-12, "aboutasyncio" 13-24
+    assert index.span(0, 7) == (0.0, 1.5)
+    assert index.span(2, 10) == (0.0, 4.5)
+    assert index.span(7, 13) == (2.5, 4.5)
+    assert index.span(12, 25) == (2.5, 7.5)
+    # Positions past the text, as when punctuation restoration adds characters, are clamped
+    assert index.span(20, 40) == (4.5, 7.5)
+    assert index.span(30, 30) == (4.5, 7.5)
+
+
+def test_span_of_empty_index():
+    assert AlignmentIndex().span(0, 10) == (0.0, 0.0)
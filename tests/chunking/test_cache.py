@@ -0,0 +1,73 @@
+import pytest
+from youtube_transcript_api import FetchedTranscript, FetchedTranscriptSnippet
+
+from app.chunking.cache import ChunkCache, transcript_hash
+from app.chunking.chunk import Chunk, ChunkMetadata
+
+
+def make_transcript(text: str = "hello world") -> FetchedTranscript:
+    return FetchedTranscript(
+        snippets=[FetchedTranscriptSnippet(text=text, start=0.1, duration=2.2)],
+        video_id="video123",
+        language="English",
+        language_code="en",
+        is_generated=True,
+    )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ChunkCache(tmp_path)
+
+
+def test_chunks_round_trip(cache):
+    transcript = make_transcript()
+    chunks = [Chunk("Hello world.", ChunkMetadata(0.1, 2.2)), Chunk("Bye.", ChunkMetadata(2.3, 0.7))]
+
+    assert cache.get_chunks(transcript, "punc", "tok", 150) is None
+    cache.put_chunks(transcript, "punc", "tok", 150, chunks)
+    cached = cache.get_chunks(transcript, "punc", "tok", 150)
+
+    assert [(c.text, c.metadata.start_time, c.metadata.end_time) for c in cached] == [
+        (c.text, c.metadata.start_time, c.metadata.end_time) for c in chunks
+    ]
+
+
+def test_chunks_key_depends_on_all_parameters(cache):
+    transcript = make_transcript()
+    cache.put_chunks(transcript, "punc", "tok", 150, [Chunk("Hello.", ChunkMetadata(0, 1))])
+
+    assert cache.get_chunks(transcript, "punc", "tok", 100) is None
+    assert cache.get_chunks(transcript, "punc", "other-tok", 150) is None
+    assert cache.get_chunks(transcript, "other-punc", "tok", 150) is None
+    assert cache.get_chunks(make_transcript("other text"), "punc", "tok", 150) is None
+
+
+def test_punctuated_entries_are_independent_of_chunking(cache):
+    transcript = make_transcript()
+    cache.put_punctuated(transcript, "punc", [Chunk(" hello world.", ChunkMetadata(0.1, 2.2))])
+
+    assert cache.get_punctuated(transcript, "punc")[0].text == " hello world."
+    assert cache.get_chunks(transcript, "punc", "tok", 150) is None
+
+
+def test_streamed_entry_is_stored_only_when_complete(cache, tmp_path):
+    transcript = make_transcript()
+    chunks = [Chunk("Hello world.", ChunkMetadata(0.1, 2.2)), Chunk("Bye.", ChunkMetadata(2.3, 0.7))]
+
+    stream = cache.stream_chunks(transcript, "punc", "tok", 150, iter(chunks))
+    next(stream)
+    stream.close()
+    assert cache.get_chunks(transcript, "punc", "tok", 150) is None
+
+    assert list(cache.stream_chunks(transcript, "punc", "tok", 150, iter(chunks))) == chunks
+    assert [c.text for c in cache.get_chunks(transcript, "punc", "tok", 150)] == ["Hello world.", "Bye."]
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_transcript_hash_ignores_video_id():
+    transcript = make_transcript()
+    other = make_transcript()
+    other.video_id = "other"
+
+    assert transcript_hash(transcript) == transcript_hash(other)
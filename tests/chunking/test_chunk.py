@@ -0,0 +1,95 @@
+import pytest
+
+from app.chunking.chunk import (
+    Chunk,
+    ChunkMetadata,
+    iter_sentences,
+    iter_token_counts,
+    merge_chunks_by_tokenizer,
+    merge_text_chunks_by_tokenizer,
+)
+from tests.youtube.conftest import FakeTokenizer, split_sentences
+
+
+def merge_chunks_with_chunk_merge(chunks: list[Chunk], tokenizer, max_tokens: int) -> list[Chunk]:
+    """The merging loop before it was made linear, merging with `Chunk.merge`."""
+    merged_chunks = []
+    current_chunk = Chunk("", ChunkMetadata(0, 0))
+    current_token_count = 0
+    for chunk in chunks:
+        chunk_token_count = len(tokenizer.tokenize(chunk.text))
+        if current_token_count + 1 + chunk_token_count <= max_tokens:
+            current_chunk = current_chunk.merge(chunk)
+            current_token_count += 1 + chunk_token_count
+        else:
+            merged_chunks.append(current_chunk)
+            current_chunk = chunk
+            current_token_count = chunk_token_count
+    merged_chunks.append(current_chunk)
+    return merged_chunks
+
+
+@pytest.fixture
+def tokenizer():
+    # The separator counts as one token, as with the whitespace tokenizer every word does
+    tokenizer = FakeTokenizer(model_max_length=8)
+    tokenizer.tokenize = lambda text: text.split() or ([""] if text == " " else [])
+    return tokenizer
+
+
+def test_merge_chunks_matches_chunk_merge(tokenizer):
+    texts = ["so today", "  ", "we talk about ", "asyncio", "and the event loop in", "python", "", "ok"]
+    chunks = [Chunk(text, ChunkMetadata(i * 1.1, 1.3)) for i, text in enumerate(texts)]
+    # A snippet at 0 seconds is replaced by the start of the next one, as `Chunk.merge` does
+    chunks[0].metadata = ChunkMetadata(0, 1.3)
+
+    expected = merge_chunks_with_chunk_merge(chunks, tokenizer, 8)
+    actual = merge_chunks_by_tokenizer(chunks, tokenizer, max_tokens=8)
+
+    assert [(c.text, c.metadata.start_time, c.metadata.end_time) for c in actual] == [
+        (c.text, c.metadata.start_time, c.metadata.end_time) for c in expected
+    ]
+
+
+def test_merge_text_chunks_keeps_separator_behavior():
+    tokenizer = FakeTokenizer(model_max_length=512)
+
+    merged = merge_text_chunks_by_tokenizer(["a b", "c d", "e f", "g"], tokenizer, max_tokens=4)
+
+    # A text starting a merged text is not followed by the separator
+    assert merged == ["a b c d", "e fg"]
+
+
+@pytest.mark.parametrize("window_chars", [1, 10, 25, 10_000])
+def test_iter_sentences_matches_splitting_joined_text(window_chars):
+    texts = ["hello there. this is", "a test. of", "sentences", "split. across windows! and", "a tail"]
+
+    sentences = list(iter_sentences(texts, split=split_sentences, window_chars=window_chars))
+
+    assert sentences == split_sentences(" ".join(texts))
+
+
+def test_iter_token_counts_tokenizes_in_batches():
+    calls = []
+
+    class RecordingTokenizer(FakeTokenizer):
+        def __call__(self, texts: list[str], **kwargs) -> dict:
+            calls.append(texts)
+            return super().__call__(texts, **kwargs)
+
+    tokenizer = RecordingTokenizer(model_max_length=512)
+
+    counted = list(iter_token_counts(["a", "b c", "", "d e f", "g"], tokenizer, batch_size=2))
+
+    assert counted == [("a", 1), ("b c", 2), ("", 0), ("d e f", 3), ("g", 1)]
+    assert calls == [["a", "b c"], ["", "d e f"], ["g"]]
+
+
+def test_merged_chunks_carry_token_counts(tokenizer):
+    chunks = [Chunk(text, ChunkMetadata(i, 1)) for i, text in enumerate(["a b", "c", "d e f g h", "i"])]
+
+    merged = merge_chunks_by_tokenizer(chunks, tokenizer, max_tokens=8)
+
+    assert [(chunk.text, chunk.token_count) for chunk in merged] == [
+        ("a b c", 5), ("d e f g h i", 7),
+    ]
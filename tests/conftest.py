@@ -90,6 +90,7 @@ def mock_repository():
     repo.is_document_exists.return_value = False
     
     # Repository methods
+    repo.index_version = 0
     repo.insert_document.return_value = 1
     repo.search.return_value = [
         SearchResultChunk(
@@ -0,0 +1,3 @@
+"""
+Test package for the embedding module.
+"""
\ No newline at end of file
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.embedding.batcher import EmbeddingBatcher
+
+
+@pytest.fixture
+def embedder(mock_embedder):
+    # Each vector encodes the length of its text, so the scatter step can be verified
+    mock_embedder.embed_texts.side_effect = lambda texts, batch_size=32: np.array(
+        [[len(text), 0.0] for text in texts]
+    )
+    return mock_embedder
+
+
+def test_flush_returns_vectors_per_key(embedder):
+    batcher = EmbeddingBatcher(embedder, batch_size=2, max_pending_texts=10)
+    batcher.add("a", ["x", "xxx"])
+    batcher.add("b", ["xx"])
+    batcher.add("c", [])
+
+    vectors = batcher.flush()
+
+    assert list(vectors) == ["a", "b", "c"]
+    np.testing.assert_array_equal(vectors["a"][:, 0], [1, 3])
+    np.testing.assert_array_equal(vectors["b"][:, 0], [2])
+    assert len(vectors["c"]) == 0
+    assert batcher.num_pending_texts == 0
+
+
+def test_batches_are_sorted_by_length(embedder):
+    batcher = EmbeddingBatcher(embedder, batch_size=2)
+    batcher.add("a", ["x", "xxxx"])
+    batcher.add("b", ["xxx", "xx"])
+
+    batcher.flush()
+
+    batches = [call.args[0] for call in embedder.embed_texts.call_args_list]
+    assert batches == [["xxxx", "xxx"], ["xx", "x"]]
+
+
+def test_known_lengths_are_not_recomputed(embedder):
+    batcher = EmbeddingBatcher(
+        embedder, batch_size=2, length_function=lambda texts: pytest.fail("lengths were computed again"),
+    )
+    batcher.add("a", ["x", "y"], lengths=[1, 5])
+    batcher.add("b", ["z"], lengths=[3])
+
+    vectors = batcher.flush()
+
+    batches = [call.args[0] for call in embedder.embed_texts.call_args_list]
+    assert batches == [["y", "z"], ["x"]]
+    assert list(vectors) == ["a", "b"]
+
+
+def test_is_full(embedder):
+    batcher = EmbeddingBatcher(embedder, max_pending_texts=3)
+    batcher.add("a", ["x", "y"])
+    assert not batcher.is_full()
+    batcher.add("b", ["z"])
+    assert batcher.is_full()
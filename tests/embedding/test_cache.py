@@ -0,0 +1,127 @@
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from app.embedding.cache import EmbeddingCache
+from app.embedding.embed import SentenceTransformerEmbedder
+
+
+def vectors_for(texts: list[str]) -> np.ndarray:
+    return np.array([[len(text), i] for i, text in enumerate(texts)], dtype=np.float32)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache("test-model", cache_dir=tmp_path, max_rows=10)
+
+
+def test_get_many_returns_hits_and_missing_positions(cache):
+    cache.put_many(["a", "bb"], vectors_for(["a", "bb"]))
+
+    vectors, missing = cache.get_many(["bb", "ccc", "a"])
+
+    assert missing == [1]
+    np.testing.assert_array_equal(vectors[0], [2, 1])
+    np.testing.assert_array_equal(vectors[2], [1, 0])
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_keys_are_normalized(cache):
+    cache.put_many(["hello  world\n"], vectors_for(["hello world"]))
+
+    _, missing = cache.get_many(["hello world"])
+
+    assert missing == []
+
+
+def test_cache_is_persisted(cache, tmp_path):
+    cache.put_many(["a", "bb"], vectors_for(["a", "bb"]))
+    cache.close()
+
+    reopened = EmbeddingCache("test-model", cache_dir=tmp_path, max_rows=10)
+    vectors, missing = reopened.get_many(["a", "bb"])
+
+    assert missing == []
+    np.testing.assert_array_equal(np.stack(vectors), vectors_for(["a", "bb"]))
+
+
+def test_cache_is_per_model(cache, tmp_path):
+    cache.put_many(["a"], vectors_for(["a"]))
+
+    other = EmbeddingCache("other-model", cache_dir=tmp_path, max_rows=10)
+
+    assert other.get_many(["a"])[1] == [0]
+
+
+def test_least_recently_used_rows_are_evicted(cache):
+    texts = [f"text {i}" for i in range(10)]
+    cache.put_many(texts, vectors_for(texts))
+    cache.get_many(["text 0"])
+
+    cache.put_many(["new"], vectors_for(["new"]))
+
+    assert len(cache) == 10
+    _, missing = cache.get_many(["text 0", "text 1", "new"])
+    assert missing == [1]
+
+
+def test_evictions_within_a_batch_survive_a_reload(cache, tmp_path):
+    texts = [f"t{i}" for i in range(15)]
+    cache.put_many(texts, vectors_for(texts))
+    cache.close()
+
+    reopened = EmbeddingCache("test-model", cache_dir=tmp_path, max_rows=10)
+    vectors, missing = reopened.get_many(texts)
+
+    # The first texts were evicted by the last ones of the same batch, and must not point at their rows
+    assert missing == [0, 1, 2, 3, 4]
+    np.testing.assert_array_equal(np.stack(vectors[5:]), vectors_for(texts)[5:])
+
+
+def test_cache_of_another_dimension_is_started_over(cache, tmp_path):
+    cache.put_many(["a"], vectors_for(["a"]))
+    cache.close()
+
+    reopened = EmbeddingCache("test-model", cache_dir=tmp_path, max_rows=10, dim=3)
+    assert len(reopened) == 0
+
+    reopened.put_many(["a"], np.ones((1, 3), dtype=np.float32))
+    np.testing.assert_array_equal(reopened.get_many(["a"])[0][0], [1, 1, 1])
+
+
+def test_cache_used_by_another_process_is_bypassed(cache, tmp_path):
+    cache.put_many(["a"], vectors_for(["a"]))
+
+    other = EmbeddingCache("test-model", cache_dir=tmp_path, max_rows=10)
+    other.put_many(["bb"], vectors_for(["bb"]))
+
+    assert other.get_many(["a", "bb"])[1] == [0, 1]
+    assert cache.get_many(["bb"])[1] == [0]
+
+
+def test_embedder_only_encodes_missing_texts(cache):
+    embedder = SentenceTransformerEmbedder("test-model", cache=cache)
+    model = Mock()
+    model.encode.side_effect = lambda texts, **kwargs: vectors_for(texts)
+    embedder._model = model
+
+    first = embedder.embed_texts(["a", "bb"])
+    second = embedder.embed_texts(["bb", "ccc", "a"])
+
+    assert [call.args[0] for call in model.encode.call_args_list] == [["a", "bb"], ["ccc"]]
+    np.testing.assert_array_equal(second[0], first[1])
+    np.testing.assert_array_equal(second[2], first[0])
+    assert second.dtype == np.float32
+
+
+def test_embedder_skips_the_cache_when_asked(cache):
+    embedder = SentenceTransformerEmbedder("test-model", cache=cache)
+    model = Mock()
+    model.encode.side_effect = lambda texts, **kwargs: vectors_for(texts)
+    embedder._model = model
+
+    embedder.embed_texts(["a query"], use_cache=False)
+
+    assert len(cache) == 0
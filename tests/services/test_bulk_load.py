@@ -0,0 +1,27 @@
+from unittest.mock import Mock
+
+import pytest
+
+from app.services.bulk_load import BulkLoader
+
+
+@pytest.fixture
+def create_vector_index(monkeypatch):
+    create_vector_index = Mock()
+    monkeypatch.setattr("app.services.bulk_load.create_vector_index", create_vector_index)
+    return create_vector_index
+
+
+def test_writes_documents_in_batches(mock_repository, create_vector_index):
+    loader = BulkLoader(mock_repository, documents_per_transaction=2)
+
+    for _ in range(5):
+        loader.unit_of_work.add(Mock(), [Mock(), Mock()])
+    assert mock_repository.bulk_insert.call_count == 2
+
+    loader.finish()
+
+    assert [len(call.args[0]) for call in mock_repository.bulk_insert.call_args_list] == [2, 2, 1]
+    assert loader.unit_of_work.num_documents == 5
+    assert loader.unit_of_work.num_chunks == 10
+    create_vector_index.assert_called_once()
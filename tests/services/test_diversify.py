@@ -0,0 +1,50 @@
+import numpy as np
+
+from app.services.diversify import (
+    collapse_by_document,
+    maximal_marginal_relevance,
+    merge_adjacent_chunks,
+)
+from app.storage.models import SearchResultChunk
+
+
+def make_result(url: str, chunk_index: int, distance: float, embedding=None) -> SearchResultChunk:
+    return SearchResultChunk(
+        chunk_index=chunk_index, start_ts=chunk_index * 10, end_ts=chunk_index * 10 + 10,
+        text=f"{url} {chunk_index}", distance=distance, document_title="Talk", document_url=url,
+        embedding=None if embedding is None else np.array(embedding, dtype=np.float32),
+    )
+
+
+def test_merge_adjacent_chunks():
+    results = [
+        make_result("a", 4, 0.1, [1, 0]),
+        make_result("b", 1, 0.2),
+        make_result("a", 3, 0.3, [0, 1]),
+        make_result("a", 7, 0.4),
+    ]
+
+    merged = merge_adjacent_chunks(results)
+
+    assert [(r.document_url, r.chunk_index, r.start_ts, r.end_ts) for r in merged] == [
+        ("a", 3, 30, 50), ("b", 1, 10, 20), ("a", 7, 70, 80),
+    ]
+    assert merged[0].text == "a 3 a 4"
+    assert merged[0].distance == 0.1
+    np.testing.assert_allclose(merged[0].embedding, [0.5, 0.5])
+
+
+def test_collapse_by_document():
+    results = [make_result("a", 1, 0.1), make_result("a", 5, 0.2), make_result("b", 1, 0.3), make_result("c", 1, 0.4)]
+
+    assert [r.document_url for r in collapse_by_document(results, 2)] == ["a", "b"]
+    assert [r.chunk_index for r in collapse_by_document(results, 3, max_per_document=2)] == [1, 5, 1]
+
+
+def test_maximal_marginal_relevance_skips_near_duplicates():
+    embeddings = np.array([[1.0, 0.0], [0.98, 0.2], [0.6, 0.8]], dtype=np.float32)
+    query = np.array([1.0, 0.05], dtype=np.float32)
+
+    assert maximal_marginal_relevance(query, embeddings, 2, diversity=0.0) == [0, 1]
+    assert maximal_marginal_relevance(query, embeddings, 2, diversity=0.5) == [0, 2]
+    assert len(maximal_marginal_relevance(query, embeddings, 5)) == 3
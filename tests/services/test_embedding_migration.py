@@ -0,0 +1,88 @@
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from app.services.embedding_migration import EmbeddingMigration, MigrationProgress
+from app.storage.models import EmbeddingSpace
+
+
+def make_space(**kwargs) -> EmbeddingSpace:
+    return EmbeddingSpace(**{
+        "id": 2, "model": "all-mpnet-base-v2", "dim": 3, "column_name": "embedding_2", "status": "migrating",
+        **kwargs,
+    })
+
+
+@pytest.fixture
+def store():
+    store = Mock()
+    store.count_chunks.side_effect = [(0, 3), (3, 3)]
+    store.chunks_to_embed.side_effect = [[(1, "a"), (2, "b")], [(5, "c")], []]
+    return store
+
+
+@pytest.fixture
+def embedder():
+    embedder = Mock()
+    embedder.embed_texts.side_effect = lambda texts: np.ones((len(texts), 3), dtype=np.float32)
+    return embedder
+
+
+def test_run_embeds_batches_and_reports_progress(store, embedder):
+    reports = []
+    migration = EmbeddingMigration(store, embedder, batch_size=2, on_progress=reports.append)
+
+    progress = migration.run(make_space())
+
+    assert [call.args[1] for call in store.write_embeddings.call_args_list] == [[1, 2], [5]]
+    assert [(report.embedded, report.total) for report in reports] == [(2, 3), (3, 3)]
+    assert progress.eta_seconds == 0.0
+
+
+def test_run_rejects_embeddings_of_another_dimension(store, embedder):
+    migration = EmbeddingMigration(store, embedder)
+
+    with pytest.raises(ValueError, match="expected 384"):
+        migration.run(make_space(dim=384))
+    store.write_embeddings.assert_not_called()
+
+
+def test_start_resumes_migration_in_progress(store, embedder):
+    store.migrating_space.return_value = make_space(migrated_chunk_id=2)
+    migration = EmbeddingMigration(store, embedder)
+
+    assert migration.start("all-mpnet-base-v2", 3).migrated_chunk_id == 2
+    store.create_space.assert_not_called()
+    with pytest.raises(ValueError, match="in progress"):
+        migration.start("bge-small-en", 384)
+
+
+def test_cut_over_requires_all_chunks(store, embedder):
+    store.count_chunks.side_effect = [(0, 3), (3, 3), (3, 4)]
+    migration = EmbeddingMigration(store, embedder)
+
+    with pytest.raises(RuntimeError, match="1 chunks are not embedded"):
+        migration.cut_over(make_space())
+    store.cut_over.assert_not_called()
+
+
+def test_run_embeds_chunks_committed_behind_the_resume_point(store, embedder):
+    # Chunk 3 committed after the migration had moved past it
+    store.count_chunks.side_effect = [(0, 4), (3, 4)]
+    store.chunks_to_embed.side_effect = [[(1, "a"), (2, "b")], [(5, "c")], [], [(3, "late")], []]
+    migration = EmbeddingMigration(store, embedder, batch_size=2)
+
+    progress = migration.run(make_space())
+
+    assert [call.args[1] for call in store.write_embeddings.call_args_list] == [[1, 2], [5], [3]]
+    assert [call.kwargs["after_id"] for call in store.chunks_to_embed.call_args_list] == [None, None, None, 0, 3]
+    assert progress.embedded == 4
+
+
+def test_progress_eta():
+    progress = MigrationProgress(embedded=300, total=1000, embedded_this_run=200, elapsed_seconds=10)
+
+    assert progress.chunks_per_second == 20
+    assert progress.eta_seconds == 35
+    assert str(progress) == "300/1000 chunks (30.0%), 20 chunks/s, ETA 35s"
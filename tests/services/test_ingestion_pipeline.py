@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from app.services.ingestion_pipeline import VideoIngestionPipeline
+from app.services.video_processing import VideoProcessingService
+from app.storage.unit_of_work import UnitOfWork
+from app.youtube.data_loader import Video
+
+
+@pytest.fixture
+def service(mock_repository, mock_transcript_fetcher, mock_transcript_chunker, mock_embedder):
+    mock_embedder.embed_texts.side_effect = lambda texts, batch_size=32: np.ones((len(texts), 3))
+    return VideoProcessingService(
+        mock_repository,
+        mock_transcript_fetcher,
+        mock_transcript_chunker,
+        mock_embedder,
+        retry_backoff_seconds=0,
+    )
+
+
+@pytest.fixture
+def videos():
+    return [Video(id=f"video{i}", title=f"Video {i}") for i in range(10)]
+
+
+def test_pipeline_stores_all_videos(service, mock_repository, mock_transcript_fetcher, videos):
+    pipeline = VideoIngestionPipeline(service, fetch_workers=4, process_workers=2, queue_size=2)
+
+    stats = pipeline.run(videos)
+
+    assert stats.total == 10
+    assert stats.stored == 10
+    assert stats.failed == []
+    assert mock_transcript_fetcher.fetch.call_count == 10
+    assert mock_repository.bulk_insert.call_count == 10
+
+
+def test_pipeline_skips_existing_videos(service, mock_repository, mock_transcript_fetcher, videos):
+    mock_repository.is_document_exists.side_effect = lambda url: url.endswith("video0")
+    pipeline = VideoIngestionPipeline(service, fetch_workers=2)
+
+    stats = pipeline.run(videos)
+
+    assert stats.skipped == 1
+    assert stats.stored == 9
+    assert mock_transcript_fetcher.fetch.call_count == 9
+
+
+def test_pipeline_continues_after_failure(service, mock_repository, mock_transcript_fetcher, videos):
+    def fetch(video_id):
+        if video_id == "video3":
+            raise RuntimeError("YouTube is down")
+        return {"text": "This is a transcript"}
+
+    mock_transcript_fetcher.fetch.side_effect = fetch
+    pipeline = VideoIngestionPipeline(service, fetch_workers=3)
+
+    stats = pipeline.run(videos)
+
+    assert stats.failed == ["video3"]
+    assert stats.stored == 9
+    assert mock_repository.bulk_insert.call_count == 9
+    # The failed fetch is retried before the video is given up on
+    assert mock_transcript_fetcher.fetch.call_count == 9 + service.max_attempts
+
+
+def test_pipeline_embeds_chunks_across_videos(service, mock_embedder, mock_repository, videos):
+    pipeline = VideoIngestionPipeline(service, fetch_workers=2, queue_size=len(videos))
+
+    pipeline.run(videos)
+
+    # Every chunk of the 10 videos is embedded exactly once, whatever the batching
+    embedded_texts = sum(len(call.args[0]) for call in mock_embedder.embed_texts.call_args_list)
+    assert embedded_texts == 20
+    for call in mock_repository.bulk_insert.call_args_list:
+        [(_, chunks)] = call.args[0]
+        assert chunks.texts == ["Chunk 1", "Chunk 2"]
+        assert chunks.embeddings.shape == (2, 3)
+
+
+def test_pipeline_counts_videos_stored_by_commits(service, mock_repository, videos):
+    def bulk_insert(items):
+        if any(document.url.endswith("video0") for document, _ in items):
+            raise RuntimeError("Lock wait timeout exceeded")
+
+    mock_repository.bulk_insert.side_effect = bulk_insert
+    service.unit_of_work = UnitOfWork(mock_repository, commit_interval=5, retry_backoff_seconds=0)
+    pipeline = VideoIngestionPipeline(service, fetch_workers=1)
+
+    stats = pipeline.run(videos)
+
+    # The whole batch of the failing video is lost, however far its other videos got
+    assert stats.stored == 5
+    assert len(stats.failed) == 5
+    assert "video0" in stats.failed
@@ -0,0 +1,83 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from app import config
+from app.services.registry import ServiceRegistry
+from app.services.search import VideoSearchService
+from app.storage.models import EmbeddingSpace
+
+
+@pytest.fixture
+def embedder_factory(mock_embedder):
+    return Mock(return_value=mock_embedder)
+
+
+@pytest.fixture
+def repository_factory(mock_repository):
+    return Mock(return_value=mock_repository)
+
+
+@pytest.fixture
+def registry(embedder_factory, repository_factory):
+    return ServiceRegistry(embedder_factory=embedder_factory, repository_factory=repository_factory)
+
+
+def test_services_are_created_lazily(registry, embedder_factory, repository_factory):
+    embedder_factory.assert_not_called()
+    repository_factory.assert_not_called()
+
+    search_service = registry.search_service
+
+    assert isinstance(search_service, VideoSearchService)
+    embedder_factory.assert_called_once()
+    repository_factory.assert_called_once()
+
+
+def test_services_are_shared(registry, embedder_factory, mock_embedder, mock_repository):
+    assert registry.search_service is registry.search_service
+    assert registry.search_service.embedder is mock_embedder
+    assert registry.video_crud.repository is mock_repository
+    embedder_factory.assert_called_once()
+
+
+def test_concurrent_access_initializes_once(registry, embedder_factory):
+    results = []
+
+    def resolve():
+        results.append(registry.embedder)
+
+    threads = [threading.Thread(target=resolve) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    embedder_factory.assert_called_once()
+    assert len({id(embedder) for embedder in results}) == 1
+
+
+def test_warm_up_loads_embedding_model(registry, mock_embedder):
+    registry.warm_up()
+
+    mock_embedder.get_model.assert_called_once()
+
+
+def test_reset_drops_instances(registry, embedder_factory):
+    _ = registry.embedder
+    registry.reset()
+    _ = registry.embedder
+
+    assert embedder_factory.call_count == 2
+
+
+def test_embedder_uses_the_model_of_the_active_embedding_space(repository_factory, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_ENABLED", False)
+    space = EmbeddingSpace(id=2, model="all-mpnet-base-v2", dim=768, column_name="embedding_2", status="active")
+    space_factory = Mock(return_value=space)
+    registry = ServiceRegistry(repository_factory=repository_factory, embedding_space_factory=space_factory)
+
+    assert registry.embedder.model_name == "all-mpnet-base-v2"
+    assert registry.embedding_space is space
+    space_factory.assert_called_once()
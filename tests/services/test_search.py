@@ -1,6 +1,14 @@
+import threading
+import time
+from unittest.mock import Mock
+
+import numpy as np
 import pytest
 
-from app.services.search import VideoSearchService
+from app.metrics import Metrics
+from app.services.query_cache import LRUCache
+from app.services.search import VideoSearchService, reciprocal_rank_fusion
+from app.storage.models import SearchFilters, SearchResultChunk
 
 
 @pytest.fixture
@@ -20,3 +28,255 @@ def test_search(service, mock_repository, mock_embedder):
     assert results[0].distance == 0.95
     assert results[1].text == "Result chunk 2"
     assert results[1].distance == 0.85
+
+
+@pytest.fixture
+def metrics():
+    return Metrics()
+
+
+@pytest.fixture
+def cached_service(mock_repository, mock_embedder, metrics):
+    return VideoSearchService(
+        mock_repository,
+        mock_embedder,
+        query_cache=LRUCache("query_cache", max_size=2, metrics=metrics),
+        result_cache=LRUCache("result_cache", max_size=2, metrics=metrics),
+    )
+
+def test_search_reuses_query_embedding(mock_repository, mock_embedder, metrics):
+    service = VideoSearchService(
+        mock_repository, mock_embedder, query_cache=LRUCache("query_cache", max_size=2, metrics=metrics),
+    )
+
+    service.search("asyncio", 5)
+    service.search("  asyncio ", 10)
+
+    mock_embedder.embed_text.assert_called_once_with("asyncio")
+    assert mock_repository.search.call_count == 2
+    assert metrics.snapshot()["counters"] == {"query_cache.misses": 1, "query_cache.hits": 1}
+
+def test_search_reuses_results_until_index_changes(cached_service, mock_repository):
+    first = cached_service.search("asyncio", 5)
+    second = cached_service.search("asyncio", 5)
+
+    assert mock_repository.search.call_count == 1
+    assert [result.text for result in second] == [result.text for result in first]
+
+    mock_repository.index_version += 1
+    cached_service.search("asyncio", 5)
+
+    assert mock_repository.search.call_count == 2
+
+def test_result_cache_is_keyed_by_num_neighbors(cached_service, mock_repository):
+    cached_service.search("asyncio", 5)
+    cached_service.search("asyncio", 10)
+
+    assert mock_repository.search.call_count == 2
+
+def test_lru_cache_evicts_least_recently_used(metrics):
+    cache = LRUCache("cache", max_size=2, metrics=metrics)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.hit_rate() == 0.75
+
+def test_lru_cache_entries_expire(metrics):
+    now = [0.0]
+    cache = LRUCache("cache", max_size=2, ttl_seconds=10, metrics=metrics, clock=lambda: now[0])
+    cache.put("a", 1)
+
+    now[0] = 5.0
+    assert cache.get("a") == 1
+    now[0] = 11.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_search_many_embeds_once_and_keeps_order(cached_service, mock_repository, mock_embedder):
+    mock_embedder.embed_texts.side_effect = lambda texts, **kwargs: np.ones((len(texts), 3))
+    mock_repository.search_many.side_effect = lambda vectors, num_neighbors: [
+        [SearchResultChunk(
+            chunk_index=i, start_ts=0, end_ts=1, text=f"chunk {i}", distance=0.1,
+            document_title="Test Video", document_url="https://youtube.com/watch?v=video123",
+        )]
+        for i in range(len(vectors))
+    ]
+
+    results = cached_service.search_many(["asyncio", "decorators", " asyncio"], 5)
+
+    mock_embedder.embed_texts.assert_called_once_with(["asyncio", "decorators"], use_cache=False)
+    mock_repository.search_many.assert_called_once()
+    assert [[r.text for r in query_results] for query_results in results] == [["chunk 0"], ["chunk 1"], ["chunk 0"]]
+
+def test_search_many_uses_cached_results(cached_service, mock_repository, mock_embedder):
+    cached_service.search("asyncio", 5)
+    mock_repository.search_many.return_value = [[]]
+    mock_embedder.embed_texts.side_effect = lambda texts, **kwargs: np.ones((len(texts), 3))
+
+    results = cached_service.search_many(["asyncio", "decorators"], 5)
+
+    mock_embedder.embed_texts.assert_called_once_with(["decorators"], use_cache=False)
+    assert [r.text for r in results[0]] == ["Result chunk 1", "Result chunk 2"]
+    assert results[1] == []
+
+def test_search_with_filters(cached_service, mock_repository):
+    filters = SearchFilters(meta={"conference": "EuroPython"})
+
+    cached_service.search("asyncio", 5, filters=filters)
+    cached_service.search("asyncio", 5, filters=SearchFilters(meta={"conference": "EuroPython"}))
+    cached_service.search("asyncio", 5)
+
+    # Filtered and unfiltered results are cached separately
+    assert mock_repository.search.call_count == 2
+    assert mock_repository.search.call_args_list[0].kwargs["filters"] == filters
+    assert mock_repository.search.call_args_list[1].kwargs["filters"] is None
+
+
+def make_result(url: str, chunk_index: int, distance: float | None = None, score: float | None = None):
+    return SearchResultChunk(
+        chunk_index=chunk_index, start_ts=0, end_ts=10, text=f"{url} {chunk_index}",
+        distance=distance, score=score, document_title="Talk", document_url=url,
+    )
+
+def test_reciprocal_rank_fusion():
+    vector = [make_result("a", 1, distance=0.1), make_result("a", 2, distance=0.2), make_result("b", 1, distance=0.3)]
+    lexical = [make_result("b", 1, score=9.0), make_result("c", 1, score=5.0)]
+
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+
+    # In both rankings beats first in one of them, equal scores keep the first ranking's order
+    assert [(r.document_url, r.chunk_index) for r in fused] == [("b", 1), ("a", 1), ("a", 2), ("c", 1)]
+    assert fused[0].distance == 0.3
+    assert fused[0].score == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[3].distance is None
+
+def test_hybrid_search(mock_repository, mock_embedder):
+    lexical_index = Mock()
+    lexical_index.lexical_search.return_value = [make_result("https://youtube.com/watch?v=other", 3, score=4.2)]
+    service = VideoSearchService(mock_repository, mock_embedder, lexical_index=lexical_index, mode="hybrid")
+
+    results = service.search("PEP 703", 2)
+
+    mock_repository.search.assert_called_once()
+    assert mock_repository.search.call_args.kwargs["num_neighbors"] == 8
+    lexical_index.lexical_search.assert_called_once_with("PEP 703", 8, filters=None)
+    assert [r.text for r in results] == ["Result chunk 1", "https://youtube.com/watch?v=other 3"]
+    assert all(r.score is not None for r in results)
+
+def test_lexical_mode_requires_lexical_index(service):
+    with pytest.raises(ValueError, match="needs the lexical index"):
+        service.search("PEP 703", mode="lexical")
+
+def test_rerank_reorders_candidates(mock_repository, mock_embedder, metrics):
+    reranker = Mock()
+    reranker.score.return_value = np.array([0.1, 0.9])
+    service = VideoSearchService(
+        mock_repository, mock_embedder, reranker=reranker, rerank_candidate_multiplier=3, metrics=metrics,
+    )
+
+    results = service.search("asyncio", 1)
+
+    assert mock_repository.search.call_args.kwargs["num_neighbors"] == 3
+    reranker.score.assert_called_once_with("asyncio", ["Result chunk 1", "Result chunk 2"])
+    assert [(r.text, r.score) for r in results] == [("Result chunk 2", pytest.approx(0.9))]
+    timings = metrics.snapshot()["timings"]
+    assert {"search.retrieve", "search.rerank", "search.total"} <= timings.keys()
+
+def test_rerank_falls_back_to_first_stage_order_after_deadline(mock_repository, mock_embedder, metrics):
+    reranker = Mock()
+    reranker.score.side_effect = lambda query, texts: time.sleep(0.2) or np.array([0.1, 0.9])
+    service = VideoSearchService(
+        mock_repository, mock_embedder, reranker=reranker, rerank_time_budget_seconds=0.01, metrics=metrics,
+    )
+
+    results = service.search("asyncio", 2)
+
+    assert [r.text for r in results] == ["Result chunk 1", "Result chunk 2"]
+    assert metrics.snapshot()["counters"]["search.rerank.timeouts"] == 1
+
+def test_rerank_does_not_queue_behind_a_timed_out_pass(mock_repository, mock_embedder, metrics):
+    release = threading.Event()
+    reranker = Mock()
+    reranker.score.side_effect = lambda query, texts: release.wait(5) and np.array([0.1, 0.9])
+    service = VideoSearchService(
+        mock_repository, mock_embedder, reranker=reranker, rerank_time_budget_seconds=0.05, metrics=metrics,
+    )
+    service.search("asyncio", 2)
+
+    started_at = time.perf_counter()
+    results = service.search("event loop", 2)
+    release.set()
+
+    assert time.perf_counter() - started_at < 0.05
+    assert [r.text for r in results] == ["Result chunk 1", "Result chunk 2"]
+    assert reranker.score.call_count == 1
+    assert metrics.snapshot()["counters"]["search.rerank.busy"] == 1
+
+def test_rerank_falls_back_to_first_stage_order_on_errors(mock_repository, mock_embedder, metrics):
+    reranker = Mock()
+    reranker.score.side_effect = RuntimeError("CUDA out of memory")
+    service = VideoSearchService(mock_repository, mock_embedder, reranker=reranker, metrics=metrics)
+
+    results = service.search("asyncio", 2)
+
+    assert [r.text for r in results] == ["Result chunk 1", "Result chunk 2"]
+    assert metrics.snapshot()["counters"]["search.rerank.errors"] == 1
+
+def test_rerank_can_be_turned_off_per_search(mock_repository, mock_embedder):
+    reranker = Mock()
+    service = VideoSearchService(mock_repository, mock_embedder, reranker=reranker)
+
+    service.search("asyncio", 2, rerank=False)
+
+    reranker.score.assert_not_called()
+    assert mock_repository.search.call_args.kwargs["num_neighbors"] == 2
+
+def test_rerank_requires_reranker(service):
+    with pytest.raises(ValueError, match="needs the cross-encoder"):
+        service.search("asyncio", rerank=True)
+
+def test_diversified_search_fetches_candidates_once(mock_repository, mock_embedder, metrics):
+    mock_repository.search.return_value = [
+        make_result("https://youtube.com/watch?v=a", 1, distance=0.1),
+        make_result("https://youtube.com/watch?v=a", 2, distance=0.2),
+        make_result("https://youtube.com/watch?v=b", 1, distance=0.3),
+    ]
+    service = VideoSearchService(
+        mock_repository, mock_embedder, diversify="collapse", diversify_candidate_multiplier=5, metrics=metrics,
+    )
+
+    results = service.search("asyncio", 2)
+
+    mock_repository.search.assert_called_once()
+    assert mock_repository.search.call_args.kwargs["num_neighbors"] == 10
+    assert [(r.document_url[-1], r.start_ts, r.end_ts) for r in results] == [("a", 0, 10), ("b", 0, 10)]
+    assert "search.diversify" in metrics.snapshot()["timings"]
+
+def test_mmr_embeds_results_without_embeddings(mock_repository, mock_embedder):
+    lexical_index = Mock()
+    lexical_index.lexical_search.return_value = [
+        make_result("https://youtube.com/watch?v=a", 1, score=3.0),
+        make_result("https://youtube.com/watch?v=b", 5, score=2.0),
+    ]
+    service = VideoSearchService(mock_repository, mock_embedder, lexical_index=lexical_index, mode="lexical")
+
+    results = service.search("PEP 703", 2, diversify="mmr")
+
+    mock_embedder.embed_texts.assert_called_once_with(
+        ["https://youtube.com/watch?v=a 1", "https://youtube.com/watch?v=b 5"], use_cache=False,
+    )
+    assert len(results) == 2
+
+def test_only_mmr_retrieves_embeddings(mock_repository, mock_embedder):
+    service = VideoSearchService(mock_repository, mock_embedder)
+
+    service.search("asyncio", 2)
+    service.search("asyncio", 2, diversify="mmr")
+
+    assert [call.kwargs["with_embeddings"] for call in mock_repository.search.call_args_list] == [False, True]
@@ -1,8 +1,19 @@
+import numpy as np
 import pytest
 
+from unittest.mock import Mock
+
 from app.services.video_processing import VideoProcessingService
+from app.storage.embedding_spaces import EmbeddingSpaceChangedError
+from app.storage.unit_of_work import UnitOfWork
 from app.youtube.data_loader import Video
+from app.youtube.fetcher import PermanentFetchError
+
+
 
+@pytest.fixture(autouse=True)
+def embed_every_text(mock_embedder):
+    mock_embedder.embed_texts.side_effect = lambda texts, batch_size=32: np.ones((len(texts), 3))
 
 
 @pytest.fixture
@@ -22,8 +33,9 @@ def test_process_video_new_document(
     mock_transcript_fetcher.fetch.assert_called_once_with("video123")
     mock_transcript_chunker.split_into_chunks.assert_called_once()
     mock_embedder.embed_texts.assert_called_once()
-    mock_repository.insert_document.assert_called_once()
-    mock_repository.insert_chunks.assert_called_once()
+    # The document and its chunks are written together, in one transaction
+    mock_repository.bulk_insert.assert_called_once()
+    mock_repository.insert_document.assert_not_called()
 
 def test_process_video_existing_document(service, mock_repository):
     video = Video(id="video123", url="https://youtube.com/watch?v=video123", title="Test Video", meta={})
@@ -34,3 +46,209 @@ def test_process_video_existing_document(service, mock_repository):
     mock_repository.is_document_exists.assert_called_once_with(video.url)
     mock_repository.insert_document.assert_not_called()
     mock_repository.insert_chunks.assert_not_called()
+
+def test_populate_in_bulk_mode(service, mock_repository, monkeypatch):
+    videos = [
+        Video(id=f"video{i}", url=f"https://youtube.com/watch?v=video{i}", title=f"Video {i}", meta={})
+        for i in range(3)
+    ]
+    create_db_and_tables = Mock()
+    create_vector_index = Mock()
+    monkeypatch.setattr("app.services.video_processing.create_db_and_tables", create_db_and_tables)
+    monkeypatch.setattr("app.services.video_processing.load_videos", lambda: videos)
+    monkeypatch.setattr("app.services.bulk_load.create_vector_index", create_vector_index)
+
+    service.populate_default_videos(bulk=True)
+
+    create_db_and_tables.assert_called_once_with(drop_db_first=False, vector_index=False)
+    mock_repository.bulk_insert.assert_called_once()
+    assert [document.title for document, _ in mock_repository.bulk_insert.call_args.args[0]] == ["Video 0", "Video 1", "Video 2"]
+    create_vector_index.assert_called_once()
+    assert service.unit_of_work is None
+
+
+def test_populate_commits_in_batches(service, mock_repository, monkeypatch):
+    videos = [
+        Video(id=f"video{i}", url=f"https://youtube.com/watch?v=video{i}", title=f"Video {i}", meta={})
+        for i in range(5)
+    ]
+    monkeypatch.setattr("app.services.video_processing.create_db_and_tables", Mock())
+    monkeypatch.setattr("app.services.video_processing.load_videos", lambda: videos)
+    monkeypatch.setattr(
+        "app.services.video_processing.UnitOfWork",
+        lambda repo: UnitOfWork(repo, commit_interval=2),
+    )
+
+    service.populate_default_videos()
+
+    assert [len(call.args[0]) for call in mock_repository.bulk_insert.call_args_list] == [2, 2, 1]
+    assert service.unit_of_work is None
+
+
+def test_populate_stops_when_the_embedding_space_changed(service, mock_repository, monkeypatch):
+    videos = [
+        Video(id=f"video{i}", url=f"https://youtube.com/watch?v=video{i}", title=f"Video {i}", meta={})
+        for i in range(5)
+    ]
+    monkeypatch.setattr("app.services.video_processing.create_db_and_tables", Mock())
+    monkeypatch.setattr("app.services.video_processing.load_videos", lambda: videos)
+    monkeypatch.setattr(
+        "app.services.video_processing.UnitOfWork",
+        lambda repo: UnitOfWork(repo, commit_interval=2, retry_backoff_seconds=0),
+    )
+    mock_repository.bulk_insert.side_effect = EmbeddingSpaceChangedError("restart to use it")
+
+    with pytest.raises(EmbeddingSpaceChangedError):
+        service.populate_default_videos()
+
+    mock_repository.bulk_insert.assert_called_once()
+
+
+def test_populate_embeds_chunks_across_videos(service, mock_repository, mock_embedder, monkeypatch):
+    videos = [Video(id=f"video{i}", title=f"Video {i}") for i in range(5)]
+    monkeypatch.setattr("app.services.video_processing.create_db_and_tables", Mock())
+    monkeypatch.setattr("app.services.video_processing.load_videos", lambda: videos)
+
+    service.populate_default_videos()
+
+    # The two chunks of every video are embedded in one batch, and scattered back per video
+    assert mock_embedder.embed_texts.call_count == 1
+    assert len(mock_embedder.embed_texts.call_args.args[0]) == 10
+    [documents_and_chunks] = [call.args[0] for call in mock_repository.bulk_insert.call_args_list]
+    assert [chunks.embeddings.shape for _, chunks in documents_and_chunks] == [(2, 3)] * 5
+
+
+def test_populate_keeps_buffered_videos_when_one_fails(service, mock_repository, mock_transcript_fetcher, monkeypatch):
+    videos = [Video(id=f"video{i}", title=f"Video {i}") for i in range(5)]
+    monkeypatch.setattr("app.services.video_processing.create_db_and_tables", Mock())
+    monkeypatch.setattr("app.services.video_processing.load_videos", lambda: videos)
+    service.retry_backoff_seconds = 0
+
+    def fetch(video_id):
+        if video_id == "video3":
+            raise RuntimeError("YouTube is down")
+        return {"text": "This is a transcript"}
+
+    mock_transcript_fetcher.fetch.side_effect = fetch
+
+    service.populate_default_videos()
+
+    [documents_and_chunks] = [call.args[0] for call in mock_repository.bulk_insert.call_args_list]
+    assert [document.title for document, _ in documents_and_chunks] == ["Video 0", "Video 1", "Video 2", "Video 4"]
+
+
+@pytest.fixture
+def ingestion_state():
+    ingestion_state = Mock()
+    ingestion_state.stored_urls.return_value = {"https://www.youtube.com/watch?v=video0"}
+    return ingestion_state
+
+
+@pytest.fixture
+def tracked_service(mock_repository, mock_transcript_fetcher, mock_transcript_chunker, mock_embedder, ingestion_state):
+    return VideoProcessingService(
+        mock_repository,
+        mock_transcript_fetcher,
+        mock_transcript_chunker,
+        mock_embedder,
+        ingestion_state=ingestion_state,
+        max_attempts=3,
+        retry_backoff_seconds=0,
+    )
+
+def test_process_video_retries_failed_stage(tracked_service, mock_transcript_fetcher, ingestion_state):
+    video = Video(id="video123", title="Test Video")
+    mock_transcript_fetcher.fetch.side_effect = [TimeoutError("read timed out"), {"text": "This is a transcript"}]
+
+    tracked_service.process_video(video)
+
+    assert mock_transcript_fetcher.fetch.call_count == 2
+    ingestion_state.record_failure.assert_called_once_with(
+        video.url, "video123", "fetch", "TimeoutError: read timed out",
+    )
+    stages = [call.args[2] for call in ingestion_state.record_stage.call_args_list]
+    assert stages == ["fetch", "chunk", "embed", "store"]
+
+def test_process_video_gives_up_after_max_attempts(tracked_service, mock_transcript_fetcher, ingestion_state):
+    mock_transcript_fetcher.fetch.side_effect = RuntimeError("YouTube is down")
+
+    with pytest.raises(RuntimeError):
+        tracked_service.process_video(Video(id="video123", title="Test Video"))
+
+    assert mock_transcript_fetcher.fetch.call_count == 3
+    assert ingestion_state.record_failure.call_count == 3
+    ingestion_state.record_stage.assert_not_called()
+
+def test_process_video_does_not_retry_permanent_fetch_errors(tracked_service, mock_transcript_fetcher, ingestion_state):
+    mock_transcript_fetcher.fetch.side_effect = PermanentFetchError("VideoUnavailable for video video123")
+
+    with pytest.raises(PermanentFetchError):
+        tracked_service.process_video(Video(id="video123", title="Test Video"))
+
+    assert mock_transcript_fetcher.fetch.call_count == 1
+    ingestion_state.record_failure.assert_called_once()
+
+def test_fetch_stage_uses_its_own_attempts(
+    mock_repository, mock_transcript_fetcher, mock_transcript_chunker, mock_embedder, ingestion_state,
+):
+    service = VideoProcessingService(
+        mock_repository,
+        mock_transcript_fetcher,
+        mock_transcript_chunker,
+        mock_embedder,
+        ingestion_state=ingestion_state,
+        max_attempts=3,
+        retry_backoff_seconds=0,
+        fetch_max_attempts=1,
+    )
+    mock_transcript_fetcher.fetch.side_effect = TimeoutError("read timed out")
+
+    with pytest.raises(TimeoutError):
+        service.process_video(Video(id="video123", title="Test Video"))
+
+    assert mock_transcript_fetcher.fetch.call_count == 1
+
+def test_populate_resumes_after_stored_videos(tracked_service, mock_repository, ingestion_state, monkeypatch):
+    videos = [Video(id=f"video{i}", title=f"Video {i}") for i in range(3)]
+    monkeypatch.setattr("app.services.video_processing.create_db_and_tables", Mock())
+    monkeypatch.setattr("app.services.video_processing.load_videos", lambda: videos)
+
+    tracked_service.populate_default_videos()
+
+    assert [document.title for document, _ in mock_repository.bulk_insert.call_args.args[0]] == ["Video 1", "Video 2"]
+    stored = ingestion_state.record_stages.call_args
+    assert stored.args[0] == [(videos[1].url, "video1"), (videos[2].url, "video2")]
+    assert stored.args[1] == "store"
+
+def test_populate_retries_and_records_failed_commits(tracked_service, mock_repository, ingestion_state, monkeypatch):
+    videos = [Video(id=f"video{i}", title=f"Video {i}") for i in range(1, 3)]
+    monkeypatch.setattr("app.services.video_processing.create_db_and_tables", Mock())
+    monkeypatch.setattr("app.services.video_processing.load_videos", lambda: videos)
+    mock_repository.bulk_insert.side_effect = RuntimeError("Lock wait timeout exceeded")
+
+    with pytest.raises(RuntimeError):
+        tracked_service.populate_default_videos()
+
+    assert mock_repository.bulk_insert.call_count == 3
+    failures = [call.args for call in ingestion_state.record_failure.call_args_list]
+    assert [(video_id, stage) for _, video_id, stage, _ in failures] == [("video1", "store"), ("video2", "store")]
+
+def test_populate_reports_every_video_of_a_failed_batch(
+    tracked_service, mock_repository, ingestion_state, monkeypatch, caplog,
+):
+    videos = [Video(id=f"video{i}", title=f"Video {i}") for i in range(1, 5)]
+    monkeypatch.setattr("app.services.video_processing.create_db_and_tables", Mock())
+    monkeypatch.setattr("app.services.video_processing.load_videos", lambda: videos)
+    monkeypatch.setattr(
+        "app.services.video_processing.UnitOfWork",
+        lambda repo: UnitOfWork(repo, commit_interval=2),
+    )
+    mock_repository.bulk_insert.side_effect = [RuntimeError("Lock wait timeout exceeded")] * 3 + [[3, 4]]
+
+    tracked_service.populate_default_videos()
+
+    failures = [call.args for call in ingestion_state.record_failure.call_args_list]
+    assert [(video_id, stage) for _, video_id, stage, _ in failures] == [("video1", "store"), ("video2", "store")]
+    stored = ingestion_state.record_stages.call_args_list[-1]
+    assert stored.args[0] == [(videos[2].url, "video3"), (videos[3].url, "video4")]
+    assert "Failed videos: video1, video2" in caplog.text
@@ -0,0 +1,3 @@
+"""
+Test package for the storage module.
+"""
\ No newline at end of file
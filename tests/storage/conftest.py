@@ -0,0 +1,18 @@
+import numpy as np
+
+from app.storage.models import Chunk
+
+
+def make_chunks(embeddings: np.ndarray, document_id: int = 1, first_id: int = 1) -> list[Chunk]:
+    return [
+        Chunk(
+            id=first_id + i,
+            chunk_index=i,
+            start_ts=i * 10.0,
+            end_ts=i * 10.0 + 10,
+            text=f"chunk {first_id + i}",
+            document_id=document_id,
+            embedding=embedding,
+        )
+        for i, embedding in enumerate(embeddings)
+    ]
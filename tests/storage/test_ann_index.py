@@ -0,0 +1,113 @@
+import json
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from app.services.protocols import Repository
+from app.storage.ann_index import MANIFEST_FILE, IVFVectorIndex
+from app.storage.models import SearchFilters
+from app.storage.numpy_index import NumpyVectorIndex
+from tests.storage.conftest import make_chunks
+
+
+@pytest.fixture
+def embeddings():
+    # Well separated clusters, so that probing a few lists finds the true neighbors
+    rng = np.random.default_rng(0)
+    centers = rng.normal(scale=10, size=(8, 16))
+    return (centers[rng.integers(0, 8, size=400)] + rng.normal(size=(400, 16))).astype(np.float32)
+
+
+@pytest.fixture
+def source(embeddings):
+    repo = Mock(spec=Repository)
+    document = Mock(id=1, title="Test Video", url="https://www.youtube.com/watch?v=video123", meta={})
+    repo.list_documents.return_value = [document]
+    repo.get_document.return_value = document
+    repo.iter_chunks.side_effect = lambda batch_size=10000: iter([make_chunks(embeddings)])
+    return repo
+
+
+@pytest.fixture
+def index(source):
+    return IVFVectorIndex.build(source, nlist=8, nprobe=2)
+
+
+def result_ids(results):
+    return [result.id for result in results]
+
+
+def test_search_with_all_lists_is_exact(index, source, embeddings):
+    exact = NumpyVectorIndex(source)
+    query = embeddings[7] + 0.1
+
+    assert result_ids(index.search(query, 10, nprobe=index.nlist)) == result_ids(exact.search(query, 10))
+
+
+def test_recall_with_few_lists(index, source, embeddings):
+    exact = NumpyVectorIndex(source)
+    queries = embeddings[:50] + 0.1
+
+    recall = np.mean([
+        len(set(result_ids(index.search(query, 5))) & set(result_ids(exact.search(query, 5)))) / 5
+        for query in queries
+    ])
+
+    assert recall >= 0.9
+
+
+def test_save_and_load(index, source, embeddings, tmp_path):
+    index.save(tmp_path)
+    loaded = IVFVectorIndex.load(source, tmp_path, nprobe=2)
+
+    query = embeddings[3]
+    results = loaded.search(query, 5)
+    assert results == index.search(query, 5)
+    assert results[0].text == "chunk 4"
+    assert results[0].document_title == "Test Video"
+    assert isinstance(loaded._arrays["vectors"], np.memmap)
+
+
+def test_load_rejects_unknown_format_version(index, source, tmp_path):
+    index.save(tmp_path)
+    manifest = json.loads((tmp_path / MANIFEST_FILE).read_text())
+    manifest["version"] = 999
+    (tmp_path / MANIFEST_FILE).write_text(json.dumps(manifest))
+
+    with pytest.raises(ValueError, match="Unsupported ANN index format"):
+        IVFVectorIndex.load(source, tmp_path)
+
+
+def test_inserted_chunks_are_searchable_before_rebuild(index, source):
+    vector = np.full(16, 100, dtype=np.float32)
+    version = index.index_version
+
+    index.insert_chunks(make_chunks(vector[None, :], first_id=1000))
+
+    source.insert_chunks.assert_called_once()
+    assert index.index_version == version + 1
+    assert index.search(vector, 1)[0].id == 1000
+
+
+@pytest.mark.parametrize("num_filtered", [10, 300])
+def test_filtered_search_matches_exact_filtered_search(embeddings, num_filtered):
+    # Few matching rows are scanned exactly, many are filtered within the probed lists
+    repo = Mock(spec=Repository)
+    repo.list_documents.return_value = [
+        Mock(id=1, title="Talk 1", url="https://www.youtube.com/watch?v=1", meta={"year": 2023}),
+        Mock(id=2, title="Talk 2", url="https://www.youtube.com/watch?v=2", meta={"year": 2024}),
+    ]
+    repo.iter_chunks.side_effect = lambda batch_size=10000: iter([
+        make_chunks(embeddings[:-num_filtered], document_id=1),
+        make_chunks(embeddings[-num_filtered:], document_id=2, first_id=len(embeddings) - num_filtered + 1),
+    ])
+    index = IVFVectorIndex.build(repo, nlist=8, nprobe=8)
+    exact = NumpyVectorIndex(repo)
+    filters = SearchFilters(meta={"year": 2024})
+    query = embeddings[-1] + 0.1
+
+    results = index.search(query, 5, filters=filters)
+
+    assert result_ids(results) == result_ids(exact.search(query, 5, filters=filters))
+    assert all(result.id > len(embeddings) - num_filtered for result in results)
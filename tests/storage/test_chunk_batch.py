@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from app.chunking.chunk import Chunk, ChunkMetadata
+from app.storage.chunk_batch import ChunkBatch
+
+
+@pytest.fixture
+def batch():
+    return ChunkBatch.from_chunks([
+        Chunk("first", ChunkMetadata(0.5, 2.0), token_count=1),
+        Chunk("second", ChunkMetadata(2.5, 3.0), token_count=4),
+    ])
+
+
+def test_from_chunks_builds_columns(batch):
+    assert batch.texts == ["first", "second"]
+    np.testing.assert_array_equal(batch.start_ts, [0.5, 2.5])
+    np.testing.assert_array_equal(batch.end_ts, [2.5, 5.5])
+    np.testing.assert_array_equal(batch.chunk_index, [0, 1])
+    np.testing.assert_array_equal(batch.token_counts, [1, 4])
+    assert batch.embeddings is None
+
+
+def test_token_counts_are_dropped_unless_all_chunks_have_one():
+    batch = ChunkBatch.from_chunks([Chunk("a", ChunkMetadata(0, 1), token_count=1), Chunk("b", ChunkMetadata(1, 1))])
+
+    assert batch.token_counts is None
+
+
+def test_set_embeddings_checks_the_number_of_rows(batch):
+    batch.set_embeddings(np.ones((2, 3), dtype=np.float64))
+    assert batch.embeddings.dtype == np.float32
+
+    with pytest.raises(ValueError):
+        batch.set_embeddings(np.ones((3, 3)))
+
+
+def test_to_chunks(batch):
+    batch.set_embeddings(np.eye(2))
+    batch.document_id = 7
+
+    chunks = batch.to_chunks()
+
+    assert [(c.chunk_index, c.start_ts, c.end_ts, c.text, c.document_id) for c in chunks] == [
+        (0, 0.5, 2.5, "first", 7), (1, 2.5, 5.5, "second", 7),
+    ]
+    np.testing.assert_array_equal(chunks[1].embedding, [0, 1])
@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from unittest.mock import Mock
+
+import mariadb
+import numpy as np
+import pytest
+
+from app import config
+from app.storage.embedding_spaces import LEGACY_COLUMN, EmbeddingSpaceStore
+from app.storage.models import EmbeddingSpace
+from app.storage.vectors import from_vector_bytes
+
+
+@pytest.fixture
+def connection():
+    return Mock()
+
+
+@pytest.fixture
+def store(connection):
+    pool = Mock()
+
+    @contextmanager
+    def borrow():
+        yield connection
+
+    pool.connection.side_effect = borrow
+    return EmbeddingSpaceStore(pool)
+
+
+def make_space(**kwargs) -> EmbeddingSpace:
+    return EmbeddingSpace(**{
+        "id": 2, "model": "all-mpnet-base-v2", "dim": 768, "column_name": "embedding_2", "status": "migrating",
+        **kwargs,
+    })
+
+
+def test_write_embeddings_advances_resume_point_in_same_transaction(store, connection):
+    space = make_space()
+    embeddings = np.random.default_rng(0).normal(size=(2, 768)).astype(np.float32)
+
+    store.write_embeddings(space, [7, 9], embeddings)
+
+    cursor = connection.cursor.return_value
+    rows = cursor.executemany.call_args.args[1]
+    np.testing.assert_array_equal(from_vector_bytes(rows[1][0]), embeddings[1])
+    assert cursor.execute.call_args.args[1] == (9, 2)
+    connection.commit.assert_called_once()
+    assert space.migrated_chunk_id == 9
+
+
+def test_cut_over_activates_the_space_then_moves_the_vector_index(store, connection):
+    cursor = connection.cursor.return_value
+    cursor.fetchall.side_effect = [
+        [
+            {"id": 1, "model": "all-MiniLM-L6-v2", "dim": 384, "column_name": "embedding", "status": "retired"},
+            {"id": 2, "model": "all-mpnet-base-v2", "dim": 768, "column_name": "embedding_2", "status": "active"},
+        ],
+        [("embedding", "embedding")],
+        [("embedding", "NO"), ("embedding_2", "YES")],
+    ]
+    space = make_space()
+
+    store.cut_over(space)
+
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    alter = next(statement for statement in statements if statement.startswith("ALTER"))
+    assert statements.index(alter) > max(i for i, statement in enumerate(statements) if "SET status" in statement)
+    assert "DROP INDEX embedding, MODIFY embedding VECTOR(384) NULL" in alter
+    assert "MODIFY embedding_2 VECTOR(768) NOT NULL, ADD VECTOR INDEX embedding_2 (embedding_2)" in alter
+    connection.commit.assert_called_once()
+    assert space.status == "active"
+
+
+def test_cut_over_again_skips_completed_schema_changes(store, connection):
+    cursor = connection.cursor.return_value
+    cursor.fetchall.side_effect = [
+        [
+            {"id": 1, "model": "all-MiniLM-L6-v2", "dim": 384, "column_name": "embedding", "status": "retired"},
+            {"id": 2, "model": "all-mpnet-base-v2", "dim": 768, "column_name": "embedding_2", "status": "active"},
+        ],
+        [("embedding_2", "embedding_2")],
+        [("embedding", "YES"), ("embedding_2", "NO")],
+    ]
+
+    store.cut_over(make_space(status="active"))
+
+    assert not any(call.args[0].startswith("ALTER") for call in cursor.execute.call_args_list)
+
+
+def test_current_space_is_the_initial_one_without_schema(store, connection):
+    error = mariadb.Error("Table 'semantic_search.embedding_spaces' doesn't exist")
+    error.errno = 1146
+    connection.cursor.return_value.execute.side_effect = error
+
+    space = store.current_space()
+
+    assert (space.model, space.column_name) == (config.EMBEDDING_MODEL, LEGACY_COLUMN)
+
+
+def test_current_space_raises_other_errors(store, connection):
+    error = mariadb.Error("Lost connection to server")
+    error.errno = 2013
+    connection.cursor.return_value.execute.side_effect = error
+
+    with pytest.raises(mariadb.Error):
+        store.current_space()
@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+from unittest.mock import Mock
+
+import pytest
+
+from app.storage.ingestion_state import IngestionStateStore
+
+
+@pytest.fixture
+def connection():
+    return Mock()
+
+
+@pytest.fixture
+def store(connection):
+    pool = Mock()
+
+    @contextmanager
+    def borrow():
+        yield connection
+
+    pool.connection.side_effect = borrow
+    return IngestionStateStore(pool)
+
+
+def test_record_stages_sets_stage_and_timing(store, connection):
+    store.record_stages([("https://www.youtube.com/watch?v=a", "a"), ("https://www.youtube.com/watch?v=b", "b")], "embed", 0.5)
+
+    sql, rows = connection.cursor.return_value.executemany.call_args.args
+    assert "embed_seconds = VALUES(embed_seconds)" in sql
+    assert rows == [
+        ("https://www.youtube.com/watch?v=a", "a", "embedded", 0.5),
+        ("https://www.youtube.com/watch?v=b", "b", "embedded", 0.5),
+    ]
+    connection.commit.assert_called_once()
+
+
+def test_record_failure_keeps_stage_and_counts_attempts(store, connection):
+    store.record_failure("https://www.youtube.com/watch?v=a", "a", "fetch", "RuntimeError: YouTube is down")
+
+    sql, params = connection.cursor.return_value.execute.call_args.args
+    assert "attempts = attempts + 1" in sql
+    assert "stage =" not in sql.split("ON DUPLICATE KEY UPDATE")[1]
+    assert params[2] == "fetch: RuntimeError: YouTube is down"
@@ -0,0 +1,90 @@
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from app.services.protocols import Repository
+from app.storage.lexical_index import BM25Index, tokenize
+from app.storage.models import Chunk, SearchFilters
+
+TEXTS = [
+    "the global interpreter lock is going away with PEP 703",
+    "asyncio event loop performance with uvloop",
+    "the event loop runs callbacks",
+    "type hints and static analysis",
+]
+
+
+def make_text_chunks(texts: list[str], document_id: int = 1, first_id: int = 1) -> list[Chunk]:
+    return [
+        Chunk(
+            id=first_id + i, chunk_index=i, start_ts=0, end_ts=10, text=text,
+            document_id=document_id, embedding=np.zeros(4, dtype=np.float32),
+        )
+        for i, text in enumerate(texts)
+    ]
+
+
+@pytest.fixture
+def source():
+    repo = Mock(spec=Repository)
+    repo.list_documents.return_value = [
+        Mock(id=1, title="Talk 1", url="https://www.youtube.com/watch?v=1", meta={"year": 2023}),
+        Mock(id=2, title="Talk 2", url="https://www.youtube.com/watch?v=2", meta={"year": 2024}),
+    ]
+    repo.iter_chunks.return_value = iter([make_text_chunks(TEXTS)])
+    return repo
+
+
+@pytest.fixture
+def index(source):
+    return BM25Index(source)
+
+
+def test_tokenize():
+    assert tokenize("PEP 703, uvloop's speed!") == ["pep", "703", "uvloop", "s", "speed"]
+
+
+def test_exact_terms_rank_first(index):
+    results = index.lexical_search("PEP 703", 3)
+
+    assert [result.id for result in results] == [1]
+    assert results[0].distance is None
+    assert results[0].score > 0
+    assert results[0].document_title == "Talk 1"
+
+
+def test_rarer_terms_weigh_more(index):
+    results = index.lexical_search("uvloop event loop", 3)
+
+    assert [result.id for result in results] == [2, 3]
+    assert results[0].score > results[1].score
+
+
+def test_unknown_terms(index):
+    assert index.lexical_search("kubernetes", 3) == []
+    assert index.lexical_search("", 3) == []
+
+
+def test_inserted_chunks_are_searchable(index, source):
+    index.insert_chunks(make_text_chunks(["packaging with uv and wheels"], document_id=2, first_id=5))
+
+    source.insert_chunks.assert_called_once()
+    assert [result.id for result in index.lexical_search("wheels", 3)] == [5]
+    assert len(index) == 5
+
+
+def test_filters(index):
+    index.insert_chunks(make_text_chunks(["the event loop in 2024"], document_id=2, first_id=5))
+
+    results = index.lexical_search("event loop", 5, filters=SearchFilters(meta={"year": 2024}))
+
+    assert [result.id for result in results] == [5]
+
+
+def test_vector_search_is_delegated(index, source):
+    query = np.zeros(4, dtype=np.float32)
+
+    index.search(query, 3)
+
+    source.search.assert_called_once_with(query, 3, filters=None, with_embeddings=False)
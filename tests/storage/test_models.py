@@ -0,0 +1,31 @@
+import pytest
+
+from app.storage.models import SearchFilters
+
+
+def test_parse_filters():
+    filters = SearchFilters.parse(["conference=PyCon US", "year=2023", "document_id=3", "document_id=4"])
+
+    assert filters.meta == {"conference": "PyCon US", "year": "2023"}
+    assert filters.document_ids == [3, 4]
+
+
+def test_parse_rejects_expressions_without_value():
+    with pytest.raises(ValueError, match="expected key=value"):
+        SearchFilters.parse(["conference"])
+
+
+def test_matches_compares_meta_values_as_text():
+    filters = SearchFilters(meta={"year": "2023", "keynote": True})
+
+    assert filters.matches(1, {"year": 2023, "keynote": True})
+    assert not filters.matches(1, {"year": 2023, "keynote": False})
+    assert not filters.matches(1, {"keynote": True})
+
+
+def test_matches_document_ids():
+    filters = SearchFilters(document_ids=[1, 2])
+
+    assert filters.matches(2, {})
+    assert not filters.matches(3, {})
+    assert filters.cache_key() == SearchFilters(document_ids=[2, 1]).cache_key()
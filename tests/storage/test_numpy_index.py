@@ -0,0 +1,143 @@
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from app.services.protocols import Repository
+from app.storage.chunk_batch import ChunkBatch
+from app.storage.models import Document, SearchFilters
+from app.storage.numpy_index import NumpyVectorIndex
+from tests.storage.conftest import make_chunks
+
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(0).normal(size=(200, 16)).astype(np.float32)
+
+
+@pytest.fixture
+def source(embeddings):
+    repo = Mock(spec=Repository)
+    document = Mock(id=1, title="Test Video", url="https://www.youtube.com/watch?v=video123", meta={})
+    repo.list_documents.return_value = [document]
+    repo.get_document.return_value = document
+    repo.iter_chunks.return_value = iter([make_chunks(embeddings[:150]), make_chunks(embeddings[150:], first_id=151)])
+    return repo
+
+
+@pytest.fixture
+def index(source):
+    return NumpyVectorIndex(source)
+
+
+def test_search_matches_brute_force(index, embeddings):
+    query = np.random.default_rng(1).normal(size=16).astype(np.float32)
+
+    results = index.search(query, num_neighbors=5)
+
+    distances = np.linalg.norm(embeddings - query, axis=1)
+    expected = np.argsort(distances)[:5]
+    assert [result.id for result in results] == [int(i) + 1 for i in expected]
+    np.testing.assert_allclose([result.distance for result in results], distances[expected], rtol=1e-4)
+    assert results[0].document_title == "Test Video"
+    assert results[0].document_url == "https://www.youtube.com/watch?v=video123"
+
+
+def test_search_with_more_neighbors_than_chunks(index):
+    results = index.search(np.zeros(16, dtype=np.float32), num_neighbors=500)
+
+    assert len(results) == 200
+    assert [r.distance for r in results] == sorted(r.distance for r in results)
+
+
+def test_search_many_matches_single_searches(index, monkeypatch):
+    # Small blocks so that the queries span several matrix products
+    monkeypatch.setattr("app.config.SEARCH_MANY_QUERY_BLOCK_SIZE", 3)
+    queries = np.random.default_rng(2).normal(size=(7, 16)).astype(np.float32)
+
+    batched = index.search_many(queries, num_neighbors=4)
+
+    assert len(batched) == 7
+    for query, results in zip(queries, batched, strict=True):
+        expected = index.search(query, num_neighbors=4)
+        assert [r.id for r in results] == [r.id for r in expected]
+        np.testing.assert_allclose([r.distance for r in results], [r.distance for r in expected], rtol=1e-4)
+
+
+def test_inserted_chunks_are_searchable(index, source):
+    source.insert_document.return_value = 2
+    document_id = index.insert_document(
+        Document(title="New Video", url="https://www.youtube.com/watch?v=new", created_at="2025-01-01T00:00:00"),
+    )
+    vector = np.full(16, 100, dtype=np.float32)
+    version = index.index_version
+
+    index.insert_chunks(make_chunks(vector[None, :], document_id=document_id, first_id=1000))
+
+    source.insert_chunks.assert_called_once()
+    assert index.index_version == version + 1
+    result = index.search(vector, num_neighbors=1)[0]
+    assert result.text == "chunk 1000"
+    assert result.document_title == "New Video"
+    assert result.distance == pytest.approx(0, abs=1e-3)
+
+
+def test_bulk_inserted_chunk_batches_are_searchable(index, source):
+    source.bulk_insert.return_value = [2]
+    vectors = np.full((2, 16), 100, dtype=np.float32)
+    vectors[1] *= -1
+    batch = ChunkBatch(["near", "far"], np.array([0.0, 5.0]), np.array([5.0, 9.0]), embeddings=vectors)
+    batch.document_id = 2
+
+    index.bulk_insert([
+        (Document(title="New Video", url="https://www.youtube.com/watch?v=new", created_at="2025-01-01T00:00:00"), batch),
+    ])
+
+    result = index.search(vectors[1], num_neighbors=1)[0]
+    assert (result.text, result.chunk_index, result.start_ts, result.end_ts) == ("far", 1, 5.0, 9.0)
+    assert result.document_title == "New Video"
+    # Database ids of bulk inserted chunks are not known, rather than made up
+    assert result.id is None
+
+
+def test_empty_index(source):
+    source.list_documents.return_value = []
+    source.iter_chunks.return_value = iter([])
+
+    assert NumpyVectorIndex(source).search(np.zeros(16), num_neighbors=5) == []
+
+
+@pytest.fixture
+def filtered_index(embeddings):
+    repo = Mock(spec=Repository)
+    repo.list_documents.return_value = [
+        Mock(id=1, title="Talk 1", url="https://www.youtube.com/watch?v=1", meta={"conference": "PyCon US", "year": 2023}),
+        Mock(id=2, title="Talk 2", url="https://www.youtube.com/watch?v=2", meta={"conference": "EuroPython", "year": 2024}),
+    ]
+    repo.iter_chunks.return_value = iter([
+        make_chunks(embeddings[:190], document_id=1), make_chunks(embeddings[190:], document_id=2, first_id=191),
+    ])
+    return NumpyVectorIndex(repo)
+
+
+@pytest.mark.parametrize("filters, rows", [
+    # 10 of 200 chunks: only the matching rows are scanned
+    (SearchFilters(meta={"conference": "EuroPython"}), slice(190, 200)),
+    # 190 of 200 chunks: all rows are scanned and the other ones excluded
+    (SearchFilters(meta={"year": "2023"}), slice(0, 190)),
+    (SearchFilters(document_ids=[2]), slice(190, 200)),
+])
+def test_filtered_search_matches_brute_force(filtered_index, embeddings, filters, rows):
+    query = np.random.default_rng(3).normal(size=16).astype(np.float32)
+
+    results = filtered_index.search(query, num_neighbors=5, filters=filters)
+
+    distances = np.linalg.norm(embeddings[rows] - query, axis=1)
+    expected = np.argsort(distances)[:5] + rows.start
+    assert [result.id for result in results] == [int(i) + 1 for i in expected]
+
+
+def test_filtered_search_without_matches(filtered_index):
+    filters = SearchFilters(meta={"conference": "DjangoCon"})
+
+    assert filtered_index.search(np.zeros(16, dtype=np.float32), num_neighbors=5, filters=filters) == []
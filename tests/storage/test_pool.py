@@ -0,0 +1,114 @@
+import threading
+from unittest.mock import Mock
+
+import mariadb
+import pytest
+
+from app.metrics import Metrics
+from app.storage.pool import ConnectionPool, PoolTimeoutError
+
+
+@pytest.fixture
+def metrics():
+    return Metrics()
+
+
+@pytest.fixture
+def connect():
+    return Mock(side_effect=Mock)
+
+
+def make_pool(connect, metrics, size=2, timeout=1.0, health_check_interval=60.0) -> ConnectionPool:
+    return ConnectionPool(
+        connect, size=size, timeout=timeout, health_check_interval=health_check_interval, metrics=metrics,
+    )
+
+
+def test_connections_are_reused(connect, metrics):
+    pool = make_pool(connect, metrics)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert connect.call_count == 1
+    first.rollback.assert_called()
+    assert metrics.snapshot()["timings"]["db.pool.wait"]["count"] == 2
+
+
+def test_concurrent_borrowers_get_separate_connections(connect, metrics):
+    pool = make_pool(connect, metrics)
+
+    with pool.connection() as first, pool.connection() as second:
+        assert first is not second
+    assert pool.num_open == 2
+    assert pool.num_idle == 2
+
+
+def test_borrower_waits_for_a_released_connection(connect, metrics):
+    pool = make_pool(connect, metrics, size=1)
+    borrowed = threading.Event()
+    release = threading.Event()
+
+    def hold_connection():
+        with pool.connection():
+            borrowed.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold_connection)
+    holder.start()
+    borrowed.wait()
+    threading.Timer(0.05, release.set).start()
+
+    with pool.connection():
+        pass
+    holder.join()
+
+    assert connect.call_count == 1
+    assert metrics.snapshot()["timings"]["db.pool.wait"]["max"] >= 0.05
+
+
+def test_timeout_when_pool_is_exhausted(connect, metrics):
+    pool = make_pool(connect, metrics, size=1, timeout=0.01)
+
+    with pool.connection(), pytest.raises(PoolTimeoutError), pool.connection():
+        pass
+
+    assert metrics.snapshot()["counters"]["db.pool.timeouts"] == 1
+
+
+def test_broken_connection_is_replaced(connect, metrics):
+    pool = make_pool(connect, metrics)
+
+    with pytest.raises(mariadb.OperationalError), pool.connection() as broken:
+        raise mariadb.OperationalError("Lost connection")
+    with pool.connection() as conn:
+        pass
+
+    broken.close.assert_called_once()
+    assert conn is not broken
+    assert pool.num_open == 1
+
+
+def test_failed_health_check_reconnects(connect, metrics):
+    pool = make_pool(connect, metrics, health_check_interval=0)
+
+    with pool.connection() as stale:
+        stale.ping.side_effect = mariadb.InterfaceError("Server has gone away")
+    with pool.connection() as conn:
+        pass
+
+    assert conn is not stale
+    assert connect.call_count == 2
+    assert metrics.snapshot()["counters"]["db.pool.reconnects"] == 1
+
+
+def test_failed_connect_frees_the_slot(metrics):
+    pool = make_pool(Mock(side_effect=mariadb.OperationalError("Can't connect")), metrics, size=1)
+
+    for _ in range(2):
+        with pytest.raises(mariadb.OperationalError), pool.connection():
+            pass
+    assert pool.num_open == 0
@@ -0,0 +1,196 @@
+from contextlib import contextmanager
+from datetime import datetime
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from app.storage.chunk_batch import ChunkBatch
+from app.storage.embedding_spaces import EmbeddingSpaceChangedError
+from app.storage.models import Document, SearchFilters
+from app.storage.repository import NativeMariadDBRepository
+from app.storage.vectors import from_vector_bytes, to_vector_bytes
+from tests.storage.conftest import make_chunks
+
+
+@pytest.fixture
+def connection():
+    return Mock()
+
+
+@pytest.fixture
+def repository(connection):
+    pool = Mock()
+
+    @contextmanager
+    def borrow():
+        yield connection
+
+    pool.connection.side_effect = borrow
+    return NativeMariadDBRepository(pool)
+
+
+def test_insert_chunks_sends_binary_vectors(repository, connection):
+    embeddings = np.random.default_rng(0).normal(size=(2, 384)).astype(np.float32)
+
+    repository.insert_chunks(make_chunks(embeddings))
+
+    rows = connection.cursor.return_value.executemany.call_args.args[1]
+    for row, embedding in zip(rows, embeddings, strict=True):
+        np.testing.assert_array_equal(from_vector_bytes(row[-1]), embedding)
+    connection.commit.assert_called_once()
+
+
+def test_search_sends_binary_query(repository, connection):
+    query = np.random.default_rng(1).normal(size=384).astype(np.float32)
+    connection.cursor.return_value.fetchall.return_value = []
+
+    repository.search(query, num_neighbors=3)
+
+    assert connection.cursor.return_value.execute.call_args.args[1] == (to_vector_bytes(query), 3)
+
+
+def test_search_returns_parsed_embeddings(repository, connection):
+    embedding = np.random.default_rng(3).normal(size=384).astype(np.float32)
+    connection.cursor.return_value.fetchall.return_value = [{
+        "chunk_index": 0, "start_ts": 0, "end_ts": 10, "text": "chunk", "document_id": 1, "distance": 0.5,
+        "document_title": "Talk", "document_url": "https://youtube.com/watch?v=1",
+        "embedding": to_vector_bytes(embedding),
+    }]
+
+    results = repository.search(embedding, num_neighbors=1, with_embeddings=True)
+
+    np.testing.assert_array_equal(results[0].embedding, embedding)
+    assert "as embedding" in connection.cursor.return_value.execute.call_args.args[0]
+
+
+def test_search_selects_embeddings_only_when_asked(repository, connection):
+    connection.cursor.return_value.fetchall.return_value = [{
+        "chunk_index": 0, "start_ts": 0, "end_ts": 10, "text": "chunk", "document_id": 1, "distance": 0.5,
+        "document_title": "Talk", "document_url": "https://youtube.com/watch?v=1",
+    }]
+
+    results = repository.search(np.ones(384, dtype=np.float32), num_neighbors=1)
+
+    assert "as embedding" not in connection.cursor.return_value.execute.call_args.args[0]
+    assert results[0].embedding is None
+
+
+def test_iter_chunks_parses_binary_vectors(repository, connection):
+    embedding = np.random.default_rng(2).normal(size=384).astype(np.float32)
+    row = make_chunks([embedding])[0].model_dump()
+    connection.cursor.return_value.fetchall.side_effect = [
+        [{**row, "embedding": to_vector_bytes(embedding)}], [],
+    ]
+
+    batches = list(repository.iter_chunks())
+
+    assert len(batches) == 1
+    np.testing.assert_array_equal(batches[0][0].embedding, embedding)
+
+
+@pytest.fixture
+def items():
+    embeddings = np.zeros((5, 384), dtype=np.float32)
+    return [
+        (Document(title="First", url="https://youtube.com/watch?v=1", created_at=datetime.now()), make_chunks(embeddings[:3])),
+        (Document(title="Second", url="https://youtube.com/watch?v=2", created_at=datetime.now()), make_chunks(embeddings[3:])),
+    ]
+
+
+def test_bulk_insert_uses_multi_row_inserts_in_one_transaction(repository, connection, items):
+    cursor = connection.cursor.return_value
+    cursor.fetchone.return_value = (1, 1)
+    cursor.lastrowid = 10
+
+    assert repository.bulk_insert(items, rows_per_statement=4) == [10, 11]
+
+    statements = [call.args for call in cursor.execute.call_args_list if "INSERT" in call.args[0]]
+    assert [len(params) for _, params in statements] == [2 * 4, 4 * 6, 1 * 6]
+    assert [chunk.document_id for _, chunks in items for chunk in chunks] == [10, 10, 10, 11, 11]
+    connection.commit.assert_called_once()
+
+
+def test_bulk_insert_with_auto_increment_step(repository, connection, items):
+    cursor = connection.cursor.return_value
+    cursor.fetchone.return_value = (1, 3)
+    cursor.lastrowid = 4
+
+    assert repository.bulk_insert(items) == [4, 7]
+
+
+def test_bulk_insert_without_consecutive_ids(repository, connection, items):
+    cursor = connection.cursor.return_value
+    cursor.fetchone.return_value = (2, 1)
+    document_ids = iter([10, 12])
+    cursor.execute.side_effect = lambda sql, *args: (
+        setattr(cursor, "lastrowid", next(document_ids)) if "documents" in sql else None
+    )
+
+    assert repository.bulk_insert(items) == [10, 12]
+    assert [chunk.document_id for _, chunks in items for chunk in chunks] == [10, 10, 10, 12, 12]
+
+
+def test_bulk_insert_of_chunk_batches_matches_chunk_lists(repository, connection, items):
+    cursor = connection.cursor.return_value
+    cursor.fetchone.return_value = (1, 1)
+    cursor.lastrowid = 10
+    repository.bulk_insert(items)
+    expected = [call.args for call in cursor.execute.call_args_list if "INSERT INTO semantic_search.chunks" in call.args[0]]
+    cursor.execute.reset_mock()
+
+    batches = []
+    for document, chunks in items:
+        batch = ChunkBatch(
+            [chunk.text for chunk in chunks],
+            np.array([chunk.start_ts for chunk in chunks]),
+            np.array([chunk.end_ts for chunk in chunks]),
+            embeddings=np.stack([chunk.embedding for chunk in chunks]),
+        )
+        batches.append((document, batch))
+    repository.bulk_insert(batches)
+
+    statements = [call.args for call in cursor.execute.call_args_list if "INSERT INTO semantic_search.chunks" in call.args[0]]
+    assert statements == expected
+    assert [batch.document_id for _, batch in batches] == [10, 11]
+
+
+@pytest.mark.parametrize("num_matching, expected_statements", [
+    # Narrow filter: only the chunks of matching documents are scanned
+    (10, ["WHERE document_id IN"]),
+    # Broad filter: the vector index results are filtered
+    (500, ["AS nearest WHERE document_id IN"]),
+])
+def test_filtered_search_strategy(repository, connection, num_matching, expected_statements):
+    cursor = connection.cursor.return_value
+    row = {
+        "chunk_index": 0, "start_ts": 0, "end_ts": 10, "text": "chunk", "document_id": 1, "distance": 0.5,
+        "document_title": "Talk", "document_url": "https://youtube.com/watch?v=1",
+        "embedding": to_vector_bytes(np.zeros(384, dtype=np.float32)),
+    }
+    cursor.fetchall.side_effect = [[{"id": 1}, {"id": 2}], [row] * 5]
+    cursor.fetchone.side_effect = [{"num_chunks": num_matching}, {"num_chunks": 1000}]
+
+    repository.search(np.zeros(384, dtype=np.float32), 5, filters=SearchFilters(meta={"year": 2023}))
+
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert "JSON_VALUE(meta, %s) = %s" in statements[0]
+    assert cursor.execute.call_args_list[0].args[1] == ['$."year"', "2023"]
+    assert len(statements) == 4
+    assert all(expected in statements[-1] for expected in expected_statements)
+
+
+def test_writes_fail_after_another_embedding_space_became_active(connection):
+    pool = Mock()
+
+    @contextmanager
+    def borrow():
+        yield connection
+
+    pool.connection.side_effect = borrow
+    repository = NativeMariadDBRepository(pool, embedding_column="embedding", space_check_seconds=30)
+    connection.cursor.return_value.fetchone.return_value = ("embedding_2",)
+
+    with pytest.raises(EmbeddingSpaceChangedError):
+        repository.insert_chunks(make_chunks(np.ones((1, 384), dtype=np.float32)))
+    connection.cursor.return_value.executemany.assert_not_called()
@@ -0,0 +1,57 @@
+from unittest.mock import Mock
+
+import pytest
+
+from app.services.protocols import Repository
+from app.storage.unit_of_work import UnitOfWork
+
+
+@pytest.fixture
+def repo():
+    return Mock(spec=Repository)
+
+
+def test_commits_every_interval_and_on_exit(repo):
+    with UnitOfWork(repo, commit_interval=2) as uow:
+        for _ in range(3):
+            uow.add(Mock(), [Mock()])
+        assert repo.bulk_insert.call_count == 1
+
+    assert [len(call.args[0]) for call in repo.bulk_insert.call_args_list] == [2, 1]
+    assert uow.num_documents == 3
+    assert uow.num_chunks == 3
+
+
+def test_discards_pending_documents_on_error(repo):
+    with pytest.raises(RuntimeError), UnitOfWork(repo, commit_interval=2) as uow:
+        uow.add(Mock(), [Mock()])
+        raise RuntimeError("Embedding failed")
+
+    repo.bulk_insert.assert_not_called()
+    assert uow.num_documents == 0
+
+
+def test_retries_failed_commits(repo):
+    repo.bulk_insert.side_effect = [RuntimeError("Deadlock found"), None]
+
+    with UnitOfWork(repo, commit_interval=2, retry_backoff_seconds=0) as uow:
+        uow.add(Mock(), [Mock()])
+
+    assert repo.bulk_insert.call_count == 2
+    assert uow.num_documents == 1
+    assert uow.failed_documents == []
+
+
+def test_reports_documents_of_commits_that_keep_failing(repo):
+    repo.bulk_insert.side_effect = RuntimeError("Deadlock found")
+    on_failure = Mock()
+    documents = [Mock(), Mock()]
+    uow = UnitOfWork(repo, commit_interval=2, on_failure=on_failure, max_attempts=3, retry_backoff_seconds=0)
+
+    uow.add(documents[0], [Mock()])
+    with pytest.raises(RuntimeError):
+        uow.add(documents[1], [Mock()])
+
+    assert repo.bulk_insert.call_count == 3
+    assert uow.failed_documents == documents
+    assert on_failure.call_args.args[0] == documents
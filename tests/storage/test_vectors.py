@@ -0,0 +1,16 @@
+import numpy as np
+
+from app.storage.vectors import from_vector_bytes, to_vector_bytes
+
+
+def test_round_trip():
+    vector = np.random.default_rng(0).normal(size=384).astype(np.float32)
+
+    data = to_vector_bytes(vector)
+
+    assert len(data) == 384 * 4
+    np.testing.assert_array_equal(from_vector_bytes(data), vector)
+
+
+def test_packed_as_little_endian_float32():
+    assert to_vector_bytes(np.array([1.0, -2.5], dtype=np.float64)) == b"\x00\x00\x80\x3f\x00\x00\x20\xc0"
@@ -0,0 +1,3 @@
+"""
+Test package for the youtube module.
+"""
\ No newline at end of file
@@ -0,0 +1,81 @@
+import re
+from unittest.mock import Mock
+
+import pytest
+from youtube_transcript_api import FetchedTranscript, FetchedTranscriptSnippet
+
+from app.youtube import transform
+
+
+class FakeTokenizer:
+    """Whitespace tokenizer with the parts of the HuggingFace tokenizer API used by the chunking code."""
+    def __init__(self, model_max_length: int):
+        self.model_max_length = model_max_length
+
+    def tokenize(self, text: str) -> list[str]:
+        return text.split()
+
+    def __call__(self, texts: list[str], add_special_tokens: bool = True, **kwargs) -> dict:
+        return {"input_ids": [[0] * len(self.tokenize(text)) for text in texts]}
+
+
+class FakePunctuator:
+    """Mimics the `ner` pipeline of the punctuation model: every sixth word ends a sentence."""
+    def __init__(self, model_max_length: int = 32):
+        self.tokenizer = FakeTokenizer(model_max_length)
+        self.calls = []
+
+    def __call__(self, inputs, batch_size: int | None = None):
+        self.calls.append(inputs)
+        if isinstance(inputs, str):
+            return self._punctuate(inputs)
+        return [self._punctuate(text) for text in inputs]
+
+    def _punctuate(self, text: str) -> list[dict]:
+        return [
+            {"word": word, "entity_group": "." if (i + 1) % 6 == 0 else "0"}
+            for i, word in enumerate(text.split())
+        ]
+
+
+def split_sentences(text: str) -> list[str]:
+    return [sentence for sentence in re.split(r"(?<=[.!?])\s+", text.strip()) if sentence]
+
+
+@pytest.fixture
+def fake_punctuator(monkeypatch):
+    punctuator = FakePunctuator()
+    monkeypatch.setattr(transform, "get_punctuator", lambda: punctuator)
+    # NLTK punkt data is not needed to test the chunking logic
+    monkeypatch.setattr(transform, "chunk_by_sentence", split_sentences)
+    return punctuator
+
+
+@pytest.fixture
+def embedding_model():
+    model = Mock()
+    model.tokenizer = FakeTokenizer(256)
+    return model
+
+
+def make_transcript(num_snippets: int, words_per_snippet: int = 4, video_id: str = "video123") -> FetchedTranscript:
+    snippets = [
+        FetchedTranscriptSnippet(
+            text=" ".join(f"w{i}_{j}" for j in range(words_per_snippet)),
+            start=i * 2.0,
+            duration=2.0,
+        )
+        for i in range(num_snippets)
+    ]
+    return FetchedTranscript(
+        snippets=snippets,
+        video_id=video_id,
+        language="English (auto-generated)",
+        language_code="en",
+        is_generated=True,
+    )
+
+
+@pytest.fixture
+def transcript():
+    return make_transcript(60)
@@ -0,0 +1,199 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+
+import pytest
+
+from app.youtube.fetcher import (
+    ConcurrentTranscriptFetcher,
+    HttpTranscriptSource,
+    PermanentFetchError,
+    TokenBucket,
+)
+from app.youtube.transcript_store import TranscriptStore
+from tests.youtube.conftest import make_transcript
+
+
+class StubTranscriptServer:
+    """Serves transcripts as JSON, failing the first requests of a video with the queued status codes."""
+    def __init__(self):
+        self.transcripts = {}
+        self.failures: dict[str, list[int]] = {}
+        self.requests: list[str] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                video_id = self.path.strip("/")
+                with stub._lock:
+                    stub.requests.append(video_id)
+                    failures = stub.failures.get(video_id)
+                    status = failures.pop(0) if failures else None
+                if status is None and video_id not in stub.transcripts:
+                    status = 404
+                if status is not None:
+                    self.send_response(status)
+                    self.end_headers()
+                    return
+                transcript = stub.transcripts[video_id]
+                body = json.dumps({
+                    "language": transcript.language,
+                    "language_code": transcript.language_code,
+                    "is_generated": transcript.is_generated,
+                    "snippets": [
+                        {"text": s.text, "start": s.start, "duration": s.duration} for s in transcript.snippets
+                    ],
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def server():
+    with StubTranscriptServer() as server:
+        yield server
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TranscriptStore(tmp_path / "transcripts.sqlite3", legacy_dir=None)
+    yield store
+    store.close()
+
+
+def make_fetcher(server, store, **kwargs) -> ConcurrentTranscriptFetcher:
+    options = dict(rate_per_second=0, max_attempts=3, retry_backoff_seconds=0, workers=4)
+    options.update(kwargs)
+    return ConcurrentTranscriptFetcher(HttpTranscriptSource(server.url), store, **options)
+
+
+def test_fetch_stores_transcripts(server, store):
+    server.transcripts["abc"] = make_transcript(4, video_id="abc")
+    fetcher = make_fetcher(server, store)
+
+    first = fetcher.fetch("abc")
+    second = fetcher.fetch("abc")
+
+    assert first.snippets == server.transcripts["abc"].snippets
+    assert second.snippets == first.snippets
+    assert server.requests == ["abc"]
+
+
+def test_fetch_stores_videos_without_transcripts(server, store):
+    fetcher = make_fetcher(server, store)
+
+    assert fetcher.fetch("no-captions") == []
+    assert fetcher.fetch("no-captions") == []
+    assert server.requests == ["no-captions"]
+
+
+def test_fetch_retries_throttled_and_failed_requests(server, store):
+    server.transcripts["abc"] = make_transcript(2, video_id="abc")
+    server.failures["abc"] = [429, 503]
+    fetcher = make_fetcher(server, store)
+
+    assert fetcher.fetch("abc").video_id == "abc"
+    assert server.requests == ["abc"] * 3
+
+
+def test_fetch_does_not_retry_permanent_failures(server, store):
+    server.failures["gone"] = [403]
+    fetcher = make_fetcher(server, store)
+
+    with pytest.raises(PermanentFetchError):
+        fetcher.fetch("gone")
+    assert server.requests == ["gone"]
+    assert store.get("gone") is None
+
+
+def test_fetch_does_not_retry_unexpected_errors(store):
+    source = Mock()
+    source.fetch.side_effect = KeyError("snippets")
+    fetcher = ConcurrentTranscriptFetcher(source, store, rate_per_second=0, max_attempts=3, retry_backoff_seconds=0)
+
+    with pytest.raises(KeyError):
+        fetcher.fetch("abc")
+    assert source.fetch.call_count == 1
+
+
+def test_prefetch_fetches_missing_transcripts_concurrently(server, store):
+    video_ids = [f"video{i}" for i in range(20)]
+    for video_id in video_ids:
+        server.transcripts[video_id] = make_transcript(3, video_id=video_id)
+    server.failures["video3"] = [500, 500, 500]
+    store.put("video0", server.transcripts["video0"])
+    fetcher = make_fetcher(server, store)
+
+    stats = fetcher.prefetch(video_ids)
+
+    assert (stats.total, stats.cached, stats.fetched) == (20, 1, 18)
+    assert stats.failed == ["video3"]
+    assert sorted(store.video_ids()) == sorted(set(video_ids) - {"video3"})
+
+
+def test_prefetch_stops_on_unexpected_errors(store):
+    source = Mock()
+    source.fetch.side_effect = KeyError("snippets")
+    fetcher = ConcurrentTranscriptFetcher(source, store, rate_per_second=0, max_attempts=3, retry_backoff_seconds=0)
+
+    with pytest.raises(KeyError):
+        fetcher.prefetch(["abc", "def"], workers=1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def test_token_bucket_allows_bursts_then_the_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == 0.0
+
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_token_bucket_refills_while_idle():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1.0, capacity=2, clock=clock, sleep=clock.sleep)
+    bucket.acquire()
+    bucket.acquire()
+
+    clock.now += 10.0
+    bucket.acquire()
+    bucket.acquire()
+
+    assert clock.now == pytest.approx(10.0)
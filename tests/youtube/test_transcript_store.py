@@ -0,0 +1,62 @@
+import pickle
+import threading
+
+import pytest
+
+from app.youtube.transcript_store import TranscriptStore
+from tests.youtube.conftest import make_transcript
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TranscriptStore(tmp_path / "transcripts.sqlite3", legacy_dir=tmp_path / "pickles")
+    yield store
+    store.close()
+
+
+def test_round_trips_transcripts(store):
+    transcript = make_transcript(5, video_id="abc")
+    store.put("abc", transcript)
+
+    loaded = store.get("abc")
+
+    assert loaded.video_id == "abc"
+    assert loaded.language_code == "en"
+    assert loaded.is_generated is True
+    assert loaded.snippets == transcript.snippets
+
+
+def test_distinguishes_missing_transcripts_from_unfetched_videos(store):
+    store.put("no-captions", [])
+
+    assert store.get("no-captions") == []
+    assert store.get("unknown") is None
+    assert "no-captions" in store
+    assert "unknown" not in store
+    assert store.video_ids() == []
+
+
+def test_imports_legacy_pickles(store, tmp_path):
+    (tmp_path / "pickles").mkdir()
+    for video_id in ("a", "b"):
+        with open(tmp_path / "pickles" / f"{video_id}.pkl", "wb") as f:
+            pickle.dump(make_transcript(3, video_id=video_id), f)
+
+    assert "a" in store
+    assert store.get("a").snippets == make_transcript(3, video_id="a").snippets
+    assert store.import_legacy() == 1
+    assert store.video_ids() == ["a", "b"]
+
+
+def test_concurrent_writes(store):
+    def put(offset):
+        for i in range(20):
+            store.put(f"video{offset + i}", make_transcript(2, video_id=f"video{offset + i}"))
+
+    threads = [threading.Thread(target=put, args=(offset,)) for offset in range(0, 80, 20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(store) == 80
@@ -0,0 +1,144 @@
+import re
+
+import pytest
+
+from app import config
+from app.chunking.cache import ChunkCache
+from app.youtube.transform import (
+    TranscriptSentencesChunker,
+    iter_sentences_chunks,
+    restore_punctuation,
+    restore_punctuation_batch,
+    split_into_sentences_chunks,
+    split_many_into_sentences_chunks,
+)
+from tests.youtube.conftest import make_transcript
+
+
+def test_restore_punctuation_batch_matches_single_calls(fake_punctuator):
+    texts = ["one two three four five six seven", "eight nine", ""]
+
+    expected = [restore_punctuation(text) for text in texts]
+    fake_punctuator.calls.clear()
+    actual = restore_punctuation_batch(texts, batch_size=2)
+
+    assert actual == expected
+    assert fake_punctuator.calls == [[text.lower() for text in texts]]
+
+
+def test_split_into_sentences_chunks(fake_punctuator, embedding_model, transcript):
+    chunks = split_into_sentences_chunks(transcript, embedding_model, tokens_per_chunk=20)
+
+    text = "".join(chunk.text for chunk in chunks).replace(" ", "").replace(".", "")
+    assert text == "".join(snippet.text for snippet in transcript.snippets).replace(" ", "")
+    assert all(len(chunk.text.split()) <= 20 for chunk in chunks)
+    # A single batched punctuation call for the whole transcript
+    assert len(fake_punctuator.calls) == 1
+
+
+def test_split_many_matches_split_per_transcript(fake_punctuator, embedding_model):
+    transcripts = [make_transcript(30, video_id="a"), make_transcript(45, video_id="b")]
+
+    expected = [
+        [(chunk.text, chunk.metadata.start_time, chunk.metadata.end_time) for chunk in chunks]
+        for chunks in (split_into_sentences_chunks(t, embedding_model, 20) for t in transcripts)
+    ]
+    fake_punctuator.calls.clear()
+    actual = [
+        [(chunk.text, chunk.metadata.start_time, chunk.metadata.end_time) for chunk in chunks]
+        for chunks in split_many_into_sentences_chunks(transcripts, embedding_model, 20)
+    ]
+
+    assert actual == expected
+    assert len(fake_punctuator.calls) == 1
+
+
+def test_chunker_reuses_cached_chunks(fake_punctuator, embedding_model, transcript, tmp_path):
+    chunker = TranscriptSentencesChunker(embedding_model, 20, cache=ChunkCache(tmp_path))
+
+    first = list(chunker.split_into_chunks(transcript))
+    second = list(chunker.split_into_chunks(transcript))
+
+    assert len(fake_punctuator.calls) == 1
+    assert [(c.text, c.metadata.start_time, c.metadata.end_time) for c in second] == [
+        (c.text, c.metadata.start_time, c.metadata.end_time) for c in first
+    ]
+
+
+def test_chunker_reuses_cached_punctuation_for_new_chunk_size(
+    fake_punctuator, embedding_model, transcript, tmp_path,
+):
+    cache = ChunkCache(tmp_path)
+    list(TranscriptSentencesChunker(embedding_model, 20, cache=cache).split_into_chunks(transcript))
+
+    chunks = list(TranscriptSentencesChunker(embedding_model, 10, cache=cache).split_into_chunks(transcript))
+
+    assert len(fake_punctuator.calls) == 1
+    assert [chunk.text for chunk in chunks] == [
+        chunk.text for chunk in split_into_sentences_chunks(transcript, embedding_model, 10)
+    ]
+
+
+def test_cached_chunker_streams_chunks(fake_punctuator, embedding_model, tmp_path):
+    transcript = make_transcript(2000)
+    cache = ChunkCache(tmp_path)
+    expected = [
+        (chunk.text, chunk.metadata.start_time, chunk.metadata.end_time)
+        for chunk in split_into_sentences_chunks(transcript, embedding_model, 20)
+    ]
+    fake_punctuator.calls.clear()
+
+    chunks = TranscriptSentencesChunker(embedding_model, 20, cache=cache).split_into_chunks(transcript)
+    first = next(chunks)
+
+    # Only the first windows are punctuated, and nothing is cached before the stream is exhausted
+    punctuated_before_first_chunk = sum(len(call) for call in fake_punctuator.calls)
+    assert cache.get_punctuated(transcript, config.PUNC_MODEL) is None
+    actual = [(first.text, first.metadata.start_time, first.metadata.end_time)] + [
+        (chunk.text, chunk.metadata.start_time, chunk.metadata.end_time) for chunk in chunks
+    ]
+    assert actual == expected
+    assert punctuated_before_first_chunk < sum(len(call) for call in fake_punctuator.calls)
+    assert cache.get_punctuated(transcript, config.PUNC_MODEL) is not None
+
+    # Chunks of another size are split from the cached punctuation
+    calls = len(fake_punctuator.calls)
+    chunks = list(TranscriptSentencesChunker(embedding_model, 10, cache=cache).split_into_chunks(transcript))
+    assert len(fake_punctuator.calls) == calls
+    assert [chunk.text for chunk in chunks] == [
+        chunk.text for chunk in split_into_sentences_chunks(transcript, embedding_model, 10)
+    ]
+
+
+@pytest.mark.parametrize("window_size", [1, 2, 100])
+def test_streaming_chunks_match_batched_chunks(fake_punctuator, embedding_model, window_size):
+    # Long enough for several sentence splitting windows
+    transcript = make_transcript(2000)
+    expected = [
+        (chunk.text, chunk.metadata.start_time, chunk.metadata.end_time)
+        for chunk in split_into_sentences_chunks(transcript, embedding_model, 20)
+    ]
+
+    consumed = []
+    snippets = (consumed.append(snippet) or snippet for snippet in transcript.snippets)
+    chunks = iter_sentences_chunks(snippets, embedding_model, 20, window_size=window_size)
+    first = next(chunks)
+
+    # Chunks are yielded before the whole transcript is consumed
+    assert len(consumed) < len(transcript.snippets)
+    actual = [(first.text, first.metadata.start_time, first.metadata.end_time)] + [
+        (chunk.text, chunk.metadata.start_time, chunk.metadata.end_time) for chunk in chunks
+    ]
+    assert actual == expected
+
+
+def test_chunk_timestamps_are_those_of_their_first_and_last_snippets(fake_punctuator, embedding_model):
+    transcript = make_transcript(100)
+
+    chunks = split_into_sentences_chunks(transcript, embedding_model, 20)
+
+    for chunk in chunks:
+        # Words of snippet i are w{i}_0 to w{i}_3, snippet i starts at 2 * i and lasts 2 seconds
+        snippet_numbers = [int(number) for number in re.findall(r"w(\d+)_", chunk.text)]
+        assert chunk.metadata.start_time == 2.0 * snippet_numbers[0]
+        assert chunk.metadata.end_time == 2.0 * snippet_numbers[-1] + 2.0